@@ -526,19 +526,19 @@ class RaidenAPI:
             from_block=from_block,
             to_block=to_block,
         )
+        # Here choose which raiden internal events we want to expose to the end user
         raiden_events = self.raiden.wal.storage.get_events_by_block(
             from_block=from_block,
             to_block=to_block,
+            event_types=EVENTS_EXTERNALLY_VISIBLE,
         )
-        # Here choose which raiden internal events we want to expose to the end user
         for block_number, event in raiden_events:
-            if isinstance(event, EVENTS_EXTERNALLY_VISIBLE):
-                new_event = {
-                    'block_number': block_number,
-                    '_event_type': type(event).__name__.encode(),
-                }
-                new_event.update(event.__dict__)
-                returned_events.append(new_event)
+            new_event = {
+                'block_number': block_number,
+                '_event_type': type(event).__name__.encode(),
+            }
+            new_event.update(event.__dict__)
+            returned_events.append(new_event)
 
         return returned_events
 
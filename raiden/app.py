@@ -9,6 +9,14 @@ from raiden.settings import (
     DEFAULT_NAT_INVITATION_TIMEOUT,
     DEFAULT_NAT_KEEPALIVE_RETRIES,
     DEFAULT_NAT_KEEPALIVE_TIMEOUT,
+    DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+    DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+    DEFAULT_PROTOCOL_QUEUE_WINDOW,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
     DEFAULT_PROTOCOL_RETRIES_BEFORE_BACKOFF,
     DEFAULT_PROTOCOL_THROTTLE_CAPACITY,
     DEFAULT_PROTOCOL_THROTTLE_FILL_RATE,
@@ -16,9 +24,11 @@ from raiden.settings import (
     DEFAULT_REVEAL_TIMEOUT,
     DEFAULT_SETTLE_TIMEOUT,
     DEFAULT_SHUTDOWN_TIMEOUT,
+    DEFAULT_SNAPSHOT_BLOCK_INTERVAL,
+    DEFAULT_SNAPSHOT_STATE_CHANGE_INTERVAL,
     INITIAL_PORT,
 )
-from raiden.network.transport import UDPTransport, TokenBucket
+from raiden.network.transport import BatchedUDPTransport, UDPTransport, TokenBucket
 from raiden.utils import (
     pex,
     privatekey_to_address
@@ -35,6 +45,11 @@ class App:  # pylint: disable=too-few-public-methods
         'reveal_timeout': DEFAULT_REVEAL_TIMEOUT,
         'settle_timeout': DEFAULT_SETTLE_TIMEOUT,
         'database_path': '',
+        'database_synchronous': 'FULL',
+        'database_group_commit': False,
+        'database_serializer': 'pickle',
+        # None, 'archive' or 'drop', done after the periodic snapshots
+        'database_compaction': None,
         'msg_timeout': 100.0,
         'protocol': {
             'retry_interval': DEFAULT_PROTOCOL_RETRY_INTERVAL,
@@ -44,16 +59,32 @@ class App:  # pylint: disable=too-few-public-methods
             'nat_invitation_timeout': DEFAULT_NAT_INVITATION_TIMEOUT,
             'nat_keepalive_retries': DEFAULT_NAT_KEEPALIVE_RETRIES,
             'nat_keepalive_timeout': DEFAULT_NAT_KEEPALIVE_TIMEOUT,
+            'message_cache_size': DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+            'message_cache_ttl': DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+            'message_cache_ttl_blocks': DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+            'processed_batch_delay': DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+            'signature_recovery_workers': DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
+            'signature_recovery_max_pending': DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+            'adaptive_retry_timeout': DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+            'queue_window': DEFAULT_PROTOCOL_QUEUE_WINDOW,
+        },
+        'snapshot': {
+            'state_change_interval': DEFAULT_SNAPSHOT_STATE_CHANGE_INTERVAL,
+            'block_interval': DEFAULT_SNAPSHOT_BLOCK_INTERVAL,
         },
         'rpc': True,
         'console': False,
         'shutdown_timeout': DEFAULT_SHUTDOWN_TIMEOUT,
+        'transport_batching': False,
     }
 
     def __init__(self, config, chain, default_registry, discovery, transport_class=UDPTransport):
         self.config = config
         self.discovery = discovery
 
+        if config.get('transport_batching') and transport_class is UDPTransport:
+            transport_class = BatchedUDPTransport
+
         if config.get('socket'):
             transport = transport_class(
                 None,
@@ -9,17 +9,20 @@ from raiden.blockchain.abi import (
     CONTRACT_CHANNEL_MANAGER,
     CONTRACT_NETTING_CHANNEL,
     CONTRACT_REGISTRY,
+    EVENT_CHANNEL_CLOSED,
+    EVENT_CHANNEL_NEW,
+    EVENT_CHANNEL_NEW_BALANCE,
+    EVENT_CHANNEL_SECRET_REVEALED,
+    EVENT_CHANNEL_SETTLED,
+    EVENT_TOKEN_ADDED,
 )
-from raiden.exceptions import (
-    AddressWithoutCode,
-    EthNodeCommunicationError,
-)
-from raiden.network.rpc.filters import get_filter_events
+from raiden.exceptions import AddressWithoutCode
+from raiden.network.rpc.filters import get_filter_events, get_logs
 from raiden.utils import address_decoder, pex
 
 EventListener = namedtuple(
     'EventListener',
-    ('event_name', 'filter', 'translator', 'filter_creation_function'),
+    ('event_name', 'address', 'translator', 'topics'),
 )
 Proxies = namedtuple(
     'Proxies',
@@ -30,25 +33,48 @@ Proxies = namedtuple(
 ALL_EVENTS = None
 log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
 
+# Events polling
+# --------------
+#
+# A filter per contract needs one `eth_getFilterChanges` per contract and
+# block, a node with thousands of channels does thousands of requests for
+# every block. The filters are also lost when the ethereum client restarts.
+#
+# The logs of all the contracts are fetched with a single `eth_getLogs` for
+# the blocks since the last poll, for the addresses of the contracts and the
+# events handled by the node, and are dispatched by address to the
+# translator of the contract. `eth_getLogs` is stateless, there is nothing to
+# reinstall after a restart of the client.
+
+REGISTRY_EVENTS = (EVENT_TOKEN_ADDED, )
+CHANNEL_MANAGER_EVENTS = (EVENT_CHANNEL_NEW, )
+NETTING_CHANNEL_EVENTS = (
+    EVENT_CHANNEL_NEW_BALANCE,
+    EVENT_CHANNEL_CLOSED,
+    EVENT_CHANNEL_SECRET_REVEALED,
+    EVENT_CHANNEL_SETTLED,
+)
 
-def poll_event_listener(eth_filter, translator):
-    result = list()
+# Largest block range of a single `eth_getLogs`, the clients time out or
+# limit the size of the response for large ranges
+MAX_BLOCK_RANGE = 1000
 
-    for log_event in eth_filter.changes():
-        decoded_event = translator.decode_event(
-            log_event['topics'],
-            log_event['data'],
-        )
 
-        if decoded_event is not None:
-            decoded_event['block_number'] = log_event.get('block_number')
-            event = Event(
-                log_event['address'],
-                decoded_event,
-            )
-            result.append(event)
+def decode_log_event(log_event, translator):
+    """ Returns the Event for `log_event` or None if it can't be decoded. """
+    decoded_event = translator.decode_event(
+        log_event['topics'],
+        log_event['data'],
+    )
 
-    return result
+    if decoded_event is None:
+        return None
+
+    decoded_event['block_number'] = log_event.get('block_number')
+    return Event(
+        log_event['address'],
+        decoded_event,
+    )
 
 
 def get_contract_events(
@@ -62,11 +88,6 @@ def get_contract_events(
     `contract_address` that match the filters `topics`, `from_block`, and
     `to_block`.
     """
-    # Note: Issue #452 (https://github.com/raiden-network/raiden/issues/452)
-    # tracks a suggested TODO, which will reduce the 3 RPC calls here to only
-    # one using `eth_getLogs`. It will require changes in all testing frameworks
-    # to be implemented though.
-
     events = get_filter_events(
         chain.client,
         contract_address,
@@ -226,101 +247,155 @@ class Event:
 class BlockchainEvents:
     """ Events polling. """
 
-    def __init__(self):
-        self.event_listeners = list()
+    def __init__(self, chain, max_block_range=MAX_BLOCK_RANGE):
+        self.chain = chain
+        self.max_block_range = max_block_range
+        self.address_to_listener = dict()
+
+        # The last block that was polled, None until the first listener
+        self.last_polled_block = None
+
+        # The listeners that were added with a `from_block` before the next
+        # block to poll, their older logs are fetched once by the next poll
+        self.address_to_from_block = dict()
+
+        self.topics = None
+
+    def _get_logs(self, addresses, from_block, to_block):
+        """ Get the logs in ranges of at most `max_block_range` blocks. """
+        result = list()
+
+        for range_start in range(from_block, to_block + 1, self.max_block_range):
+            range_end = min(range_start + self.max_block_range - 1, to_block)
+            result.extend(get_logs(
+                self.chain.client,
+                addresses,
+                [self.topics],
+                range_start,
+                range_end,
+            ))
+
+        return result
+
+    def _decode_logs(self, logs, address_to_from_block=None):
+        result = list()
+
+        for log_event in logs:
+            address = log_event['address']
+            listener = self.address_to_listener.get(address)
+
+            # The topics filter applies to all the addresses, only the events
+            # of the contract's listener are kept
+            if listener is None or log_event['topics'][0] not in listener.topics:
+                continue
+
+            if address_to_from_block is not None:
+                if log_event['block_number'] < address_to_from_block[address]:
+                    continue
+
+            event = decode_log_event(log_event, listener.translator)
+            if event is not None:
+                result.append(event)
+
+        return result
+
+    def poll_all_event_listeners(self, current_block=None):
+        """ Returns the events of all the listeners from the last poll up to
+        `current_block`, or up to the chain's current block if it's None.
+        """
+        if not self.address_to_listener:
+            return list()
+
+        if current_block is None:
+            current_block = self.chain.block_number()
 
-    def poll_all_event_listeners(self, from_block=None):
         result = list()
-        reinstalled_filters = False
-
-        while True:
-            try:
-                for event_listener in self.event_listeners:
-                    decoded_events = poll_event_listener(
-                        event_listener.filter,
-                        event_listener.translator,
-                    )
-                    result.extend(decoded_events)
-                break
-            except EthNodeCommunicationError as e:
-                # If the eth client has restarted and we reconnected to it then
-                # filters will no longer exist there. In that case we will need
-                # to recreate all the filters.
-                if not reinstalled_filters and str(e) == 'filter not found':
-                    if log.isEnabledFor('DEBUG'):
-                        log.debug('reinstalling eth filters')
-
-                    result = list()
-                    reinstalled_filters = True
-                    updated_event_listerners = list()
-
-                    for event_listener in self.event_listeners:
-                        new_listener = EventListener(
-                            event_listener.event_name,
-                            event_listener.filter_creation_function(from_block=from_block),
-                            event_listener.translator,
-                            event_listener.filter_creation_function,
-                        )
-                        updated_event_listerners.append(new_listener)
-
-                    self.event_listeners = updated_event_listerners
-                else:
-                    raise e
+        from_block = self.last_polled_block + 1
+        to_block = current_block
+
+        address_to_from_block = self.address_to_from_block
+        if address_to_from_block:
+            first_block = min(address_to_from_block.values())
+            logs = self._get_logs(list(address_to_from_block), first_block, from_block - 1)
+            result.extend(self._decode_logs(logs, address_to_from_block))
+
+        if from_block <= to_block:
+            logs = self._get_logs(list(self.address_to_listener), from_block, to_block)
+            result.extend(self._decode_logs(logs))
+
+        # Only advanced once all the requests succeeded, a failed poll is
+        # repeated in full by the next one
+        self.address_to_from_block = dict()
+        self.last_polled_block = max(to_block, self.last_polled_block)
 
         return result
 
-    def poll_blockchain_events(self, from_block=None):
-        for event in self.poll_all_event_listeners(from_block):
+    def poll_blockchain_events(self, current_block=None):
+        for event in self.poll_all_event_listeners(current_block):
             yield decode_event(event)
 
     def uninstall_all_event_listeners(self):
-        for listener in self.event_listeners:
-            listener.filter.uninstall()
+        self.address_to_listener = dict()
+        self.address_to_from_block = dict()
+
+    def add_event_listener(self, event_name, address, translator, event_names, from_block=None):
+        """ Poll the events `event_names` of the contract at `address`.
+
+        The events are polled starting from the block `from_block`, or from
+        the next block to poll if it's None.
+        """
+        if self.topics is None:
+            self.topics = [
+                CONTRACT_MANAGER.get_event_id(name)
+                for name in REGISTRY_EVENTS + CHANNEL_MANAGER_EVENTS + NETTING_CHANNEL_EVENTS
+            ]
 
-        self.event_listeners = list()
+        if self.last_polled_block is None:
+            self.last_polled_block = self.chain.block_number()
 
-    def add_event_listener(self, event_name, eth_filter, translator, filter_creation_function):
-        event = EventListener(
+        listener = EventListener(
             event_name,
-            eth_filter,
+            address,
             translator,
-            filter_creation_function,
+            {CONTRACT_MANAGER.get_event_id(name) for name in event_names},
         )
-        self.event_listeners.append(event)
+        self.address_to_listener[address] = listener
 
-        return poll_event_listener(eth_filter, translator)
+        if from_block is not None and from_block <= self.last_polled_block:
+            previous_from_block = self.address_to_from_block.get(address, from_block)
+            self.address_to_from_block[address] = min(from_block, previous_from_block)
 
     def add_registry_listener(self, registry_proxy, from_block=None):
-        tokenadded = registry_proxy.tokenadded_filter(from_block)
         registry_address = registry_proxy.address
 
         self.add_event_listener(
             'Registry {}'.format(pex(registry_address)),
-            tokenadded,
+            registry_address,
             CONTRACT_MANAGER.get_translator(CONTRACT_REGISTRY),
-            registry_proxy.tokenadded_filter,
+            REGISTRY_EVENTS,
+            from_block,
         )
 
     def add_channel_manager_listener(self, channel_manager_proxy, from_block=None):
-        channelnew = channel_manager_proxy.channelnew_filter(from_block)
         manager_address = channel_manager_proxy.address
 
         self.add_event_listener(
             'ChannelManager {}'.format(pex(manager_address)),
-            channelnew,
-            CONTRACT_MANAGER.get_translator('channel_manager'),
-            channel_manager_proxy.channelnew_filter,
+            manager_address,
+            CONTRACT_MANAGER.get_translator(CONTRACT_CHANNEL_MANAGER),
+            CHANNEL_MANAGER_EVENTS,
+            from_block,
         )
 
     def add_netting_channel_listener(self, netting_channel_proxy, from_block=None):
-        netting_channel_events = netting_channel_proxy.all_events_filter(from_block)
         channel_address = netting_channel_proxy.address
 
         self.add_event_listener(
             'NettingChannel Event {}'.format(pex(channel_address)),
-            netting_channel_events,
-            CONTRACT_MANAGER.get_translator('netting_channel'),
-            netting_channel_proxy.all_events_filter,
+            channel_address,
+            CONTRACT_MANAGER.get_translator(CONTRACT_NETTING_CHANNEL),
+            NETTING_CHANNEL_EVENTS,
+            from_block,
         )
 
     def add_proxies_listeners(self, proxies, from_block=None):
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import struct
 from collections import namedtuple, Counter
+from functools import partial
+
+from raiden.encoding.encoders import integer
 
 __all__ = ('Field', 'namedbuffer', 'buffer_for',)
 
@@ -54,6 +58,78 @@ def compute_slices(fields_spec):
     return name_to_slice
 
 
+def encode_field(field, value):
+    """ Returns the bytes for `value`, validated and padded to the field's
+    size.
+    """
+    if field.encoder:
+        field.encoder.validate(value)
+        value = field.encoder.encode(value, field.size_bytes)
+
+    if isinstance(value, str):
+        value = value.encode()
+
+    length = len(value)
+    if length > field.size_bytes:
+        msg = 'value with length {length} for {attr} is too big'.format(
+            length=length,
+            attr=field.name,
+        )
+        raise ValueError(msg)
+    elif length < field.size_bytes:
+        value = bytes(value).rjust(field.size_bytes, b'\x00')
+
+    return value
+
+
+# struct formats for the integers that can be packed natively
+NATIVE_INTEGERS = {
+    1: 'B',
+    2: 'H',
+    4: 'I',
+    8: 'Q',
+}
+
+
+def is_native_integer(field):
+    """ True if the field's values are the full unsigned range of a struct
+    integer, struct does the range check and the conversion.
+    """
+    encoder = field.encoder
+    return (
+        field.size_bytes in NATIVE_INTEGERS and
+        isinstance(encoder, integer) and
+        encoder.minimum == 0 and
+        encoder.maximum == 2 ** (8 * field.size_bytes) - 1
+    )
+
+
+def field_decoder(field):
+    """ Returns the function to decode the raw bytes of the field. """
+    if isinstance(field.encoder, integer):
+        return partial(int.from_bytes, byteorder='big')
+    return field.encoder.decode
+
+
+def compile_codec(fields_spec):
+    """ Returns a struct.Struct that packs and unpacks all the fields in a
+    single call.
+
+    Integers that fit a struct integer are packed natively, all the other
+    fields are packed as raw bytes and use the field's encoder.
+    """
+    format_string = '>'
+    for field in fields_spec:
+        if isinstance(field, Pad):
+            format_string += '{}x'.format(field.size_bytes)
+        elif is_native_integer(field):
+            format_string += NATIVE_INTEGERS[field.size_bytes]
+        else:
+            format_string += '{}s'.format(field.size_bytes)
+
+    return struct.Struct(format_string)
+
+
 def namedbuffer(buffer_name, fields_spec):  # noqa (ignore ciclomatic complexity)
     """ Class factory, returns a class to wrap a buffer instance and expose the
     data as fields.
@@ -98,11 +174,75 @@ def namedbuffer(buffer_name, fields_spec):  # noqa (ignore ciclomatic complexity
     names_slices = compute_slices(fields_spec)
     sorted_names = sorted(names_fields.keys())
 
+    codec = compile_codec(fields_spec)
+    native_fields = {
+        field.name
+        for field in fields
+        if is_native_integer(field)
+    }
+
+    # the decoders of the fields packed as raw bytes, by position
+    positions_decoders = tuple(
+        (position, field_decoder(field))
+        for position, field in enumerate(fields)
+        if field.encoder and field.name not in native_fields
+    )
+    values_type = namedtuple(buffer_name + '_values', [field.name for field in fields])
+
     @staticmethod
     def get_bytes_from(buffer_, name):
         slice_ = names_slices[name]
         return buffer_[slice_]
 
+    def unpack_values(data):
+        """ Returns a namedtuple with the decoded values of all the fields. """
+        if len(data) != size:
+            raise ValueError('data buffer has the wrong size, expected {}'.format(size))
+
+        values = codec.unpack(data)
+
+        if positions_decoders:
+            values = list(values)
+            for position, decoder in positions_decoders:
+                values[position] = decoder(values[position])
+
+        return values_type._make(values)
+
+    def pack_values(values):
+        """ Returns the bytes with all the fields from the `values`
+        dictionary, the missing fields are zeroed.
+        """
+        arguments = list()
+        for field in fields:
+            name = field.name
+
+            if name in native_fields:
+                value = values.get(name, 0)
+                if not isinstance(value, int):
+                    raise ValueError('value is not an integer')
+
+            elif name in values:
+                value = values[name]
+
+                # fast path for the raw bytes that don't need padding
+                if field.encoder or type(value) is not bytes or len(value) != field.size_bytes:
+                    value = encode_field(field, value)
+
+            else:
+                value = b''
+
+            arguments.append(value)
+
+        try:
+            return codec.pack(*arguments)
+        except struct.error as e:
+            # out of range integers
+            raise ValueError(str(e))
+
+    def from_values(cls, values):
+        """ Returns an instance over a new mutable buffer with the `values`. """
+        return cls(bytearray(pack_values(values)))
+
     def __init__(self, data):
         if len(data) != size:
             raise ValueError('data buffer has the wrong size, expected {}'.format(size))
@@ -131,29 +271,9 @@ def namedbuffer(buffer_name, fields_spec):  # noqa (ignore ciclomatic complexity
 
     def __setattr__(self, name, value):
         if name in names_slices:
-            slice_ = names_slices[name]
-            field = names_fields[name]
-
-            if field.encoder:
-                field.encoder.validate(value)
-                value = field.encoder.encode(value, field.size_bytes)
-
-            length = len(value)
-            if length > field.size_bytes:
-                msg = 'value with length {length} for {attr} is too big'.format(
-                    length=length,
-                    attr=name,
-                )
-                raise ValueError(msg)
-            elif length < field.size_bytes:
-                pad_size = field.size_bytes - length
-                pad_value = b'\x00' * pad_size
-                value = pad_value + value
-
+            value = encode_field(names_fields[name], value)
             data = object.__getattribute__(self, 'data')
-            if isinstance(value, str):
-                value = value.encode()
-            data[slice_] = value
+            data[names_slices[name]] = value
         else:
             super(self.__class__, self).__setattr__(name, value)
 
@@ -181,6 +301,9 @@ def namedbuffer(buffer_name, fields_spec):  # noqa (ignore ciclomatic complexity
         'format': fields_format,
         'size': size,
         'get_bytes_from': get_bytes_from,
+        'unpack_values': staticmethod(unpack_values),
+        'pack_values': staticmethod(pack_values),
+        'from_values': classmethod(from_values),
     }
 
     return type(buffer_name, (), attributes)
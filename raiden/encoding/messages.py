@@ -33,6 +33,7 @@ DIRECTTRANSFER = 5
 LOCKEDTRANSFER = 7
 REFUNDTRANSFER = 8
 REVEALSECRET = 11
+PROCESSEDBATCH = 12
 
 
 # pylint: disable=invalid-name
@@ -49,6 +50,7 @@ processed_message_identifier = make_field(
     integer(0, UINT64_MAX),
 )
 expiration = make_field('expiration', 8, '8s', integer(0, UINT64_MAX))
+count = make_field('count', 2, '2s', integer(0, 2 ** 16 - 1))
 
 token = make_field('token', 20, '20s')
 recipient = make_field('recipient', 20, '20s')
@@ -78,6 +80,18 @@ Processed = namedbuffer(
     ]
 )
 
+# Header of the batched `Processed`, it's followed by `count` 8 bytes
+# processed_message_identifiers.
+ProcessedBatch = namedbuffer(
+    'processed_batch',
+    [
+        cmdid(PROCESSEDBATCH),
+        pad(1),
+        count,
+        sender,
+    ]
+)
+
 Ping = namedbuffer(
     'ping',
     [
@@ -210,6 +224,7 @@ CMDID_MESSAGE = {
     DIRECTTRANSFER: DirectTransfer,
     LOCKEDTRANSFER: LockedTransfer,
     REFUNDTRANSFER: RefundTransfer,
+    PROCESSEDBATCH: ProcessedBatch,
 }
 
 
@@ -1,21 +1,89 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+
 from coincurve import PublicKey
 from ethereum.slogging import getLogger
 
+from raiden.settings import SENDER_CACHE_SIZE
 from raiden.utils import sha3
 
 log = getLogger(__name__)  # pylint: disable=invalid-name
 
 
+class SenderCache:
+    """ LRU mapping of (message_hash, signature) to the address that signed
+    the message.
+
+    The same signature is recovered many times, every retransmission of a
+    message is decoded again and the balance proofs are validated again by
+    the channel. A valid signature always recovers to the same address, so
+    the result can be reused.
+
+    The messages are decoded by the recovery pipeline's threads too, the
+    entries are only changed with single OrderedDict operations, these are
+    atomic under the GIL.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        try:
+            self.entries.move_to_end(key)
+            address = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return address
+
+    def set(self, key, address):
+        entries = self.entries
+        entries[key] = address
+
+        try:
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        except KeyError:
+            # evicted by another thread
+            pass
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+SENDER_CACHE = SenderCache(SENDER_CACHE_SIZE)
+
+
 def recover_publickey(messagedata, signature):
+    return recover_publickey_from_hash(sha3(messagedata), signature)
+
+
+def recover_publickey_from_hash(message_hash, signature):
     if len(signature) != 65:
         raise ValueError('invalid signature')
 
     signature = signature[:-1] + chr(signature[-1] - 27).encode()
     publickey = PublicKey.from_signature_and_message(
         signature,
-        messagedata,
-        hasher=sha3,
+        message_hash,
+        hasher=None,
     )
     return publickey.format(compressed=False)
 
@@ -38,6 +106,50 @@ def recover_publickey_safe(messagedata, signature):
     return publickey
 
 
+def recover_address(messagedata, signature):
+    """ Returns the address that signed `messagedata`, using the sender cache.
+
+    Raises the same exceptions as `recover_publickey`, failed recoveries are
+    not cached.
+    """
+    message_hash = sha3(messagedata)
+    key = (message_hash, signature)
+
+    address = SENDER_CACHE.get(key)
+    if address is None:
+        publickey = recover_publickey_from_hash(message_hash, signature)
+        address = address_from_key(publickey)
+        SENDER_CACHE.set(key, address)
+
+    return address
+
+
+def recover_address_safe(messagedata, signature):
+    """ Returns the address that signed `messagedata` or None if the
+    signature is invalid.
+    """
+    address = None
+
+    try:
+        address = recover_address(messagedata, signature)
+    except ValueError:
+        # raised if the signature has the wrong length
+        log.error('invalid signature')
+    except TypeError as e:
+        # raised if the PublicKey instantiation failed
+        log.error('invalid key data: {}'.format(e))
+    except Exception as e:  # pylint: disable=broad-except
+        # secp256k1 is using bare Exception classes: raised if the recovery failed
+        log.error('error while recovering pubkey: {}'.format(e))
+
+    return address
+
+
+def get_sender_cache_stats():
+    """ Returns the size, hits and misses of the sender cache. """
+    return SENDER_CACHE.stats()
+
+
 def sign(messagedata, private_key):
     signature = private_key.sign_recoverable(messagedata, hasher=sha3)
     if len(signature) != 65:
@@ -1,23 +1,26 @@
 # -*- coding: utf-8 -*-
 from binascii import unhexlify
+import struct
+from types import SimpleNamespace
 
 from ethereum.slogging import getLogger
 from ethereum.utils import big_endian_to_int
 
 from raiden.constants import (
+    UDP_MAX_MESSAGE_SIZE,
     UINT256_MAX,
     UINT64_MAX,
 )
-from raiden.encoding.format import buffer_for
 from raiden.encoding import messages, signing
-from raiden.encoding.signing import recover_publickey_safe
-from raiden.utils import publickey_to_address, sha3, ishash, pex
+from raiden.encoding.signing import recover_address_safe
+from raiden.utils import sha3, ishash, pex
 from raiden.transfer.state import EMPTY_MERKLE_ROOT
 from raiden.exceptions import InvalidProtocolMessage
 from raiden.transfer.balance_proof import pack_signing_data
 
 __all__ = (
     'Processed',
+    'ProcessedBatch',
     'Ping',
     'SecretRequest',
     'Secret',
@@ -65,6 +68,13 @@ def assert_transfer_values(payment_identifier, token, recipient):
         raise ValueError('recipient is an invalid address')
 
 
+def unpacked(packed):
+    """ Returns the values of all the fields of `packed`, decoded with a
+    single call.
+    """
+    return type(packed).unpack_values(packed.data)
+
+
 def decode(data):
     try:
         klass = CMDID_TO_CLASS[data[0]]
@@ -78,8 +88,7 @@ class Message:
 
     @property
     def hash(self):
-        packed = self.packed()
-        return sha3(packed.data)
+        return sha3(self.encode())
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.hash == other.hash
@@ -91,41 +100,70 @@ class Message:
         return not self.__eq__(other)
 
     def __repr__(self):
-        packed = self.packed()
-
         return '<{klass} [msghash={msghash}]>'.format(
             klass=self.__class__.__name__,
-            msghash=pex(sha3(packed.data)),
+            msghash=pex(self.hash),
         )
 
     @classmethod
     def decode(cls, data):
         packed = messages.wrap(data)
-        return cls.unpack(packed)
+        return cls.unpack(unpacked(packed))
 
     def encode(self):
-        packed = self.packed()
-        return bytes(packed.data)
+        klass = messages.CMDID_MESSAGE[self.cmdid]
+        return klass.pack_values(self.pack_values())
 
     def packed(self):
         klass = messages.CMDID_MESSAGE[self.cmdid]
-        data = buffer_for(klass)
-        data[0] = self.cmdid
-        packed = klass(data)
-        self.pack(packed)
+        return klass.from_values(self.pack_values())
 
-        return packed
+    def pack_values(self):
+        """ Returns the values of the buffer's fields, these are encoded with a
+        single call.
+        """
+        values = SimpleNamespace(cmdid=self.cmdid)
+        self.pack(values)
+        return vars(values)
 
 
 class SignedMessage(Message):
     # signing is a bit problematic, we need to pack the data to sign, but the
     # current API assumes that signing is called before, this can be improved
     # by changing the order to packing then signing
+
+    # The encoded bytes and the hashes are memoized, a signed message is sent
+    # and hashed many times but not changed. Setting any attribute that is
+    # encoded invalidates them, changing a nested object (e.g. the Lock) in
+    # place does not.
+    memoized = ('_encoded', '_hash', '_message_hash')
+    not_encoded = memoized + ('sender',)
+
     def __init__(self):
         super().__init__()
         self.signature = b''
         self.sender = b''
 
+    def __setattr__(self, name, value):
+        if name not in self.not_encoded:
+            self.__dict__.update(dict.fromkeys(self.memoized))
+        super().__setattr__(name, value)
+
+    def encode(self):
+        encoded = self.__dict__.get('_encoded')
+        if encoded is None:
+            encoded = super().encode()
+            self._encoded = encoded
+        return encoded
+
+    @property
+    def hash(self):
+        message_hash = self.__dict__.get('_hash')
+        if message_hash is None:
+            message_hash = sha3(self.encode())
+            self._hash = message_hash
+        return message_hash
+
     def sign(self, private_key, node_address):
         """ Sign message using `private_key`. """
         packed = self.packed()
@@ -141,6 +179,7 @@ class SignedMessage(Message):
 
         self.sender = node_address
         self.signature = signature
+        self._encoded = bytes(packed.data)
 
     @classmethod
     def decode(cls, data):
@@ -157,10 +196,12 @@ class SignedMessage(Message):
         data_that_was_signed = data[:-signature.size_bytes]
         message_signature = data[-signature.size_bytes:]
 
-        publickey = recover_publickey_safe(data_that_was_signed, message_signature)
+        sender = recover_address_safe(data_that_was_signed, message_signature)
+        if sender is None:
+            raise InvalidProtocolMessage('Invalid signature')
 
-        message = cls.unpack(packed)  # pylint: disable=no-member
-        message.sender = publickey_to_address(publickey)
+        message = cls.unpack(unpacked(packed))  # pylint: disable=no-member
+        message.sender = sender
         return message
 
 
@@ -174,15 +215,17 @@ class EnvelopeMessage(SignedMessage):
 
     @property
     def message_hash(self):
-        packed = self.packed()
-        klass = type(packed)
+        message_hash = self.__dict__.get('_message_hash')
 
-        field = klass.fields_spec[-1]
-        assert field.name == 'signature', 'signature is not the last field'
+        if message_hash is None:
+            klass = messages.CMDID_MESSAGE[self.cmdid]
 
-        data = packed.data
-        message_data = data[:-field.size_bytes]
-        message_hash = sha3(message_data)
+            field = klass.fields_spec[-1]
+            assert field.name == 'signature', 'signature is not the last field'
+
+            message_data = self.encode()[:-field.size_bytes]
+            message_hash = sha3(message_data)
+            self._message_hash = message_hash
 
         return message_hash
 
@@ -194,12 +237,13 @@ class EnvelopeMessage(SignedMessage):
         assert field.name == 'signature', 'signature is not the last field'
 
         data = packed.data
+        message_hash = sha3(data[:-field.size_bytes])
         data_to_sign = pack_signing_data(
             klass.get_bytes_from(data, 'nonce'),
             klass.get_bytes_from(data, 'transferred_amount'),
             klass.get_bytes_from(data, 'channel'),
             klass.get_bytes_from(data, 'locksroot'),
-            self.message_hash,
+            message_hash,
         )
         signature = signing.sign(data_to_sign, private_key)
 
@@ -207,6 +251,8 @@ class EnvelopeMessage(SignedMessage):
 
         self.sender = node_address
         self.signature = signature
+        self._encoded = bytes(packed.data)
+        self._message_hash = message_hash
 
     @classmethod
     def decode(cls, data):
@@ -232,10 +278,13 @@ class EnvelopeMessage(SignedMessage):
             message_hash,
         )
 
-        publickey = recover_publickey_safe(data_that_was_signed, message_signature)
+        sender = recover_address_safe(data_that_was_signed, message_signature)
+        if sender is None:
+            raise InvalidProtocolMessage('Invalid signature')
 
-        message = cls.unpack(packed)  # pylint: disable=no-member
-        message.sender = publickey_to_address(publickey)
+        message = cls.unpack(unpacked(packed))  # pylint: disable=no-member
+        message.sender = sender
+        message._message_hash = message_hash  # pylint: disable=protected-access
         return message
 
 
@@ -271,6 +320,65 @@ class Processed(Message):
         )
 
 
+class ProcessedBatch(Message):
+    """ Confirms many messages with a single datagram, see `Processed`.
+
+    The identifiers are appended to the fixed size buffer, the message has a
+    variable length up to UDP_MAX_MESSAGE_SIZE.
+    """
+    cmdid = messages.PROCESSEDBATCH
+
+    identifier_size = 8
+    max_identifiers = (
+        (UDP_MAX_MESSAGE_SIZE - messages.ProcessedBatch.size) // identifier_size
+    )
+
+    def __init__(self, sender, processed_message_identifiers):
+        super().__init__()
+
+        if len(processed_message_identifiers) > self.max_identifiers:
+            raise ValueError('too many processed_message_identifiers')
+
+        self.sender = sender
+        self.processed_message_identifiers = list(processed_message_identifiers)
+
+    @property
+    def hash(self):
+        return sha3(self.encode())
+
+    @classmethod
+    def decode(cls, data):
+        header_size = messages.ProcessedBatch.size
+
+        try:
+            packed = messages.ProcessedBatch(data[:header_size])
+        except ValueError:
+            raise InvalidProtocolMessage('processed batch is too short')
+
+        count = packed.count
+        if len(data) != header_size + count * cls.identifier_size:
+            raise InvalidProtocolMessage('processed batch has the wrong size')
+
+        identifiers = struct.unpack_from('>{}Q'.format(count), data, header_size)
+        return cls(packed.sender, identifiers)
+
+    def encode(self):
+        header = messages.ProcessedBatch.pack_values(self.pack_values())
+        identifiers = self.processed_message_identifiers
+
+        return header + struct.pack('>{}Q'.format(len(identifiers)), *identifiers)
+
+    def pack(self, packed):
+        packed.count = len(self.processed_message_identifiers)
+        packed.sender = self.sender
+
+    def __repr__(self):
+        return '<{} [processed_msgids:{}]>'.format(
+            self.__class__.__name__,
+            self.processed_message_identifiers,
+        )
+
+
 class Ping(SignedMessage):
     """ Ping, should be responded by a `Processed` message. """
     cmdid = messages.PING
@@ -733,15 +841,13 @@ class Lock:
     @property
     def as_bytes(self):
         if self._asbytes is None:
-            packed = messages.Lock(buffer_for(messages.Lock))
-            packed.amount = self.amount
-            packed.expiration = self.expiration
-            packed.secrethash = self.secrethash
-
-            self._asbytes = packed.data
+            self._asbytes = messages.Lock.pack_values({
+                'amount': self.amount,
+                'expiration': self.expiration,
+                'secrethash': self.secrethash,
+            })
 
-        # convert bytearray to bytes
-        return bytes(self._asbytes)
+        return self._asbytes
 
     @property
     def lockhash(self):
@@ -749,12 +855,12 @@ class Lock:
 
     @classmethod
     def from_bytes(cls, serialized):
-        packed = messages.Lock(serialized)
+        values = messages.Lock.unpack_values(serialized)
 
         return cls(
-            packed.amount,
-            packed.expiration,
-            packed.secrethash,
+            values.amount,
+            values.expiration,
+            values.secrethash,
         )
 
     @staticmethod
@@ -1152,4 +1258,5 @@ CMDID_TO_CLASS = {
     messages.DIRECTTRANSFER: DirectTransfer,
     messages.LOCKEDTRANSFER: LockedTransfer,
     messages.REFUNDTRANSFER: RefundTransfer,
+    messages.PROCESSEDBATCH: ProcessedBatch,
 }
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict, namedtuple
+
+# Message caches
+# --------------
+#
+# The protocol remembers the messages it sent, to deduplicate them and to
+# resolve their acknowledgments, and the `Processed` answers to the messages
+# it received, to answer retransmissions without processing them twice.
+#
+# These entries are only useful for a window of time, a retransmission comes
+# within a few retry intervals. Entries are kept in insertion order and
+# evicted from the oldest once they are older than `ttl` seconds or
+# `ttl_blocks` blocks, or when there are more than `maxsize` of them.
+#
+# Some entries can not be evicted by age:
+#
+# - Entries that are *pinned*, e.g. messages that were not acknowledged yet,
+#   until they are released.
+# - Entries for a message with a balance proof. The partner sends the next
+#   balance proof of a queue only after the previous one is acknowledged,
+#   so an entry is kept until a newer balance proof from the same queue is
+#   added. Dropping it earlier would make a retransmission be processed
+#   again, rejected because of its old nonce, and never acknowledged.
+
+CacheEntry = namedtuple('CacheEntry', (
+    'value',
+    'timestamp',
+    'block_number',
+))
+
+
+class MessageCache:
+    """ Mapping of message ids to values with bounded, expiring entries. """
+
+    def __init__(self, maxsize, ttl, ttl_blocks=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttl_blocks = ttl_blocks
+        self.clock = clock
+
+        # evictable entries in insertion order
+        self.entries = OrderedDict()
+
+        # entries not evicted by age, see `pin` and `balance_proof`
+        self.pinned = dict()
+
+        # maps a channel key to a dict of message_id to nonce
+        self.channels_to_messageids = dict()
+        self.messageids_to_channels = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries) + len(self.pinned)
+
+    def __contains__(self, message_id):
+        return message_id in self.pinned or message_id in self.entries
+
+    def __getitem__(self, message_id):
+        if message_id in self.pinned:
+            return self.pinned[message_id]
+        return self.entries[message_id].value
+
+    def get(self, message_id, default=None):
+        """ Return the value of `message_id` and count the hit or miss. """
+        if message_id in self.pinned:
+            self.hits += 1
+            return self.pinned[message_id]
+
+        entry = self.entries.get(message_id)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return entry.value
+
+    def values(self):
+        values = list(self.pinned.values())
+        values.extend(entry.value for entry in self.entries.values())
+        return values
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def add(self, message_id, value, block_number, pin=False, balance_proof=None):
+        """ Add or replace the entry for `message_id`.
+
+        Args:
+            block_number: The current block number, used for the expiration.
+            pin: If True the entry is kept until it's released.
+            balance_proof: (channel_key, nonce) of the message, the entry is
+                kept until a newer balance proof with the same key is added,
+                and the older ones are evicted. The key must identify the
+                sender's queue, only the nonces of a queue are ordered.
+        """
+        self._remove(message_id)
+
+        if balance_proof is not None:
+            channel_key, nonce = balance_proof
+            self.supersede(channel_key, nonce)
+
+            self.channels_to_messageids.setdefault(channel_key, dict())[message_id] = nonce
+            self.messageids_to_channels[message_id] = channel_key
+            self.pinned[message_id] = value
+
+        elif pin:
+            self.pinned[message_id] = value
+
+        else:
+            self.entries[message_id] = CacheEntry(value, self.clock(), block_number)
+
+        self.expire(block_number)
+
+    def release(self, message_id, block_number):
+        """ Make a pinned entry expire from now on. Entries with a balance
+        proof are not affected.
+        """
+        if message_id in self.pinned and message_id not in self.messageids_to_channels:
+            value = self.pinned.pop(message_id)
+            self.entries[message_id] = CacheEntry(value, self.clock(), block_number)
+            self.expire(block_number)
+
+    def supersede(self, channel_key, nonce):
+        """ Evict the entries of the balance proofs of `channel_key` older
+        than `nonce`.
+        """
+        messageids_to_nonces = self.channels_to_messageids.get(channel_key)
+
+        if messageids_to_nonces:
+            superseded = [
+                message_id
+                for message_id, message_nonce in messageids_to_nonces.items()
+                if message_nonce < nonce
+            ]
+
+            for message_id in superseded:
+                self._remove(message_id)
+                self.evictions += 1
+
+    def expire(self, block_number=None):
+        """ Evict the entries older than `ttl` seconds or `ttl_blocks` blocks
+        and the oldest entries above `maxsize`.
+        """
+        entries = self.entries
+        oldest_timestamp = self.clock() - self.ttl
+
+        if block_number is not None and self.ttl_blocks is not None:
+            oldest_block = block_number - self.ttl_blocks
+        else:
+            oldest_block = None
+
+        while entries:
+            message_id, entry = next(iter(entries.items()))
+
+            expired = (
+                len(entries) > self.maxsize or
+                entry.timestamp <= oldest_timestamp or
+                (
+                    oldest_block is not None and
+                    entry.block_number is not None and
+                    entry.block_number <= oldest_block
+                )
+            )
+            if not expired:
+                break
+
+            del entries[message_id]
+            self.evictions += 1
+
+    def _remove(self, message_id):
+        self.entries.pop(message_id, None)
+        self.pinned.pop(message_id, None)
+
+        key = self.messageids_to_channels.pop(message_id, None)
+        if key is not None:
+            messageids_to_nonces = self.channels_to_messageids[key]
+            del messageids_to_nonces[message_id]
+
+            if not messageids_to_nonces:
+                del self.channels_to_messageids[key]
@@ -2,31 +2,46 @@
 from binascii import hexlify
 import logging
 import random
-from collections import namedtuple
-from itertools import repeat
+from collections import deque, namedtuple
+from itertools import islice
 
 import cachetools
 import gevent
-from gevent.event import (
-    _AbstractLinkable,
-    AsyncResult,
-    Event,
-)
+from gevent.event import AsyncResult
 from ethereum import slogging
 
 from raiden.exceptions import (
     InvalidAddress,
     UnknownAddress,
     UnknownTokenAddress,
-    RaidenShuttingDown,
 )
 from raiden.constants import UDP_MAX_MESSAGE_SIZE, UINT64_MAX
-from raiden.messages import decode, Processed, Ping, SignedMessage
-from raiden.settings import CACHE_TTL
+from raiden.messages import (
+    CMDID_TO_CLASS,
+    decode,
+    EnvelopeMessage,
+    Ping,
+    Processed,
+    ProcessedBatch,
+    SignedMessage,
+)
+from raiden.network.cache import MessageCache
+from raiden.network.recovery import RecoveryPipeline
+from raiden.network.rtt import RTTEstimator
+from raiden.network.scheduler import RetryScheduler
+from raiden.settings import (
+    CACHE_TTL,
+    DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+    DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+    DEFAULT_PROTOCOL_QUEUE_WINDOW,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
+)
 from raiden.utils import isaddress, sha3, pex
-from raiden.utils.notifying_queue import NotifyingQueue
 from raiden.udp_message_handler import on_udp_message
-from raiden.transfer import views
 from raiden.transfer.state import (
     NODE_NETWORK_REACHABLE,
     NODE_NETWORK_UNKNOWN,
@@ -38,6 +53,14 @@ log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
 healthcheck_log = slogging.get_logger(__name__ + '.healthcheck')
 ping_log = slogging.get_logger(__name__ + '.ping')
 
+# Maximum distance from the expected nonce of the held balance proofs of a
+# channel, see `RaidenProtocol.receive_message`.
+MAX_HELD_ENVELOPES = 64
+
+# Maximum number of held balance proofs over all the channels, the ones that
+# arrive beyond it are dropped and retransmitted by their senders.
+MAX_HELD_ENVELOPES_TOTAL = 4096
+
 # - async_result available for code that wants to block on message acknowledgment
 # - receiver_address used to tie back the message_id to the receiver (mainly for
 #   logging purposes)
@@ -45,10 +68,6 @@ SentMessageState = namedtuple('SentMessageState', (
     'async_result',
     'receiver_address',
 ))
-HealthEvents = namedtuple('HealthEvents', (
-    'event_healthy',
-    'event_unhealthy',
-))
 
 # GOALS:
 # - Each netting channel must have the messages processed in-order, the
@@ -59,6 +78,10 @@ HealthEvents = namedtuple('HealthEvents', (
 # may be safely inferred from it.
 # - The state of the node must be synchronized among all tasks that are
 # handling messages.
+#
+# The queues and the health checks are tasks of a RetryScheduler, a single
+# greenlet retransmits the head of every queue and pings every partner, see
+# ChannelQueue and NodeHealth.
 
 
 def messageid_from_data(data, address):
@@ -72,21 +95,12 @@ def messageid_from_data(data, address):
     return int.from_bytes(sha3(data), 'big') % UINT64_MAX
 
 
-def event_first_of(*events):
-    """ Waits until one of `events` is set.
-
-    The event returned is /not/ cleared with any of the `events`, this value
-    must not be reused if the clearing behavior is used.
+def is_signed(data):
+    """ True if `data` is a signed message, its sender is recovered from the
+    signature when it is decoded.
     """
-    first_finished = Event()
-
-    if not all(isinstance(e, _AbstractLinkable) for e in events):
-        raise ValueError('all events must be linkable')
-
-    for event in events:
-        event.rawlink(lambda _: first_finished.set())
-
-    return first_finished
+    klass = CMDID_TO_CLASS.get(data[0])
+    return klass is not None and issubclass(klass, SignedMessage)
 
 
 def timeout_exponential_backoff(retries, timeout, maximum):
@@ -122,348 +136,437 @@ def timeout_two_stage(retries, timeout1, timeout2):
         yield timeout2
 
 
-def retry(protocol, data, receiver_address, event_stop, timeout_backoff):
-    """ Send data until it's acknowledged.
+class QueuedMessage:
+    """ A message of a ChannelQueue and the state of its transmissions. """
 
-    Exits when the first of the following happen:
+    __slots__ = (
+        'queue',
+        'messagedata',
+        'async_result',
+        'backoff',
+        'sent_at',
+        'retries',
+        'retry_at',
+    )
 
-    - The packet is acknowledged.
-    - Event_stop is set.
-    - The iterator timeout_backoff runs out of values.
+    def __init__(self, queue, messagedata):
+        self.queue = queue
+        self.messagedata = messagedata
+        self.async_result = None
+        self.backoff = None
+        self.sent_at = None
+        self.retries = 0
+        self.retry_at = None
+
+    def acknowledged(self):
+        return self.async_result is not None and self.async_result.ready()
+
+    def on_processed(self, async_result):
+        if async_result is self.async_result:
+            # Only a message sent once has a round trip time
+            if self.retries == 1 and async_result.value:
+                self.queue.node_health.add_rtt_sample(self.sent_at)
+
+            self.queue.protocol.scheduler.schedule(self.queue, 0)
+
+    def send(self, now):
+        """ Send the message and return the timeout for the next
+        retransmission.
+        """
+        queue = self.queue
+        protocol = queue.protocol
 
-    Returns:
-        bool: True if the message was acknowledged, False otherwise.
+        # The backoff is kept while the node is unhealthy, the retries restart
+        # from the last timeout once it recovers.
+        if protocol.adaptive_retry_timeout:
+            timeout = queue.node_health.rtt.timeout(self.retries)
+        else:
+            if self.backoff is None:
+                self.backoff = timeout_exponential_backoff(
+                    protocol.retries_before_backoff,
+                    protocol.retry_interval,
+                    protocol.retry_interval * 10,
+                )
+            timeout = next(self.backoff)
+
+        if self.retries == 0:
+            self.sent_at = now
+        self.retries += 1
+        self.retry_at = now + timeout
+
+        async_result = protocol.send_raw_with_result(
+            self.messagedata,
+            queue.receiver_address,
+        )
+
+        if async_result is not self.async_result:
+            self.async_result = async_result
+            async_result.rawlink(self.on_processed)
+
+
+class ChannelQueue:
+    """ Messages to `receiver_address` that must be processed in order.
+
+    Up to `queue_window` messages from the head of the queue are in flight,
+    each is retransmitted with an exponential backoff until it's
+    acknowledged, and the window moves forward as they are acknowledged. The
+    receiver buffers the messages that arrive out of order, see
+    `RaidenProtocol.receive_message`. Nothing is sent while the node is
+    unhealthy, the queue is resumed by its NodeHealth.
+
+    With `adaptive_retry_timeout` the backoff starts from the partner's
+    retransmission timeout, see RTTEstimator, and `retries_before_backoff` is
+    ignored.
     """
 
-    async_result = protocol.send_raw_with_result(
-        data,
-        receiver_address,
+    __slots__ = (
+        'protocol',
+        'receiver_address',
+        'node_health',
+        'messages',
+        'deadline',
     )
 
-    event_quit = event_first_of(
-        async_result,
-        event_stop,
-    )
+    def __init__(self, protocol, receiver_address, node_health):
+        self.protocol = protocol
+        self.receiver_address = receiver_address
+        self.node_health = node_health
+        self.messages = deque()
+        self.deadline = None
+
+    def __repr__(self):
+        return '<ChannelQueue to:{} messages:{}>'.format(
+            pex(self.receiver_address),
+            len(self.messages),
+        )
 
-    for timeout in timeout_backoff:
+    def __len__(self):
+        return len(self.messages)
 
-        if event_quit.wait(timeout=timeout) is True:
-            break
+    def put(self, messagedata):
+        """ Add new message to the queue. """
+        self.messages.append(QueuedMessage(self, messagedata))
 
-        protocol.send_raw_with_result(
-            data,
-            receiver_address,
-        )
+        if len(self.messages) <= self.protocol.queue_window and self.node_health.healthy:
+            self.protocol.scheduler.schedule(self, 0)
+
+    def copy(self):
+        """ Copies the current queue items. """
+        return [message.messagedata for message in self.messages]
+
+    def fire(self):
+        messages = self.messages
+        window = self.protocol.queue_window
+
+        # Only the messages in the window were sent
+        acknowledged = [
+            message
+            for message in islice(messages, window)
+            if message.acknowledged()
+        ]
+        for message in acknowledged:
+            messages.remove(message)
 
-    return async_result.ready()
+        # Packets must not be sent to an unhealthy node
+        if not messages or not self.node_health.healthy:
+            return
 
+        now = self.protocol.scheduler.clock()
+        next_retry = None
 
-def wait_recovery(event_stop, event_healthy):
-    event_first_of(
-        event_stop,
-        event_healthy,
-    ).wait()
+        # Sending may context-switch and new messages may be appended
+        for message in list(islice(messages, window)):
+            if message.retry_at is None or message.retry_at <= now:
+                message.send(now)
 
-    if event_stop.is_set():
-        return
+            if next_retry is None or message.retry_at < next_retry:
+                next_retry = message.retry_at
 
-    # There may be multiple threads waiting, do not restart them all at
-    # once to avoid message flood.
-    gevent.sleep(random.random())
+        self.protocol.scheduler.schedule(self, max(next_retry - now, 0))
 
 
-def retry_with_recovery(
-        protocol,
-        data,
-        receiver_address,
-        event_stop,
-        event_healthy,
-        event_unhealthy,
-        backoff):
-    """ Send data while the node is healthy until it's acknowledged.
+class NodeHealth:
+    """ Periodically pings `receiver_address` to check its health.
 
-    Note:
-        backoff must be an infinite iterator, otherwise this task will
-        become a hot loop.
+    Waits for the endpoint registration, then sends a Ping every
+    `nat_keepalive_timeout`. After `nat_keepalive_retries` unacknowledged
+    retransmissions the node is unreachable, its queues are stopped and the
+    Ping is retried every `nat_invitation_timeout` (for NAT punching) until
+    the node answers.
     """
 
-    # The underlying unhealthy will be cleared, care must be taken to properly
-    # clear stop_or_unhealthy too.
-    stop_or_unhealthy = event_first_of(
-        event_stop,
-        event_unhealthy,
+    __slots__ = (
+        'protocol',
+        'receiver_address',
+        'network_state',
+        'healthy',
+        'queues',
+        'endpoint_backoff',
+        'ping_nonce',
+        'ping_data',
+        'ping_result',
+        'ping_attempts',
+        'ping_sent_at',
+        'rtt',
+        'deadline',
     )
 
-    acknowledged = False
-    while not event_stop.is_set() and not acknowledged:
+    def __init__(self, protocol, receiver_address):
+        self.protocol = protocol
+        self.receiver_address = receiver_address
+        self.network_state = None
+        self.healthy = False
+        self.queues = list()
+        self.endpoint_backoff = None
+        self.ping_nonce = 0
+        self.ping_data = None
+        self.ping_result = None
+        self.ping_attempts = 0
+        self.ping_sent_at = None
+        self.rtt = RTTEstimator(
+            initial=protocol.retry_interval,
+            minimum=protocol.retry_interval / 10,
+            maximum=protocol.retry_interval * 10,
+        )
+        self.deadline = None
+
+    def __repr__(self):
+        return '<NodeHealth to:{} state:{}>'.format(
+            pex(self.receiver_address),
+            self.network_state,
+        )
+
+    def on_processed(self, async_result):
+        if async_result is self.ping_result:
+            if self.ping_attempts == 1 and async_result.value:
+                self.add_rtt_sample(self.ping_sent_at)
+
+            self.protocol.scheduler.schedule(self, 0)
 
-        # Packets must not be sent to an unhealthy node, nor should the task
-        # wait for it to become available if the message has been acknowledged.
-        if event_unhealthy.is_set():
-            wait_recovery(
-                event_stop,
-                event_healthy,
+    def add_rtt_sample(self, sent_at):
+        """ Update the RTT with a message sent once at `sent_at` and
+        acknowledged now.
+        """
+        self.rtt.update(self.protocol.scheduler.clock() - sent_at)
+
+    def fire(self):
+        protocol = self.protocol
+
+        if self.network_state is None:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(
+                    'starting healthcheck for',
+                    node=pex(protocol.raiden.address),
+                    to=pex(self.receiver_address),
+                )
+
+            # The state of the node is unknown, the queues may do work once
+            # the endpoint is known.
+            self.network_state = NODE_NETWORK_UNKNOWN
+            protocol.set_node_network_state(
+                self.receiver_address,
+                self.network_state,
             )
 
-            # Assume wait_recovery returned because unhealthy was cleared and
-            # continue execution, this is safe to do because event_stop is
-            # checked below.
-            stop_or_unhealthy.clear()
+        if not self.healthy and self.network_state == NODE_NETWORK_UNKNOWN:
+            if not self.wait_endpoint():
+                return
 
-            if event_stop.is_set():
-                return acknowledged
+        if self.ping_data is None:
+            self.ping_nonce += 1
+            self.ping_data = protocol.get_ping(self.ping_nonce)
+            self.ping_attempts = 0
 
-        acknowledged = retry(
-            protocol,
-            data,
-            receiver_address,
+        elif self.ping_result.ready():
+            self.processed()
+            return
+
+        elif (
+                self.ping_attempts >= protocol.nat_keepalive_retries and
+                self.network_state != NODE_NETWORK_UNREACHABLE
+        ):
+            self.unreachable()
 
-            # retry will stop when this event is set, allowing this task to
-            # wait for recovery when the node becomes unhealthy or to quit if
-            # the stop event is set.
-            stop_or_unhealthy,
+        if self.ping_attempts == 0:
+            self.ping_sent_at = protocol.scheduler.clock()
 
-            # Intentionally reusing backoff to restart from the last
-            # timeout/number of iterations.
-            backoff,
+        ping_result = protocol.send_raw_with_result(
+            self.ping_data,
+            self.receiver_address,
         )
+        self.ping_attempts += 1
 
-    return acknowledged
-
-
-def single_queue_send(
-        protocol,
-        receiver_address,
-        queue,
-        event_stop,
-        event_healthy,
-        event_unhealthy,
-        message_retries,
-        message_retry_timeout,
-        message_retry_max_timeout):
-
-    """ Handles a single message queue for `receiver_address`.
-
-    Notes:
-    - This task must be the only consumer of queue.
-    - This task can be killed at any time, but the intended usage is to stop it
-      with the event_stop.
-    - If there are many queues for the same receiver_address, it is the
-      caller's responsibility to not start them together to avoid congestion.
-    - This task assumes the endpoint is never cleared after it's first known.
-      If this assumption changes the code must be updated to handle unknown
-      addresses.
-    """
+        if ping_result is not self.ping_result:
+            self.ping_result = ping_result
+            ping_result.rawlink(self.on_processed)
 
-    # A NotifyingQueue is required to implement cancelability, otherwise the
-    # task cannot be stoped while the greenlet waits for an element to be
-    # inserted in the queue.
-    if not isinstance(queue, NotifyingQueue):
-        raise ValueError('queue must be a NotifyingQueue.')
+        # Retry until recovery, used for:
+        # - Checking node status.
+        # - Nat punching.
+        if self.network_state == NODE_NETWORK_UNREACHABLE:
+            timeout = protocol.nat_invitation_timeout
+        else:
+            timeout = protocol.nat_keepalive_timeout
 
-    # Reusing the event, clear must be carefully done
-    data_or_stop = event_first_of(
-        queue,
-        event_stop,
-    )
+        protocol.scheduler.schedule(self, timeout)
 
-    # Wait for the endpoint registration or to quit
-    event_first_of(
-        event_healthy,
-        event_stop,
-    ).wait()
+    def wait_endpoint(self):
+        """ Returns True if the endpoint is registered, otherwise the check
+        is rescheduled.
+        """
+        protocol = self.protocol
 
-    while True:
-        data_or_stop.wait()
+        try:
+            protocol.get_host_port(self.receiver_address)
+        except UnknownAddress:
+            if self.endpoint_backoff is None:
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(
+                        'waiting for endpoint registration',
+                        node=pex(protocol.raiden.address),
+                        to=pex(self.receiver_address),
+                    )
+
+                self.endpoint_backoff = timeout_exponential_backoff(
+                    protocol.nat_keepalive_retries,
+                    protocol.nat_keepalive_timeout,
+                    protocol.nat_invitation_timeout,
+                )
 
-        if event_stop.is_set():
-            return
+            protocol.scheduler.schedule(self, next(self.endpoint_backoff))
+            return False
 
-        # The queue is not empty at this point, so this won't raise Empty.
-        # This task being the only consumer is a requirement.
-        data = queue.peek(block=False)
+        # Don't wait to send the first Ping and to start sending messages if
+        # the endpoint is known
+        self.endpoint_backoff = None
+        self.set_healthy(recovery=False)
+        return True
 
-        backoff = timeout_exponential_backoff(
-            message_retries,
-            message_retry_timeout,
-            message_retry_max_timeout,
-        )
+    def processed(self):
+        protocol = self.protocol
 
-        try:
-            acknowledged = retry_with_recovery(
-                protocol,
-                data,
-                receiver_address,
-                event_stop,
-                event_healthy,
-                event_unhealthy,
-                backoff,
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                'node answered',
+                node=pex(protocol.raiden.address),
+                to=pex(self.receiver_address),
+                current_state=self.network_state,
+                new_state=NODE_NETWORK_REACHABLE,
             )
-        except RaidenShuttingDown:  # For a clean shutdown process
-            return
 
-        if acknowledged:
-            queue.get()
-
-            # Checking the length of the queue does not trigger a
-            # context-switch, so it's safe to assume the length of the queue
-            # won't change under our feet and when a new item will be added the
-            # event will be set again.
-            if not queue:
-                data_or_stop.clear()
-
-                if event_stop.is_set():
-                    return
-
-
-def healthcheck(
-        protocol,
-        receiver_address,
-        event_stop,
-        event_healthy,
-        event_unhealthy,
-        nat_keepalive_retries,
-        nat_keepalive_timeout,
-        nat_invitation_timeout,
-        ping_nonce):
-
-    """ Sends a periodical Ping to `receiver_address` to check its health. """
-    # pylint: disable=too-many-branches
-
-    if log.isEnabledFor(logging.DEBUG):
-        log.debug(
-            'starting healthcheck for',
-            node=pex(protocol.raiden.address),
-            to=pex(receiver_address),
-        )
+        self.ping_data = None
+        self.ping_result = None
 
-    # The state of the node is unknown, the events are set to allow the tasks
-    # to do work.
-    last_state = NODE_NETWORK_UNKNOWN
-    protocol.set_node_network_state(
-        receiver_address,
-        last_state,
-    )
+        if self.network_state != NODE_NETWORK_REACHABLE:
+            recovery = self.network_state == NODE_NETWORK_UNREACHABLE
+
+            self.network_state = NODE_NETWORK_REACHABLE
+            protocol.set_node_network_state(
+                self.receiver_address,
+                self.network_state,
+            )
+            self.set_healthy(recovery)
 
-    # Always call `clear` before `set`, since only `set` does context-switches
-    # it's easier to reason about tasks that are waiting on both events.
+        protocol.scheduler.schedule(self, protocol.nat_keepalive_timeout)
+
+    def unreachable(self):
+        protocol = self.protocol
 
-    # Wait for the end-point registration or for the node to quit
-    try:
-        protocol.get_host_port(receiver_address)
-    except UnknownAddress:
         if log.isEnabledFor(logging.DEBUG):
             log.debug(
-                'waiting for endpoint registration',
+                'node is unresponsive',
                 node=pex(protocol.raiden.address),
-                to=pex(receiver_address),
+                to=pex(self.receiver_address),
+                current_state=self.network_state,
+                new_state=NODE_NETWORK_UNREACHABLE,
+                retries=protocol.nat_keepalive_retries,
+                timeout=protocol.nat_keepalive_timeout,
             )
 
-        event_healthy.clear()
-        event_unhealthy.set()
-
-        backoff = timeout_exponential_backoff(
-            nat_keepalive_retries,
-            nat_keepalive_timeout,
-            nat_invitation_timeout,
+        self.network_state = NODE_NETWORK_UNREACHABLE
+        protocol.set_node_network_state(
+            self.receiver_address,
+            self.network_state,
         )
-        sleep = next(backoff)
 
-        while not event_stop.wait(sleep):
-            try:
-                protocol.get_host_port(receiver_address)
-            except UnknownAddress:
-                sleep = next(backoff)
-            else:
-                break
+        # The node is not healthy, stop all the queues
+        self.healthy = False
+        for queue in self.queues:
+            protocol.scheduler.cancel(queue)
+
+    def set_healthy(self, recovery):
+        if self.healthy:
+            return
+
+        self.healthy = True
+        for queue in self.queues:
+            if queue:
+                # There may be multiple queues waiting, do not restart them
+                # all at once to avoid message flood.
+                delay = random.random() if recovery else 0
+                self.protocol.scheduler.schedule(queue, delay)
 
-    # Don't wait to send the first Ping and to start sending messages if the
-    # endpoint is known
-    sleep = 0
-    event_unhealthy.clear()
-    event_healthy.set()
 
-    while not event_stop.wait(sleep):
-        sleep = nat_keepalive_timeout
+class PendingProcessed:
+    """ Message ids that will be acknowledged to `receiver_address` with a
+    single ProcessedBatch.
 
-        ping_nonce['nonce'] += 1
-        data = protocol.get_ping(
-            ping_nonce['nonce'],
+    The first id waits for at most `processed_batch_delay` seconds, the batch
+    is sent earlier if it's full.
+    """
+
+    __slots__ = (
+        'protocol',
+        'receiver_address',
+        'message_ids',
+        'deadline',
+    )
+
+    def __init__(self, protocol, receiver_address):
+        self.protocol = protocol
+        self.receiver_address = receiver_address
+        self.message_ids = list()
+        self.deadline = None
+
+    def __repr__(self):
+        return '<PendingProcessed to:{} message_ids:{}>'.format(
+            pex(self.receiver_address),
+            len(self.message_ids),
         )
 
-        # Send Ping a few times before setting the node as unreachable
-        try:
-            acknowledged = retry(
-                protocol,
-                data,
-                receiver_address,
-                event_stop,
-                [nat_keepalive_timeout] * nat_keepalive_retries,
-            )
-        except RaidenShuttingDown:  # For a clean shutdown process
-            return
+    def add(self, message_id):
+        message_ids = self.message_ids
 
-        if event_stop.is_set():
+        # A retransmission may arrive before the batch is sent
+        if message_id in message_ids:
             return
 
-        if not acknowledged:
-            if log.isEnabledFor(logging.DEBUG):
-                log.debug(
-                    'node is unresponsive',
-                    node=pex(protocol.raiden.address),
-                    to=pex(receiver_address),
-                    current_state=last_state,
-                    new_state=NODE_NETWORK_UNREACHABLE,
-                    retries=nat_keepalive_retries,
-                    timeout=nat_keepalive_timeout,
-                )
+        message_ids.append(message_id)
 
-            # The node is not healthy, clear the event to stop all queue
-            # tasks
-            last_state = NODE_NETWORK_UNREACHABLE
-            protocol.set_node_network_state(
-                receiver_address,
-                last_state,
-            )
-            event_healthy.clear()
-            event_unhealthy.set()
-
-            # Retry until recovery, used for:
-            # - Checking node status.
-            # - Nat punching.
-            try:
-                acknowledged = retry(
-                    protocol,
-                    data,
-                    receiver_address,
-                    event_stop,
-                    repeat(nat_invitation_timeout),
-                )
-            except RaidenShuttingDown:  # For a clean shutdown process
-                return
+        if len(message_ids) >= ProcessedBatch.max_identifiers:
+            self.protocol.scheduler.schedule(self, 0)
+        elif len(message_ids) == 1:
+            self.protocol.scheduler.schedule(self, self.protocol.processed_batch_delay)
 
-        if acknowledged:
-            if log.isEnabledFor(logging.DEBUG):
-                current_state = views.get_node_network_status(
-                    views.state_from_raiden(protocol.raiden),
-                    receiver_address,
-                )
-                log.debug(
-                    'node answered',
-                    node=pex(protocol.raiden.address),
-                    to=pex(receiver_address),
-                    current_state=current_state,
-                    new_state=NODE_NETWORK_REACHABLE,
-                )
+    def fire(self):
+        protocol = self.protocol
+        message_ids = self.message_ids
+        self.message_ids = list()
 
-            if last_state != NODE_NETWORK_REACHABLE:
-                last_state = NODE_NETWORK_REACHABLE
-                protocol.set_node_network_state(
-                    receiver_address,
-                    last_state,
-                )
-                event_unhealthy.clear()
-                event_healthy.set()
+        max_identifiers = ProcessedBatch.max_identifiers
+        for start in range(0, len(message_ids), max_identifiers):
+            batch = message_ids[start:start + max_identifiers]
+
+            # A single id is sent as a plain `Processed`, which is smaller
+            if len(batch) == 1:
+                message = Processed(protocol.raiden.address, batch[0])
+            else:
+                message = ProcessedBatch(protocol.raiden.address, batch)
+
+            protocol._maybe_send_processed(  # pylint: disable=protected-access
+                self.receiver_address,
+                message.encode(),
+            )
 
 
 class RaidenProtocol:
@@ -485,7 +588,15 @@ class RaidenProtocol:
             retries_before_backoff,
             nat_keepalive_retries,
             nat_keepalive_timeout,
-            nat_invitation_timeout):
+            nat_invitation_timeout,
+            message_cache_size=DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+            message_cache_ttl=DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+            message_cache_ttl_blocks=DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+            processed_batch_delay=DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+            signature_recovery_workers=DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
+            signature_recovery_max_pending=DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+            adaptive_retry_timeout=DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+            queue_window=DEFAULT_PROTOCOL_QUEUE_WINDOW):
 
         self.transport = transport
         self.discovery = discovery
@@ -498,23 +609,60 @@ class RaidenProtocol:
         self.nat_keepalive_timeout = nat_keepalive_timeout
         self.nat_invitation_timeout = nat_invitation_timeout
 
-        self.event_stop = Event()
+        # If set the `Processed` messages are delayed up to this many seconds
+        # and sent together, see PendingProcessed.
+        self.processed_batch_delay = processed_batch_delay
+
+        # If set the retransmissions of the queues are timed from the round
+        # trip times of each partner instead of `retry_interval`, see
+        # RTTEstimator. The timeout is bounded to [retry_interval / 10,
+        # retry_interval * 10] and doubles from the first retry,
+        # `retries_before_backoff` only applies to the fixed timeouts.
+        self.adaptive_retry_timeout = adaptive_retry_timeout
+
+        # Number of messages of a queue in flight, the receiver must hold the
+        # balance proofs that arrive out of order, so the default of 1 keeps
+        # the compatibility with older nodes.
+        self.queue_window = queue_window
+
+        self.scheduler = RetryScheduler()
+
+        # If set the signed messages are decoded by a pool of this many
+        # threads, see RecoveryPipeline.
+        self.recovery_pipeline = None
+        if signature_recovery_workers:
+            self.recovery_pipeline = RecoveryPipeline(
+                self.receive_recovered,
+                signature_recovery_workers,
+                signature_recovery_max_pending,
+            )
 
         self.channel_queue = dict()  # TODO: Change keys to the channel address
         self.greenlets = list()
-        self.addresses_events = dict()
+        self.addresses_to_health = dict()
+        self.addresses_to_pending_processed = dict()
+
+        # Balance proofs received out of order from the partner of a channel,
+        # maps (partner, channel) to a dict of nonce to (message, message_id)
+        self.channels_to_held_envelopes = dict()
+        self.held_envelopes = 0
 
         # Maps received and *sucessfully* processed message ids to the
         # corresponding `Processed` message. Used to ignored duplicate messages
-        # and resend the `Processed` message.
-        self.messageids_to_processedmessages = dict()
-
-        # Maps the message_id to a SentMessageState
-        self.messageids_to_states = dict()
+        # and resend the `Processed` message within the cache window.
+        self.messageids_to_processedmessages = MessageCache(
+            message_cache_size,
+            message_cache_ttl,
+            message_cache_ttl_blocks,
+        )
 
-        # Maps the addresses to a dict with the latest nonce (using a dict
-        # because python integers are immutable)
-        self.nodeaddresses_to_nonces = dict()
+        # Maps the message_id to a SentMessageState, the entries are pinned
+        # until the message is acknowledged.
+        self.messageids_to_states = MessageCache(
+            message_cache_size,
+            message_cache_ttl,
+            message_cache_ttl_blocks,
+        )
 
         cache = cachetools.TTLCache(
             maxsize=50,
@@ -525,14 +673,21 @@ class RaidenProtocol:
 
     def start(self):
         self.transport.start()
+        self.greenlets.append(self.scheduler.start())
+
+        if self.recovery_pipeline is not None:
+            self.recovery_pipeline.start()
 
     def stop_and_wait(self):
         # Stop handling incoming packets, but don't close the socket. The
         # socket can only be safely closed after all outgoing tasks are stopped
         self.transport.stop_accepting()
 
+        if self.recovery_pipeline is not None:
+            self.recovery_pipeline.stop()
+
         # Stop processing the outgoing queues
-        self.event_stop.set()
+        self.scheduler.stop()
         gevent.wait(self.greenlets)
 
         # All outgoing tasks are stopped. Now it's safe to close the socket. At
@@ -544,44 +699,37 @@ class RaidenProtocol:
         for wait_processed in self.messageids_to_states.values():
             wait_processed.async_result.set(False)
 
-    def get_health_events(self, receiver_address):
-        """ Starts a healthcheck taks for `receiver_address` and returns a
-        HealthEvents with locks to react on its current state.
+    def get_message_cache_stats(self):
+        """ Returns the size, hits, misses and evictions of the caches of the
+        received and sent messages.
         """
-        if receiver_address not in self.addresses_events:
-            self.start_health_check(receiver_address)
-
-        return self.addresses_events[receiver_address]
-
-    def start_health_check(self, receiver_address):
-        """ Starts a task for healthchecking `receiver_address` if there is not
-        one yet.
+        return {
+            'processed': self.messageids_to_processedmessages.stats(),
+            'sent': self.messageids_to_states.stats(),
+        }
+
+    def get_rtt_stats(self):
+        """ Returns the smoothed RTT, its variance and the retransmission
+        timeout of every partner.
         """
-        if receiver_address not in self.addresses_events:
-            ping_nonce = self.nodeaddresses_to_nonces.setdefault(
-                receiver_address,
-                {'nonce': 0},  # HACK: Allows the task to mutate the object
-            )
-
-            events = HealthEvents(
-                event_healthy=Event(),
-                event_unhealthy=Event(),
-            )
-
-            self.addresses_events[receiver_address] = events
+        return {
+            address: node_health.rtt.stats()
+            for address, node_health in self.addresses_to_health.items()
+        }
+
+    def get_node_health(self, receiver_address):
+        """ Starts a healthcheck for `receiver_address` and returns its
+        NodeHealth.
+        """
+        self.start_health_check(receiver_address)
+        return self.addresses_to_health[receiver_address]
 
-            self.greenlets.append(gevent.spawn(
-                healthcheck,
-                self,
-                receiver_address,
-                self.event_stop,
-                events.event_healthy,
-                events.event_unhealthy,
-                self.nat_keepalive_retries,
-                self.nat_keepalive_timeout,
-                self.nat_invitation_timeout,
-                ping_nonce,
-            ))
+    def start_health_check(self, receiver_address):
+        """ Starts healthchecking `receiver_address` if it's not done yet. """
+        if receiver_address not in self.addresses_to_health:
+            node_health = NodeHealth(self, receiver_address)
+            self.addresses_to_health[receiver_address] = node_health
+            self.scheduler.schedule(node_health, 0)
 
     def get_channel_queue(self, receiver_address, token_address):
         key = (
@@ -592,24 +740,11 @@ class RaidenProtocol:
         if key in self.channel_queue:
             return self.channel_queue[key]
 
-        queue = NotifyingQueue()
+        node_health = self.get_node_health(receiver_address)
+        queue = ChannelQueue(self, receiver_address, node_health)
+        node_health.queues.append(queue)
         self.channel_queue[key] = queue
 
-        events = self.get_health_events(receiver_address)
-
-        self.greenlets.append(gevent.spawn(
-            single_queue_send,
-            self,
-            receiver_address,
-            queue,
-            self.event_stop,
-            events.event_healthy,
-            events.event_unhealthy,
-            self.retries_before_backoff,
-            self.retry_interval,
-            self.retry_interval * 10,
-        ))
-
         if log.isEnabledFor(logging.DEBUG):
             log.debug(
                 'new queue created for',
@@ -624,7 +759,7 @@ class RaidenProtocol:
         if not isaddress(receiver_address):
             raise ValueError('Invalid address {}'.format(pex(receiver_address)))
 
-        if isinstance(message, (Processed, Ping)):
+        if isinstance(message, (Processed, ProcessedBatch, Ping)):
             raise ValueError('Do not use send for `Processed` or `Ping` messages')
 
         messagedata = message.encode()
@@ -639,11 +774,14 @@ class RaidenProtocol:
         token_address = getattr(message, 'token', b'')
 
         # Ignore duplicated messages
-        if message_id not in self.messageids_to_states:
+        wait_processed = self.messageids_to_states.get(message_id)
+        if wait_processed is None:
             async_result = AsyncResult()
-            self.messageids_to_states[message_id] = SentMessageState(
-                async_result,
-                receiver_address,
+            self.messageids_to_states.add(
+                message_id,
+                SentMessageState(async_result, receiver_address),
+                self.raiden.get_block_number(),
+                pin=True,
             )
 
             queue = self.get_channel_queue(
@@ -662,7 +800,6 @@ class RaidenProtocol:
 
             queue.put(messagedata)
         else:
-            wait_processed = self.messageids_to_states[message_id]
             async_result = wait_processed.async_result
 
         return async_result
@@ -672,8 +809,12 @@ class RaidenProtocol:
         async_result = self.send_async(receiver_address, message)
         return async_result.wait(timeout=timeout)
 
-    def maybe_send_processed(self, receiver_address, processed_message):
-        """ Send processed_message to receiver_address if the transport is running. """
+    def maybe_send_processed(self, receiver_address, processed_message, balance_proof=None):
+        """ Send processed_message to receiver_address if the transport is running.
+
+        `balance_proof` is the (channel_key, nonce) of the processed message,
+        if it has one, see `MessageCache.add`.
+        """
         if not isaddress(receiver_address):
             raise InvalidAddress('Invalid address {}'.format(pex(receiver_address)))
 
@@ -683,12 +824,26 @@ class RaidenProtocol:
         messagedata = processed_message.encode()
         message_id = processed_message.processed_message_identifier
 
-        self.messageids_to_processedmessages[message_id] = (
-            receiver_address,
-            messagedata
+        self.messageids_to_processedmessages.add(
+            message_id,
+            (receiver_address, messagedata),
+            self.raiden.get_block_number(),
+            balance_proof=balance_proof,
         )
 
-        self._maybe_send_processed(*self.messageids_to_processedmessages[message_id])
+        self._send_processed(receiver_address, message_id, messagedata)
+
+    def _send_processed(self, receiver_address, message_id, messagedata):
+        if self.processed_batch_delay:
+            pending_processed = self.addresses_to_pending_processed.get(receiver_address)
+
+            if pending_processed is None:
+                pending_processed = PendingProcessed(self, receiver_address)
+                self.addresses_to_pending_processed[receiver_address] = pending_processed
+
+            pending_processed.add(message_id)
+        else:
+            self._maybe_send_processed(receiver_address, messagedata)
 
     def _maybe_send_processed(self, receiver_address, messagedata):
         """ `Processed` messages must not go into the queue, otherwise nodes will deadlock
@@ -732,14 +887,17 @@ class RaidenProtocol:
         host_port = self.get_host_port(receiver_address)
         message_id = messageid_from_data(data, receiver_address)
 
-        if message_id not in self.messageids_to_states:
+        wait_processed = self.messageids_to_states.get(message_id)
+        if wait_processed is None:
             async_result = AsyncResult()
-            self.messageids_to_states[message_id] = SentMessageState(
-                async_result,
-                receiver_address,
+            self.messageids_to_states.add(
+                message_id,
+                SentMessageState(async_result, receiver_address),
+                self.raiden.get_block_number(),
+                pin=True,
             )
         else:
-            async_result = self.messageids_to_states[message_id].async_result
+            async_result = wait_processed.async_result
 
         if not async_result.ready():
             self.transport.send(
@@ -761,15 +919,37 @@ class RaidenProtocol:
 
         # Repeat the 'PROCESSED' message if the message has been handled before
         message_id = messageid_from_data(data, self.raiden.address)
-        if message_id in self.messageids_to_processedmessages:
-            self._maybe_send_processed(*self.messageids_to_processedmessages[message_id])
+        processed = self.messageids_to_processedmessages.get(message_id)
+        if processed is not None:
+            receiver_address, messagedata = processed
+            self._send_processed(receiver_address, message_id, messagedata)
+            return
+
+        if self.recovery_pipeline is not None and is_signed(data):
+            self.recovery_pipeline.submit(data, message_id)
             return
 
         message = decode(data)
+        self.receive_decoded(data, message_id, message)
+
+    def receive_recovered(self, data, message_id, message):
+        """ Handle a message decoded by the recovery pipeline. """
+        # A retransmission may have been queued before the first copy was
+        # handled
+        if message_id in self.messageids_to_processedmessages:
+            receiver_address, messagedata = self.messageids_to_processedmessages[message_id]
+            self._send_processed(receiver_address, message_id, messagedata)
+            return
 
+        self.receive_decoded(data, message_id, message)
+
+    def receive_decoded(self, data, message_id, message):
         if isinstance(message, Processed):
             self.receive_processed(message)
 
+        elif isinstance(message, ProcessedBatch):
+            self.receive_processed_batch(message)
+
         elif isinstance(message, Ping):
             self.receive_ping(message, message_id)
 
@@ -783,14 +963,21 @@ class RaidenProtocol:
             )
 
     def receive_processed(self, processed):
-        waitprocessed = self.messageids_to_states.get(processed.processed_message_identifier)
+        self.receive_processed_identifier(processed.processed_message_identifier)
+
+    def receive_processed_batch(self, processed_batch):
+        for message_id in processed_batch.processed_message_identifiers:
+            self.receive_processed_identifier(message_id)
+
+    def receive_processed_identifier(self, message_id):
+        waitprocessed = self.messageids_to_states.get(message_id)
 
         if waitprocessed is None:
             if log.isEnabledFor(logging.DEBUG):
                 log.debug(
                     'PROCESSED FOR UNKNOWN',
                     node=pex(self.raiden.address),
-                    message_id=processed.processed_message_identifier,
+                    message_id=message_id,
                 )
 
         else:
@@ -799,10 +986,11 @@ class RaidenProtocol:
                     'PROCESSED RECEIVED',
                     node=pex(self.raiden.address),
                     receiver=pex(waitprocessed.receiver_address),
-                    message_id=processed.processed_message_identifier,
+                    message_id=message_id,
                 )
 
             waitprocessed.async_result.set(True)
+            self.messageids_to_states.release(message_id, self.raiden.get_block_number())
 
     def receive_ping(self, ping, message_id):
         if ping_log.isEnabledFor(logging.DEBUG):
@@ -825,6 +1013,84 @@ class RaidenProtocol:
             log.debug("Couldn't send the `Processed` message", e=e)
 
     def receive_message(self, message, message_id):
+        """ Handle `message` in nonce order.
+
+        The partner may have many balance proofs of a channel in flight, see
+        `queue_window`. A balance proof that arrives before the previous one
+        would be rejected by the state machine, it is held without being
+        acknowledged until the missing ones are handled.
+
+        Only the balance proofs of the channel's partner are held, the other
+        ones are handled right away and rejected by the state machine.
+        """
+        if not isinstance(message, EnvelopeMessage):
+            self.deliver_message(message, message_id)
+            return
+
+        key = (message.sender, message.channel)
+        expected_nonce = self.raiden.get_partner_next_nonce(message.sender, message.channel)
+
+        if expected_nonce is not None and message.nonce > expected_nonce:
+            held = self.channels_to_held_envelopes.setdefault(key, dict())
+
+            # Beyond this the sender's retransmissions fill the gap
+            can_hold = (
+                message.nonce - expected_nonce <= MAX_HELD_ENVELOPES and
+                (message.nonce in held or self.held_envelopes < MAX_HELD_ENVELOPES_TOTAL)
+            )
+            if can_hold:
+                if message.nonce not in held:
+                    self.held_envelopes += 1
+                held[message.nonce] = (message, message_id)
+
+            if not held:
+                del self.channels_to_held_envelopes[key]
+
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(
+                    'HOLDING MESSAGE',
+                    node=pex(self.raiden.address),
+                    message_id=message_id,
+                    nonce=message.nonce,
+                    expected_nonce=expected_nonce,
+                )
+            return
+
+        self.deliver_message(message, message_id)
+        self.deliver_held_envelopes(key)
+
+    def deliver_held_envelopes(self, key):
+        """ Handle the held balance proofs of `key` that are next in order. """
+        held = self.channels_to_held_envelopes.get(key)
+
+        while held:
+            partner_address, channel_address = key
+            expected_nonce = self.raiden.get_partner_next_nonce(
+                partner_address,
+                channel_address,
+            )
+
+            # the retransmissions of these were handled already
+            stale = [
+                nonce
+                for nonce in held
+                if expected_nonce is None or nonce < expected_nonce
+            ]
+            for nonce in stale:
+                del held[nonce]
+            self.held_envelopes -= len(stale)
+
+            entry = held.pop(expected_nonce, None)
+            if entry is None:
+                break
+
+            self.held_envelopes -= 1
+            self.deliver_message(*entry)
+
+        if not held:
+            self.channels_to_held_envelopes.pop(key, None)
+
+    def deliver_message(self, message, message_id):
         is_debug_log_enabled = log.isEnabledFor(logging.DEBUG)
 
         if is_debug_log_enabled:
@@ -842,9 +1108,22 @@ class RaidenProtocol:
             # only send the Processed message if the message was handled without exceptions
             processed_message = Processed(self.raiden.address, message_id)
 
+            # Messages without a token, e.g. Secret, are sent by a different
+            # queue than the transfers of the same channel, only the nonces
+            # from the same queue are ordered.
+            balance_proof = None
+            if isinstance(message, EnvelopeMessage):
+                channel_key = (
+                    message.sender,
+                    getattr(message, 'token', b''),
+                    message.channel,
+                )
+                balance_proof = (channel_key, message.nonce)
+
             self.maybe_send_processed(
                 message.sender,
                 processed_message,
+                balance_proof,
             )
         except (InvalidAddress, UnknownAddress, UnknownTokenAddress) as e:
             if is_debug_log_enabled:
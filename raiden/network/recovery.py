@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+
+import gevent
+from gevent.event import Event
+from gevent.lock import BoundedSemaphore
+from gevent.threadpool import ThreadPool
+from ethereum import slogging
+
+from raiden.exceptions import InvalidProtocolMessage, RaidenShuttingDown
+from raiden.messages import decode
+
+log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# Signature recovery pipeline
+# ---------------------------
+#
+# Decoding a signed message recovers the sender's public key from the
+# signature, which is by far the most expensive step of handling a message.
+# Done in the receiving greenlet it blocks the whole node while the signature
+# is recovered.
+#
+# The pipeline decodes the datagrams in a pool of native threads, coincurve
+# releases the GIL while recovering the key, so the signatures are recovered
+# in parallel with each other and with the rest of the node. The decoded
+# messages are handed to the protocol by a single greenlet in the order the
+# datagrams arrived, so the messages of a channel are applied to the state
+# machine in the same order as without the pipeline.
+#
+# At most `max_pending` datagrams are in the pipeline, the datagrams that
+# arrive once it is full are dropped and the senders retransmit them. Waiting
+# for room instead doesn't bound anything with the UDPTransport, its server
+# spawns a greenlet per datagram, and every waiting greenlet holds its
+# datagram.
+
+
+class RecoveryPipeline:
+    """ Decodes the datagrams in a thread pool and calls `handle(data,
+    message_id, message)` in arrival order.
+    """
+
+    def __init__(self, handle, workers, max_pending):
+        self.handle = handle
+        self.pool = ThreadPool(workers)
+        self.semaphore = BoundedSemaphore(max_pending)
+        self.pending = deque()
+        self.wakeup = Event()
+        self.greenlet = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def start(self):
+        """ Spawn the greenlet that handles the decoded messages and return it. """
+        if self.greenlet is None:
+            self.greenlet = gevent.spawn(self._run)
+        return self.greenlet
+
+    def stop(self):
+        """ Stop handling the decoded messages, the pending datagrams are
+        dropped.
+        """
+        if self.greenlet is not None:
+            self.greenlet.kill()
+
+        self.pool.kill()
+        self.pending.clear()
+
+    def submit(self, data, message_id):
+        """ Queue `data` for decoding, returns False if the pipeline is full
+        and the datagram was dropped.
+        """
+        if not self.semaphore.acquire(blocking=False):
+            self.dropped += 1
+            log.debug('recovery pipeline full, datagram dropped', pending=len(self.pending))
+            return False
+
+        self.pending.append((data, message_id, self.pool.spawn(decode, data)))
+        self.wakeup.set()
+        return True
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+
+            while self.pending:
+                # The head is removed only after its result is available, so
+                # the messages are handled in arrival order
+                data, message_id, result = self.pending[0]
+                try:
+                    message = result.get()
+                except InvalidProtocolMessage as e:
+                    log.warning("Can't decode: {} (len={})".format(str(e), len(data)))
+                    message = None
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('unexpected exception decoding message')
+                    message = None
+                finally:
+                    self.pending.popleft()
+                    self.semaphore.release()
+
+                if message is None:
+                    continue
+
+                try:
+                    self.handle(data, message_id, message)
+                except RaidenShuttingDown:  # For a clean shutdown process
+                    return
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('unexpected exception handling message', message=message)
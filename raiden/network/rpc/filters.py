@@ -52,6 +52,27 @@ def get_filter_events(
 
     This handles bad encoding from geth rpc.
     """
+    return get_logs(
+        jsonrpc_client,
+        [contract_address],
+        topics,
+        from_block,
+        to_block,
+    )
+
+
+def get_logs(
+        jsonrpc_client: JSONRPCClient,
+        contract_addresses: List[Address],
+        topics: Optional[List[Union[int, List[int]]]],
+        from_block: Union[str, int] = 0,
+        to_block: Union[str, int] = 'latest') -> List[Dict]:
+    """ Get the logs of all the `contract_addresses` with a single
+    `eth_getLogs`.
+
+    A topic may be a list of topics, a log matches if its topic at that
+    position is any of them.
+    """
     if isinstance(from_block, int):
         from_block = hex(from_block)
 
@@ -61,12 +82,16 @@ def get_filter_events(
     json_data = {
         'fromBlock': from_block,
         'toBlock': to_block,
-        'address': address_encoder(normalize_address(contract_address)),
+        'address': [
+            address_encoder(normalize_address(contract_address))
+            for contract_address in contract_addresses
+        ],
     }
 
     if topics is not None:
         json_data['topics'] = [
-            topic_encoder(topic)
+            [topic_encoder(alternative) for alternative in topic]
+            if isinstance(topic, list) else topic_encoder(topic)
             for topic in topics
         ]
 
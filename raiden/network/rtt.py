@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Retransmission timeout
+# ----------------------
+#
+# A fixed retry interval is too long for a partner in the same LAN, a lost
+# packet is only retransmitted after the interval, and too short for a
+# partner with a slow link, which gets retransmissions for messages that are
+# still in flight.
+#
+# The timeout is computed per partner from the round trip times of the
+# acknowledged messages, as TCP does (RFC 6298). Only the messages that were
+# sent once are measured (Karn's algorithm), the Processed of a
+# retransmitted message can not be matched to a single transmission.
+
+# smoothing factors of the RTT and its variance
+ALPHA = 1 / 8
+BETA = 1 / 4
+
+# how many deviations of the RTT are tolerated before a retransmission
+K = 4
+
+
+class RTTEstimator:
+    """ Smoothed round trip time and retransmission timeout of a partner. """
+
+    __slots__ = (
+        'srtt',
+        'rttvar',
+        'rto',
+        'minimum',
+        'maximum',
+        'samples',
+    )
+
+    def __init__(self, initial, minimum, maximum):
+        """
+        Args:
+            initial: The timeout used until the first sample.
+            minimum: Lower bound of the timeout, the RTT of a partner in the
+                same host is almost zero but the acknowledgments may be
+                delayed by the partner.
+            maximum: Upper bound of the timeout and its backoff.
+        """
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.samples = 0
+
+    def __repr__(self):
+        return '<RTTEstimator srtt:{} rttvar:{} rto:{}>'.format(
+            self.srtt,
+            self.rttvar,
+            self.rto,
+        )
+
+    def update(self, rtt):
+        """ Add the round trip time of a message that was sent once. """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+
+        rto = self.srtt + K * self.rttvar
+        self.rto = min(max(rto, self.minimum), self.maximum)
+        self.samples += 1
+
+    def timeout(self, retries):
+        """ Timeout for the transmission after `retries` retransmissions, it
+        doubles with every retransmission.
+        """
+        # the exponent is bounded, a queue may be retransmitted indefinitely
+        return min(self.rto * 2 ** min(retries, 32), self.maximum)
+
+    def stats(self):
+        return {
+            'srtt': self.srtt,
+            'rttvar': self.rttvar,
+            'rto': self.rto,
+            'samples': self.samples,
+        }
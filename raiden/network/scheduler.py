@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import heapq
+import time
+
+import gevent
+from gevent.event import Event
+from ethereum import slogging
+
+from raiden.exceptions import RaidenShuttingDown
+
+log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# Retry scheduler
+# ---------------
+#
+# The protocol has to retransmit unacknowledged messages and ping every
+# partner periodically. Instead of one greenlet per queue and per partner,
+# each one sleeping on its own timer, these are modeled as tasks with a
+# deadline and driven by a single greenlet that runs the tasks in deadline
+# order.
+#
+# A task is any object with a `deadline` attribute and a `fire()` method.
+# Entries are invalidated lazily, the heap entries that don't match the
+# current deadline of the task are skipped.
+#
+# `fire()` runs in the scheduler greenlet, it may context-switch (e.g. when
+# the transport is throttled) but must not wait for other tasks. The tasks
+# may be rescheduled from any greenlet and from hub callbacks.
+
+# Rebuild the heap once the stale entries outnumber the live ones by this
+# factor, rescheduling a task before its deadline leaves a stale entry
+# behind.
+STALE_FACTOR = 2
+STALE_MINIMUM = 64
+
+# Number of tasks fired in a row before yielding, sending over UDP doesn't
+# context-switch and the incoming messages must still be handled when many
+# tasks are due at once.
+TASKS_PER_YIELD = 100
+
+
+class RetryScheduler:
+    """ Runs the `fire()` method of the tasks once their deadline is reached. """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.heap = list()
+        self.counter = 0
+        self.scheduled = 0
+        self.wakeup = Event()
+        self.stopped = False
+        self.greenlet = None
+
+    def __len__(self):
+        return self.scheduled
+
+    def start(self):
+        """ Spawn the greenlet that runs the tasks and return it. """
+        if self.greenlet is None:
+            self.greenlet = gevent.spawn(self._run)
+        return self.greenlet
+
+    def stop(self):
+        """ Stop running the tasks, `fire()` won't be called after the greenlet
+        exits.
+        """
+        self.stopped = True
+        self.wakeup.set()
+
+    def schedule(self, task, delay):
+        """ Run `task` after `delay` seconds, replacing its current deadline. """
+        if self.stopped:
+            return
+
+        deadline = self.clock() + delay
+
+        if task.deadline is None:
+            self.scheduled += 1
+
+        task.deadline = deadline
+
+        # The counter breaks ties, tasks are not comparable and tasks
+        # scheduled for the same time run in insertion order.
+        self.counter += 1
+        heapq.heappush(self.heap, (deadline, self.counter, task))
+
+        if len(self.heap) > STALE_FACTOR * self.scheduled + STALE_MINIMUM:
+            self._compact()
+
+        if self.heap[0][2] is task:
+            self.wakeup.set()
+
+    def cancel(self, task):
+        """ Remove the deadline of `task`, it is a no-op if the task is not
+        scheduled.
+        """
+        if task.deadline is not None:
+            task.deadline = None
+            self.scheduled -= 1
+
+    def _compact(self):
+        self.heap = [
+            entry
+            for entry in self.heap
+            if entry[2].deadline == entry[0]
+        ]
+        heapq.heapify(self.heap)
+
+    def pop_due(self, now):
+        """ Remove and return the next task due at `now`, None if there is
+        none.
+        """
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, _, task = heapq.heappop(heap)
+
+            if task.deadline == deadline:
+                task.deadline = None
+                self.scheduled -= 1
+                return task
+
+        return None
+
+    def next_timeout(self, now):
+        """ Seconds until the next live deadline, None if nothing is scheduled. """
+        heap = self.heap
+        while heap and heap[0][2].deadline != heap[0][0]:
+            heapq.heappop(heap)
+
+        if not heap:
+            return None
+
+        return max(heap[0][0] - now, 0)
+
+    def _run(self):
+        fired = 0
+        while not self.stopped:
+            if fired == TASKS_PER_YIELD:
+                fired = 0
+                gevent.sleep(0)
+                continue
+
+            now = self.clock()
+            task = self.pop_due(now)
+
+            if task is not None:
+                fired += 1
+
+                try:
+                    task.fire()
+                except RaidenShuttingDown:  # For a clean shutdown process
+                    return
+                except Exception:  # pylint: disable=broad-except
+                    # A single task must not stop the retransmissions of all
+                    # the other queues
+                    log.exception('unexpected exception on retry task', task=task)
+                continue
+
+            fired = 0
+            self.wakeup.clear()
+            self.wakeup.wait(self.next_timeout(now))
@@ -3,11 +3,14 @@
 This module contains the classes responsible to implement the network
 communication.
 """
+from collections import deque
 from time import time
 import socket
+import sys
 
 import gevent
 import logging
+from gevent.event import Event
 from gevent.server import DatagramServer
 
 from raiden.exceptions import (
@@ -143,6 +146,157 @@ class UDPTransport:
         self.server.start()
 
 
+class BatchedDatagramServer(DatagramServer):
+    """ A DatagramServer that handles the datagrams from a single greenlet.
+
+    The server reads up to `max_accept` datagrams on every wakeup of the
+    socket, instead of spawning a greenlet per datagram these are queued and
+    handled in order by a worker greenlet. Datagrams that arrive while
+    `max_pending` are waiting are dropped, as the kernel would do with a full
+    socket buffer.
+    """
+
+    def __init__(self, *args, max_pending=1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.pending_event = Event()
+        self.dropped = 0
+        self.worker = None
+
+    def do_handle(self, *args):
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        self.pending.append(args)
+        self.pending_event.set()
+
+    def start(self):
+        super().start()
+        self.worker = gevent.spawn(self._handle_pending)
+
+    def stop(self, timeout=None):
+        if self.worker is not None:
+            self.worker.kill()
+            self.worker = None
+
+        self.pending.clear()
+        super().stop(timeout)
+
+    def _handle_pending(self):
+        pending = self.pending
+
+        while True:
+            self.pending_event.wait()
+            self.pending_event.clear()
+
+            while pending:
+                data, address = pending.popleft()
+
+                try:
+                    self._handle(data, address)
+                except Exception:  # pylint: disable=broad-except
+                    self.loop.handle_error((address, self), *sys.exc_info())
+
+
+class BatchedUDPTransport(UDPTransport):
+    """ UDPTransport that handles incoming and outgoing datagrams in batches.
+
+    Incoming datagrams are drained from the socket on every wakeup and
+    handled by a single greenlet, see BatchedDatagramServer. Outgoing
+    datagrams are queued by `send`, so the callers don't block, and written
+    in order by a single greenlet, which also waits for the throttling
+    policy.
+    """
+
+    def __init__(
+            self,
+            host,
+            port,
+            socket=None,
+            protocol=None,
+            throttle_policy=DummyPolicy(),
+            max_pending=1000):
+
+        self.protocol = protocol
+        if socket is not None:
+            self.server = BatchedDatagramServer(
+                socket,
+                handle=self.receive,
+                max_pending=max_pending,
+            )
+        else:
+            self.server = BatchedDatagramServer(
+                (host, port),
+                handle=self.receive,
+                max_pending=max_pending,
+            )
+        self.host = self.server.server_host
+        self.port = self.server.server_port
+        self.throttle_policy = throttle_policy
+
+        self.outgoing = deque()
+        self.outgoing_event = Event()
+        self.writer = None
+
+    def send(self, sender, host_port, bytes_):
+        """ Queue `bytes_` to be sent to `host_port`, this doesn't
+        context-switch.
+
+        Args:
+            sender (address): The address of the running node.
+            host_port (Tuple[(str, int)]): Tuple with the host name and port number.
+            bytes_ (bytes): The bytes that are going to be sent through the wire.
+        """
+        if not hasattr(self.server, 'socket'):
+            raise RuntimeError('trying to send a message on a closed server')
+
+        self.outgoing.append((sender, host_port, bytes_))
+        self.outgoing_event.set()
+
+    def _write_outgoing(self):
+        outgoing = self.outgoing
+
+        while True:
+            self.outgoing_event.wait()
+            self.outgoing_event.clear()
+
+            while outgoing:
+                batch = list(outgoing)
+                outgoing.clear()
+
+                sendto = self.server.socket.sendto
+                for sender, host_port, bytes_ in batch:
+                    # Only context-switch if the datagram is throttled
+                    sleep_timeout = self.throttle_policy.consume(1)
+                    if sleep_timeout:
+                        gevent.sleep(sleep_timeout)
+
+                    try:
+                        sendto(bytes_, host_port)
+                    except socket.error as e:
+                        # A single unreachable destination must not stop the
+                        # writer, the message is lost as any other datagram
+                        log.error('sending datagram failed', host_port=host_port, error=e)
+                        continue
+
+                    # enable debugging using the DummyNetwork callbacks
+                    DummyTransport.network.track_send(sender, host_port, bytes_)
+
+    def stop(self):
+        if self.writer is not None:
+            self.writer.kill()
+            self.writer = None
+
+        self.outgoing.clear()
+        super().stop()
+
+    def start(self):
+        super().start()
+        self.writer = gevent.spawn(self._write_outgoing)
+
+
 class DummyNetwork:
     """ Store global state for an in process network, this won't use a real
     network protocol just greenlet communication.
@@ -26,7 +26,8 @@ from raiden.blockchain.events import (
 )
 from raiden.raiden_event_handler import on_raiden_event
 from raiden.tasks import AlarmTask
-from raiden.transfer import views, node
+from raiden.settings import ROUTE_CACHE_SIZE
+from raiden.transfer import channel, views, node
 from raiden.transfer.state import (
     RouteState,
     PaymentNetworkState,
@@ -48,7 +49,7 @@ from raiden.transfer.mediated_transfer.state_change import (
     ActionInitMediator,
     ActionInitTarget,
 )
-from raiden.exceptions import InvalidAddress, RaidenShuttingDown
+from raiden.exceptions import InvalidAddress
 from raiden.messages import SignedMessage
 from raiden.network.protocol import RaidenProtocol
 from raiden.connection_manager import ConnectionManager
@@ -89,6 +90,7 @@ def initiator_init(
         target_address,
         transfer_amount,
         previous_address,
+        raiden.route_cache,
     )
     init_initiator_statechange = ActionInitInitiator(
         registry_address,
@@ -109,6 +111,7 @@ def mediator_init(raiden, transfer):
         from_transfer.target,
         from_transfer.lock.amount,
         transfer.sender,
+        raiden.route_cache,
     )
     from_route = RouteState(
         transfer.sender,
@@ -213,12 +216,21 @@ class RaidenService:
             config['protocol']['nat_keepalive_retries'],
             config['protocol']['nat_keepalive_timeout'],
             config['protocol']['nat_invitation_timeout'],
+            config['protocol']['message_cache_size'],
+            config['protocol']['message_cache_ttl'],
+            config['protocol']['message_cache_ttl_blocks'],
+            config['protocol']['processed_batch_delay'],
+            config['protocol']['signature_recovery_workers'],
+            config['protocol']['signature_recovery_max_pending'],
+            config['protocol']['adaptive_retry_timeout'],
+            config['protocol']['queue_window'],
         )
 
         # TODO: remove this cyclic dependency
         transport.protocol = self.protocol
 
-        self.blockchain_events = BlockchainEvents()
+        self.blockchain_events = BlockchainEvents(chain)
+        self.route_cache = routing.RouteCache(ROUTE_CACHE_SIZE)
         self.alarm = AlarmTask(chain)
         self.shutdown_timeout = config['shutdown_timeout']
         self._block_number = None
@@ -267,10 +279,24 @@ class RaidenService:
             assert self.db_lock.is_locked
 
         # The database may be :memory:
-        storage = sqlite.SQLiteStorage(self.database_path, serialize.PickleSerializer())
+        storage = sqlite.SQLiteStorage(
+            self.database_path,
+            serialize.SERIALIZERS[self.config['database_serializer']],
+            synchronous=self.config['database_synchronous'],
+            group_commit=self.config['database_group_commit'],
+        )
+        snapshot_policy = wal.SnapshotPolicy(
+            self.config['snapshot']['state_change_interval'],
+            self.config['snapshot']['block_interval'],
+        )
+        # node.state_transition does path copying, there is no need to copy
+        # the whole state for every state change
         self.wal, unapplied_events = wal.restore_from_latest_snapshot(
             node.state_transition,
             storage,
+            copy_on_write=True,
+            snapshot_policy=snapshot_policy,
+            compaction=self.config['database_compaction'],
         )
 
         last_log_block_number = None
@@ -333,18 +359,12 @@ class RaidenService:
         # contact the disconnected client
         gevent.wait(wait_for, timeout=self.shutdown_timeout)
 
-        # Filters must be uninstalled after the alarm task has stopped. Since
-        # the events are polled by an alarm task callback, if the filters are
-        # uninstalled before the alarm task is fully stopped the callback
-        # `poll_blockchain_events` will fail.
-        #
-        # We need a timeout to prevent an endless loop from trying to
-        # contact the disconnected client
-        try:
-            with gevent.Timeout(self.shutdown_timeout):
-                self.blockchain_events.uninstall_all_event_listeners()
-        except (gevent.timeout.Timeout, RaidenShuttingDown):
-            pass
+        # The listeners must be removed after the alarm task has stopped, the
+        # events are polled by an alarm task callback.
+        self.blockchain_events.uninstall_all_event_listeners()
+
+        # Keep the replay on the next start short
+        self.wal.snapshot()
 
         if self.db_lock is not None:
             self.db_lock.release()
@@ -370,6 +390,7 @@ class RaidenService:
             block_number = self.get_block_number()
 
         event_list = self.wal.log_and_dispatch(state_change, block_number)
+        self.route_cache.on_state_change(state_change)
 
         for event in event_list:
             if is_logging:
@@ -382,6 +403,11 @@ class RaidenService:
     def set_node_network_state(self, node_address, network_state):
         state_change = ActionChangeNodeNetworkState(node_address, network_state)
         self.wal.log_and_dispatch(state_change, self.get_block_number())
+        self.route_cache.on_state_change(state_change)
+
+    def get_route_cache_stats(self):
+        """ Returns the size, hit rate and invalidations of the route cache. """
+        return self.route_cache.stats()
 
     def start_health_check_for(self, node_address):
         self.protocol.start_health_check(node_address)
@@ -389,9 +415,31 @@ class RaidenService:
     def get_block_number(self):
         return views.block_number(self.wal.state_manager.current_state)
 
-    def poll_blockchain_events(self, current_block=None):  # pylint: disable=unused-argument
+    def get_partner_next_nonce(self, partner_address, channel_address):
+        """ Returns the nonce of the next balance proof expected from
+        `partner_address` in `channel_address`, None if the channel is unknown
+        or `partner_address` is not its partner.
+        """
+        node_state = views.state_from_raiden(self)
+
+        for payment_network_id in node_state.identifiers_to_paymentnetworks:
+            channel_state = views.search_for_channel(
+                node_state,
+                payment_network_id,
+                channel_address,
+            )
+
+            if channel_state is not None:
+                if channel_state.partner_state.address != partner_address:
+                    return None
+
+                return channel.get_next_nonce(channel_state.partner_state)
+
+        return None
+
+    def poll_blockchain_events(self, current_block=None):
         with self.event_poll_lock:
-            for event in self.blockchain_events.poll_blockchain_events():
+            for event in self.blockchain_events.poll_blockchain_events(current_block):
                 on_blockchain_event(self, event)
 
     def sign(self, message):
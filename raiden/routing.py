@@ -1,26 +1,38 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import OrderedDict
 from typing import List, Tuple
-from heapq import heappush, heappop
+from heapq import heapify
 
-import networkx
 from ethereum import slogging
 
 from raiden.transfer import channel, views
+from raiden.transfer.graph import ChannelGraph
 from raiden.transfer.state import (
     CHANNEL_STATE_OPENED,
     NODE_NETWORK_REACHABLE,
     NODE_NETWORK_UNKNOWN,
+    NODE_NETWORK_UNREACHABLE,
 )
 from raiden.utils import isaddress, pex, typing
 from raiden.transfer.state import RouteState
+from raiden.transfer.state_change import (
+    ActionChangeNodeNetworkState,
+    ContractReceiveChannelClosed,
+    ContractReceiveChannelNew,
+    ContractReceiveChannelNewBalance,
+    ContractReceiveChannelSettled,
+    ContractReceiveNewPaymentNetwork,
+    ContractReceiveNewTokenNetwork,
+    ContractReceiveRouteNew,
+)
 
 log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
 
 
 def make_graph(
     edge_list: List[Tuple[typing.Address, typing.Address]]
-) -> networkx.Graph:
+) -> ChannelGraph:
     """ Returns a graph that represents the connections among the netting
     contracts.
     Args:
@@ -39,42 +51,323 @@ def make_graph(
         if not isaddress(origin) or not isaddress(destination):
             raise ValueError('All values in edge_list must be valid addresses')
 
-    graph = networkx.Graph()  # undirected graph, for bidirectional channels
-
-    for first, second in edge_list:
-        graph.add_edge(first, second)
-
-    return graph
+    return ChannelGraph(edge_list)  # undirected graph, for bidirectional channels
 
 
 def get_ordered_partners(
-    network_graph: networkx.Graph,
+    network_graph: ChannelGraph,
     from_address: typing.Address,
     to_address: typing.Address
 ) -> List:
-    paths = list()
-
-    try:
-        all_neighbors = networkx.all_neighbors(network_graph, from_address)
-    except networkx.NetworkXError:
+    """ Returns a heap of (distance, neighbor) with the neighbors of
+    `from_address` that have a path to `to_address`.
+
+    The distances are computed by a single breadth-first search from
+    `to_address`, instead of a search per neighbor. The search stops at the
+    layer `d - 1` adjacent to the closest neighbors. The other neighbors are
+    then adjacent to the layer `d`, at `d + 1`, or reach it through
+    `from_address`, at `d + 2`. Neither the layer `d` nor the layers beyond
+    it are expanded.
+    """
+    if from_address not in network_graph or to_address not in network_graph:
         # If `our_address` is not in the graph, no channels opened with the
         # address
         return []
 
-    for neighbor in all_neighbors:
-        try:
-            length = networkx.shortest_path_length(
-                network_graph,
-                neighbor,
-                to_address,
-            )
-            heappush(paths, (length, neighbor))
-        except (networkx.NetworkXNoPath, networkx.NodeNotFound):
-            pass
-
+    indexes = network_graph.indexes
+    addresses = network_graph.addresses
+    adjacency = network_graph.adjacency
+
+    to_index = indexes[to_address]
+    neighbors = adjacency[indexes[from_address]]
+
+    if to_index in neighbors:
+        paths = [(0, to_address)]
+        for neighbor in neighbors:
+            if neighbor != to_index:
+                distance = 1 if to_index in adjacency[neighbor] else 2
+                paths.append((distance, addresses[neighbor]))
+
+        heapify(paths)
+        return paths
+
+    distance = 0
+    layer = {to_index}
+    visited = {to_index}
+
+    while True:
+        closest = [
+            neighbor
+            for neighbor in neighbors
+            if not layer.isdisjoint(adjacency[neighbor])
+        ]
+
+        if closest:
+            break
+
+        next_layer = set()
+        for node in layer:
+            next_layer.update(adjacency[node])
+
+        layer = next_layer - visited
+        if not layer:
+            return []
+
+        visited.update(layer)
+        distance += 1
+
+    closest_distance = distance + 1
+    paths = [(closest_distance, addresses[neighbor]) for neighbor in closest]
+    closest = set(closest)
+
+    # The part of the layer `d` adjacent to the other neighbors
+    candidates = set()
+    for neighbor in neighbors:
+        if neighbor not in closest:
+            candidates.update(adjacency[neighbor])
+    candidates -= visited
+
+    if len(candidates) < len(layer):
+        next_layer = {
+            node
+            for node in candidates
+            if not layer.isdisjoint(adjacency[node])
+        }
+    else:
+        next_layer = set()
+        for node in layer:
+            next_layer.update(adjacency[node])
+
+    for neighbor in neighbors:
+        if neighbor not in closest:
+            if next_layer.isdisjoint(adjacency[neighbor]):
+                paths.append((closest_distance + 2, addresses[neighbor]))
+            else:
+                paths.append((closest_distance + 1, addresses[neighbor]))
+
+    heapify(paths)
     return paths
 
 
+def get_ranked_partners(
+    network_graph: ChannelGraph,
+    network_statuses: typing.Dict,
+    from_address: typing.Address,
+    to_address: typing.Address,
+) -> List:
+    """ Returns a sorted list of (distance, neighbor) with the neighbors of
+    `from_address` that have a feasible path to `to_address`.
+
+    A path is feasible if it doesn't go through `from_address` nor through
+    an unreachable node, the other paths can't mediate the transfer. The
+    distance is the number of hops from the neighbor to `to_address`.
+
+    The paths are found by a single breadth-first search from `to_address`,
+    which stops once every neighbor was ranked.
+    """
+    if from_address not in network_graph or to_address not in network_graph:
+        return []
+
+    if network_statuses.get(to_address) == NODE_NETWORK_UNREACHABLE:
+        return []
+
+    indexes = network_graph.indexes
+    addresses = network_graph.addresses
+    adjacency = network_graph.adjacency
+
+    from_index = indexes[from_address]
+    to_index = indexes[to_address]
+    unreachable = {
+        indexes[address]
+        for address, network_state in network_statuses.items()
+        if network_state == NODE_NETWORK_UNREACHABLE and address in indexes
+    }
+
+    # The search only ends early once all the pending neighbors are ranked,
+    # the ones without a path are left out from the start
+    pending_neighbors = set()
+    for neighbor in adjacency[from_index]:
+        is_dead_end = len(adjacency[neighbor]) == 1 and neighbor != to_index
+
+        if neighbor not in unreachable and not is_dead_end:
+            pending_neighbors.add(neighbor)
+
+    # The unreachable nodes and `from_address` are never expanded
+    visited = unreachable | {from_index, to_index}
+
+    ranked = list()
+    distance = 0
+    layer = [to_index]
+
+    while layer and pending_neighbors:
+        next_layer = list()
+
+        for node in layer:
+            if node in pending_neighbors:
+                ranked.append((distance, addresses[node]))
+                pending_neighbors.discard(node)
+
+            for payer in adjacency[node]:
+                if payer not in visited:
+                    visited.add(payer)
+                    next_layer.append(payer)
+
+        layer = next_layer
+        distance += 1
+
+    ranked.sort()
+    return ranked
+
+
+# State changes that change the channel graph of a single token network
+TOKEN_NETWORK_STATE_CHANGES = (
+    ContractReceiveChannelClosed,
+    ContractReceiveChannelNew,
+    ContractReceiveChannelNewBalance,
+    ContractReceiveChannelSettled,
+    ContractReceiveRouteNew,
+)
+
+# State changes that may change every token network
+NODE_STATE_CHANGES = (
+    ContractReceiveNewPaymentNetwork,
+    ContractReceiveNewTokenNetwork,
+)
+
+
+class RouteCache:
+    """ LRU of the ranked partners of each token network, keyed by (from,
+    target).
+
+    Only the search in the channel graph is cached, the first hop is checked
+    for every transfer by `get_best_routes`. The balances of our channels
+    change with every transfer, the graph and the network state of the nodes
+    don't, so the ranking of a hub that mediates for the same targets is
+    reused until the graph or the reachability of a node changes.
+
+    `on_state_change` must see every state change that is dispatched, a
+    token network is dropped when one of its channels changes or when the
+    network state of one of its nodes changes, and the whole cache is dropped
+    when a network is added.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.token_networks = dict()
+
+        # The graph the entries of each token network were computed with
+        self.graphs = dict()
+
+        # The last network state of the nodes, as seen by `on_state_change`
+        self.network_statuses = dict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.token_networks.values())
+
+    def get_ranked_partners(
+            self,
+            token_network_key: Tuple[typing.Address, typing.Address],
+            network_graph: ChannelGraph,
+            network_statuses: typing.Dict,
+            from_address: typing.Address,
+            to_address: typing.Address,
+    ) -> List:
+        """ `get_ranked_partners`, reused until the token network changes. """
+        key = (from_address, to_address)
+
+        entries = self.token_networks.get(token_network_key)
+        if entries is None:
+            entries = OrderedDict()
+            self.token_networks[token_network_key] = entries
+            self.graphs[token_network_key] = network_graph
+
+        ranked = entries.get(key)
+        if ranked is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return ranked
+
+        self.misses += 1
+        ranked = get_ranked_partners(
+            network_graph,
+            network_statuses,
+            from_address,
+            to_address,
+        )
+
+        entries[key] = ranked
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+        return ranked
+
+    def invalidate(self, token_network_key=None):
+        """ Drop the entries of a token network, or all of them. """
+        if token_network_key is None:
+            if any(self.token_networks.values()):
+                self.invalidations += 1
+            self.token_networks.clear()
+            self.graphs.clear()
+
+        elif self.token_networks.pop(token_network_key, None):
+            self.graphs.pop(token_network_key)
+            self.invalidations += 1
+
+    def on_state_change(self, state_change):
+        if isinstance(state_change, TOKEN_NETWORK_STATE_CHANGES):
+            self.invalidate((
+                state_change.payment_network_identifier,
+                state_change.token_address,
+            ))
+
+        elif isinstance(state_change, ActionChangeNodeNetworkState):
+            self.on_network_state_change(state_change.node_address, state_change.network_state)
+
+        elif isinstance(state_change, NODE_STATE_CHANGES):
+            self.invalidate()
+
+    def on_network_state_change(self, node_address, network_state):
+        """ Drop the token networks of `node_address` if its network state
+        changed.
+        """
+        previous = self.network_statuses.get(node_address)
+        self.network_statuses[node_address] = network_state
+
+        # The first change of a node always invalidates, the entries may have
+        # been computed with the state restored from the write-ahead-log
+        if previous == network_state:
+            return
+
+        token_network_keys = [
+            token_network_key
+            for token_network_key, network_graph in self.graphs.items()
+            if node_address in network_graph
+        ]
+        for token_network_key in token_network_keys:
+            self.invalidate(token_network_key)
+
+    def clear(self):
+        self.token_networks.clear()
+        self.graphs.clear()
+        self.network_statuses.clear()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+
 def get_best_routes(
     node_state: 'NodeState',
     payment_network_id: typing.Address,
@@ -83,11 +376,14 @@ def get_best_routes(
     to_address: typing.Address,
     amount: int,
     previous_address: typing.Address,
+    route_cache: RouteCache = None,
 ) -> List[RouteState]:
     """ Returns a list of channels that can be used to make a transfer.
 
     This will filter out channels that are not open and don't have enough
-    capacity.
+    capacity. The routes are ranked by the length of the feasible path
+    behind them, see `get_ranked_partners`, the ranking is reused from
+    `route_cache` if given.
     """
     # TODO: Route ranking.
     # Rate each route to optimize the fee price/quality of each route and add a
@@ -103,21 +399,30 @@ def get_best_routes(
 
     network_statuses = views.get_networkstatuses(node_state)
 
-    neighbors_heap = get_ordered_partners(
-        token_network.network_graph.network,
-        from_address,
-        to_address,
-    )
+    if route_cache is None:
+        ranked_partners = get_ranked_partners(
+            token_network.network_graph.network,
+            network_statuses,
+            from_address,
+            to_address,
+        )
+    else:
+        ranked_partners = route_cache.get_ranked_partners(
+            (payment_network_id, token_address),
+            token_network.network_graph.network,
+            network_statuses,
+            from_address,
+            to_address,
+        )
 
-    if not neighbors_heap and log.isEnabledFor(logging.WARNING):
+    if not ranked_partners and log.isEnabledFor(logging.WARNING):
         log.warn(
             'No routes available from %s to %s',
             pex(from_address),
             pex(to_address),
         )
 
-    while neighbors_heap:
-        _, partner_address = heappop(neighbors_heap)
+    for _, partner_address in ranked_partners:
 
         channel_state = views.get_channelstate_for(
             node_state,
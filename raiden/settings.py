@@ -6,6 +6,8 @@ INITIAL_PORT = 40001
 
 RPC_CACHE_TTL = 600
 CACHE_TTL = 60
+SENDER_CACHE_SIZE = 10000
+ROUTE_CACHE_SIZE = 1000
 ESTIMATED_BLOCK_TIME = 7
 GAS_LIMIT = 3141592  # Morden's gasLimit.
 GAS_LIMIT_HEX = '0x' + hexlify(int_to_big_endian(GAS_LIMIT)).decode('utf-8')
@@ -15,6 +17,14 @@ DEFAULT_PROTOCOL_RETRIES_BEFORE_BACKOFF = 5
 DEFAULT_PROTOCOL_THROTTLE_CAPACITY = 10.
 DEFAULT_PROTOCOL_THROTTLE_FILL_RATE = 10.
 DEFAULT_PROTOCOL_RETRY_INTERVAL = 1.
+DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE = 10000
+DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL = 600
+DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS = 100
+DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY = 0
+DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS = 0
+DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING = 1000
+DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT = False
+DEFAULT_PROTOCOL_QUEUE_WINDOW = 1
 
 DEFAULT_REVEAL_TIMEOUT = 10
 DEFAULT_SETTLE_TIMEOUT = DEFAULT_REVEAL_TIMEOUT * 9
@@ -31,5 +41,8 @@ DEFAULT_NAT_INVITATION_TIMEOUT = 15
 
 DEFAULT_SHUTDOWN_TIMEOUT = 2
 
+DEFAULT_SNAPSHOT_STATE_CHANGE_INTERVAL = 500
+DEFAULT_SNAPSHOT_BLOCK_INTERVAL = 100
+
 ORACLE_BLOCKNUMBER_DRIFT_TOLERANCE = 3
 ETHERSCAN_API = 'https://{network}.etherscan.io/api?module=proxy&action={action}'
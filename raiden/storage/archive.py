@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import struct
+
+# Archive segments
+# ----------------
+#
+# Rows of the write-ahead-log that are already covered by the state snapshot
+# can be moved out of the database into compressed segment files. A segment
+# holds the state changes of a contiguous identifier range and the events
+# they produced, the data is kept serialized exactly as it was in the
+# database.
+#
+# Layout of the uncompressed content:
+#
+#   magic, version, number of events, number of state changes
+#   events: identifier, source_statechange_id, block_number, event_type,
+#           channel_identifier, data
+#   state changes: identifier, data
+#
+# The events come first, so that queries can stop reading before the state
+# changes.
+
+SEGMENT_MAGIC = b'RDNA'
+SEGMENT_VERSION = 1
+
+HEADER = struct.Struct('>4sBQQ')
+EVENT_HEADER = struct.Struct('>QQQ')
+STATE_CHANGE_HEADER = struct.Struct('>Q')
+LENGTH = struct.Struct('>i')
+
+# LENGTH value used for None
+NONE_LENGTH = -1
+
+
+def _pack_bytes(parts, value):
+    if value is None:
+        parts.append(LENGTH.pack(NONE_LENGTH))
+    else:
+        parts.append(LENGTH.pack(len(value)))
+        parts.append(value)
+
+
+def _unpack_bytes(data, position):
+    length, = LENGTH.unpack_from(data, position)
+    position += LENGTH.size
+
+    if length == NONE_LENGTH:
+        return None, position
+
+    end = position + length
+    return bytes(data[position:end]), end
+
+
+def write_segment(path, events, state_changes):
+    """ Write a compressed segment.
+
+    The file is written to a temporary path and renamed, a segment is either
+    complete or missing.
+
+    Args:
+        path: Destination of the segment.
+        events: List of (identifier, source_statechange_id, block_number,
+            event_type, channel_identifier, data) rows.
+        state_changes: List of (identifier, data) rows.
+    """
+    parts = [HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(events), len(state_changes))]
+
+    for identifier, source_statechange_id, block_number, event_type, channel, data in events:
+        parts.append(EVENT_HEADER.pack(identifier, source_statechange_id, block_number))
+        _pack_bytes(parts, event_type.encode('utf8') if event_type is not None else None)
+        _pack_bytes(parts, channel)
+        _pack_bytes(parts, data)
+
+    for identifier, data in state_changes:
+        parts.append(STATE_CHANGE_HEADER.pack(identifier))
+        _pack_bytes(parts, data)
+
+    temporary_path = path + '.tmp'
+    with gzip.open(temporary_path, 'wb') as segment_file:
+        segment_file.write(b''.join(parts))
+
+    os.replace(temporary_path, path)
+
+
+def index_events(events):
+    """ Summarize the event rows of a segment for the queries.
+
+    Returns:
+        The list of (event_type, channel_identifier, first_block, last_block)
+        of every distinct type and channel pair in `events`.
+    """
+    blocks = dict()
+    for _, _, block_number, event_type, channel, _ in events:
+        key = (event_type, channel)
+        first_block, last_block = blocks.get(key, (block_number, block_number))
+        blocks[key] = (min(first_block, block_number), max(last_block, block_number))
+
+    return [
+        (event_type, channel, first_block, last_block)
+        for (event_type, channel), (first_block, last_block) in blocks.items()
+    ]
+
+
+def _read_segment(path):
+    with gzip.open(path, 'rb') as segment_file:
+        data = segment_file.read()
+
+    magic, version, number_of_events, number_of_state_changes = HEADER.unpack_from(data, 0)
+
+    if magic != SEGMENT_MAGIC:
+        raise ValueError('{} is not an archive segment'.format(path))
+
+    if version != SEGMENT_VERSION:
+        raise ValueError('unknown archive segment version {}'.format(version))
+
+    return data, HEADER.size, number_of_events, number_of_state_changes
+
+
+def _iter_events(data, position, number_of_events):
+    for _ in range(number_of_events):
+        identifier, source_statechange_id, block_number = EVENT_HEADER.unpack_from(
+            data,
+            position,
+        )
+        position += EVENT_HEADER.size
+
+        event_type, position = _unpack_bytes(data, position)
+        channel, position = _unpack_bytes(data, position)
+        event_data, position = _unpack_bytes(data, position)
+
+        if event_type is not None:
+            event_type = event_type.decode('utf8')
+
+        yield (
+            (identifier, source_statechange_id, block_number, event_type, channel, event_data),
+            position,
+        )
+
+
+def read_segment_events(path):
+    """ Return the list of event rows of the segment, in identifier order. """
+    data, position, number_of_events, _ = _read_segment(path)
+    return [row for row, _ in _iter_events(data, position, number_of_events)]
+
+
+def read_segment_state_changes(path):
+    """ Return the list of (identifier, data) state change rows of the
+    segment, in identifier order.
+    """
+    data, position, number_of_events, number_of_state_changes = _read_segment(path)
+
+    for _, position in _iter_events(data, position, number_of_events):
+        pass
+
+    state_changes = list()
+    for _ in range(number_of_state_changes):
+        identifier, = STATE_CHANGE_HEADER.unpack_from(data, position)
+        position += STATE_CHANGE_HEADER.size
+
+        state_change_data, position = _unpack_bytes(data, position)
+        state_changes.append((identifier, state_change_data))
+
+    return state_changes
@@ -1,5 +1,16 @@
 # -*- coding: utf-8 -*-
 import pickle
+import random
+import struct
+
+from raiden.transfer import channel
+from raiden.transfer import events
+from raiden.transfer import state
+from raiden.transfer import state_change
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.mediated_transfer import events as mediated_events
+from raiden.transfer.mediated_transfer import state as mediated_state
+from raiden.transfer.mediated_transfer import state_change as mediated_state_change
 
 
 class PickleSerializer:
@@ -10,3 +21,822 @@ class PickleSerializer:
     @staticmethod
     def deserialize(data):
         return pickle.loads(data)
+
+
+# Binary serialization
+# --------------------
+#
+# Each record starts with a magic byte and the schema version used to encode
+# it, followed by a single tagged value. Objects are encoded as the index of
+# their class in the schema followed by the values of the schema fields, in
+# order. Addresses and hashes are stored without a length prefix.
+#
+# Only the classes listed in the schema can be decoded, so reading a database
+# doesn't execute arbitrary code as unpickling does.
+#
+# Objects referenced more than once, e.g. a channel that is reachable by
+# identifier and by partner address, are encoded once and then by reference,
+# preserving the identity on decoding. Repeated addresses and hashes are
+# encoded by reference as well.
+#
+# The schema is append only. Changing the fields of a class requires a new
+# schema version, the old version must be kept to decode existing records.
+
+BINARY_MAGIC = 0xb5
+
+TAG_NONE = 0
+TAG_TRUE = 1
+TAG_FALSE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_BYTES = 5
+TAG_ADDRESS = 6
+TAG_HASH = 7
+TAG_STR = 8
+TAG_LIST = 9
+TAG_TUPLE = 10
+TAG_DICT = 11
+TAG_OBJECT = 12
+TAG_REFERENCE = 13
+TAG_MISSING = 14
+TAG_RANDOM = 15
+TAG_GRAPH = 16  # reserved, the networkx.Graph is no longer stored
+TAG_BYTES_REFERENCE = 17
+TAG_CHANNEL_GRAPH = 18
+
+ADDRESS_LENGTH = 20
+HASH_LENGTH = 32
+
+FLOAT = struct.Struct('>d')
+
+# Used for the slots that were not set
+MISSING = object()
+
+SCHEMA_V1 = (
+    (state.NodeState, (
+        'pseudo_random_generator',
+        'block_number',
+        'queueids_to_queues',
+        'identifiers_to_paymentnetworks',
+        'nodeaddresses_to_networkstates',
+        'payment_mapping',
+    )),
+    (state.PaymentNetworkState, (
+        'address',
+        'tokenidentifiers_to_tokennetworks',
+        'tokenaddresses_to_tokennetworks',
+    )),
+    (state.TokenNetworkState, (
+        'address',
+        'token_address',
+        'network_graph',
+        'channelidentifiers_to_channels',
+        'partneraddresses_to_channels',
+    )),
+    (state.TokenNetworkGraphState, (
+        'network',
+    )),
+    (state.PaymentMappingState, (
+        'secrethashes_to_task',
+    )),
+    (state.PaymentMappingState.InitiatorTask, None),
+    (state.PaymentMappingState.MediatorTask, None),
+    (state.PaymentMappingState.TargetTask, None),
+    (state.RouteState, (
+        'node_address',
+        'channel_identifier',
+    )),
+    (state.BalanceProofUnsignedState, (
+        'nonce',
+        'transferred_amount',
+        'locksroot',
+        'channel_address',
+    )),
+    (state.BalanceProofSignedState, (
+        'nonce',
+        'transferred_amount',
+        'locksroot',
+        'channel_address',
+        'message_hash',
+        'signature',
+        'sender',
+    )),
+    (state.HashTimeLockState, (
+        'amount',
+        'expiration',
+        'secrethash',
+        'encoded',
+        'lockhash',
+    )),
+    (state.UnlockPartialProofState, (
+        'lock',
+        'secret',
+    )),
+    (state.UnlockProofState, (
+        'merkle_proof',
+        'lock_encoded',
+        'secret',
+    )),
+    (state.TransactionExecutionStatus, (
+        'started_block_number',
+        'finished_block_number',
+        'result',
+    )),
+    (state.MerkleTreeState, (
+        'layers',
+    )),
+    (state.NettingChannelEndState, (
+        'address',
+        'contract_balance',
+        'secrethashes_to_lockedlocks',
+        'secrethashes_to_unlockedlocks',
+        'merkletree',
+        'balance_proof',
+    )),
+    (state.NettingChannelState, (
+        'identifier',
+        'token_address',
+        'reveal_timeout',
+        'settle_timeout',
+        'our_state',
+        'partner_state',
+        'deposit_transaction_queue',
+        'open_transaction',
+        'close_transaction',
+        'settle_transaction',
+    )),
+    (state.TransactionChannelNewBalance, (
+        'participant_address',
+        'contract_balance',
+        'deposit_block_number',
+    )),
+    (channel.TransactionOrder, None),
+    (mediated_state.InitiatorPaymentState, (
+        'initiator',
+        'cancelled_channels',
+    )),
+    (mediated_state.InitiatorTransferState, (
+        'transfer_description',
+        'channel_identifier',
+        'transfer',
+        'secretrequest',
+        'revealsecret',
+    )),
+    (mediated_state.MediatorTransferState, (
+        'secrethash',
+        'secret',
+        'transfers_pair',
+    )),
+    (mediated_state.TargetTransferState, (
+        'route',
+        'transfer',
+        'secret',
+        'hahslock',
+        'state',
+    )),
+    (mediated_state.LockedTransferUnsignedState, (
+        'payment_identifier',
+        'token',
+        'balance_proof',
+        'lock',
+        'initiator',
+        'target',
+    )),
+    (mediated_state.LockedTransferSignedState, (
+        'payment_identifier',
+        'token',
+        'balance_proof',
+        'lock',
+        'initiator',
+        'target',
+    )),
+    (mediated_state.TransferDescriptionWithSecretState, (
+        'payment_identifier',
+        'amount',
+        'registry',
+        'token',
+        'initiator',
+        'target',
+        'secret',
+        'secrethash',
+    )),
+    (mediated_state.MediationPairState, (
+        'payer_transfer',
+        'payee_address',
+        'payee_transfer',
+        'payer_state',
+        'payee_state',
+    )),
+    (state_change.Block, (
+        'block_number',
+    )),
+    (state_change.ActionCancelPayment, (
+        'payment_identifier',
+    )),
+    (state_change.ActionChannelClose, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_identifier',
+    )),
+    (state_change.ActionCancelTransfer, (
+        'identifier',
+    )),
+    (state_change.ActionTransferDirect, (
+        'payment_network_identifier',
+        'token_address',
+        'amount',
+        'receiver_address',
+        'payment_identifier',
+    )),
+    (state_change.ContractReceiveChannelNew, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_state',
+    )),
+    (state_change.ContractReceiveChannelClosed, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_identifier',
+        'closing_address',
+        'closed_block_number',
+    )),
+    (state_change.ActionInitNode, (
+        'pseudo_random_generator',
+        'block_number',
+    )),
+    (state_change.ActionNewTokenNetwork, (
+        'payment_network_identifier',
+        'token_network',
+    )),
+    (state_change.ContractReceiveChannelNewBalance, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_identifier',
+        'deposit_transaction',
+    )),
+    (state_change.ContractReceiveChannelSettled, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_identifier',
+        'settle_block_number',
+    )),
+    (state_change.ActionLeaveAllNetworks, ()),
+    (state_change.ActionChangeNodeNetworkState, (
+        'node_address',
+        'network_state',
+    )),
+    (state_change.ContractReceiveNewPaymentNetwork, (
+        'payment_network',
+    )),
+    (state_change.ContractReceiveNewTokenNetwork, (
+        'payment_network_identifier',
+        'token_network',
+    )),
+    (state_change.ContractReceiveChannelWithdraw, (
+        'payment_network_identifier',
+        'token_address',
+        'channel_identifier',
+        'secret',
+        'secrethash',
+        'receiver',
+    )),
+    (state_change.ContractReceiveNewRoute, (
+        'participant1',
+        'participant2',
+    )),
+    (state_change.ContractReceiveRouteNew, (
+        'payment_network_identifier',
+        'token_address',
+        'participant1',
+        'participant2',
+    )),
+    (state_change.ReceiveTransferDirect, (
+        'payment_network_identifier',
+        'token_address',
+        'payment_identifier',
+        'balance_proof',
+    )),
+    (state_change.ReceiveUnlock, (
+        'secret',
+        'secrethash',
+        'balance_proof',
+    )),
+    (mediated_state_change.ActionInitInitiator, (
+        'payment_network_identifier',
+        'transfer',
+        'routes',
+    )),
+    (mediated_state_change.ActionInitMediator, (
+        'payment_network_identifier',
+        'routes',
+        'from_route',
+        'from_transfer',
+    )),
+    (mediated_state_change.ActionInitTarget, (
+        'payment_network_identifier',
+        'route',
+        'transfer',
+    )),
+    (mediated_state_change.ActionCancelRoute, (
+        'identifier',
+        'routes',
+    )),
+    (mediated_state_change.ReceiveSecretRequest, (
+        'payment_identifier',
+        'amount',
+        'secrethash',
+        'sender',
+        'revealsecret',
+    )),
+    (mediated_state_change.ReceiveSecretReveal, (
+        'secret',
+        'secrethash',
+        'sender',
+    )),
+    (mediated_state_change.ReceiveTransferRefundCancelRoute, (
+        'sender',
+        'transfer',
+        'routes',
+        'secrethash',
+        'secret',
+    )),
+    (mediated_state_change.ReceiveTransferRefund, (
+        'sender',
+        'transfer',
+    )),
+    (mediated_state_change.ContractReceiveWithdraw, (
+        'channel_address',
+        'secrethash',
+        'receiver',
+        'secret',
+    )),
+    (mediated_state_change.ContractReceiveClosed, (
+        'channel_address',
+        'closing_address',
+        'block_number',
+    )),
+    (mediated_state_change.ContractReceiveSettled, (
+        'channel_address',
+        'block_number',
+    )),
+    (mediated_state_change.ContractReceiveBalance, (
+        'channel_address',
+        'token_address',
+        'participant_address',
+        'balance',
+        'block_number',
+    )),
+    (mediated_state_change.ContractReceiveNewChannel, (
+        'manager_address',
+        'channel_address',
+        'participant1',
+        'participant2',
+        'settle_timeout',
+    )),
+    (mediated_state_change.ContractReceiveTokenAdded, (
+        'registry_address',
+        'token_address',
+        'manager_address',
+    )),
+    (events.ContractSendChannelClose, (
+        'channel_identifier',
+        'token_address',
+        'balance_proof',
+    )),
+    (events.ContractSendChannelSettle, (
+        'channel_identifier',
+    )),
+    (events.ContractSendChannelUpdateTransfer, (
+        'channel_identifier',
+        'balance_proof',
+    )),
+    (events.ContractSendChannelWithdraw, (
+        'channel_identifier',
+        'unlock_proofs',
+    )),
+    (events.EventTransferSentSuccess, (
+        'identifier',
+        'amount',
+        'target',
+    )),
+    (events.EventTransferSentFailed, (
+        'identifier',
+        'reason',
+    )),
+    (events.EventTransferReceivedSuccess, (
+        'identifier',
+        'amount',
+        'initiator',
+    )),
+    (events.EventTransferReceivedInvalidDirectTransfer, (
+        'identifier',
+        'reason',
+    )),
+    (events.SendDirectTransfer, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'payment_identifier',
+        'balance_proof',
+        'token',
+    )),
+    (mediated_events.SendLockedTransfer, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'transfer',
+    )),
+    (mediated_events.SendRevealSecret, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'secret',
+        'secrethash',
+        'token',
+    )),
+    (mediated_events.SendBalanceProof, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'payment_identifier',
+        'token',
+        'secret',
+        'balance_proof',
+    )),
+    (mediated_events.SendSecretRequest, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'payment_identifier',
+        'amount',
+        'secrethash',
+    )),
+    (mediated_events.SendRefundTransfer, (
+        'recipient',
+        'queue_name',
+        'message_identifier',
+        'payment_identifier',
+        'token',
+        'balance_proof',
+        'lock',
+        'initiator',
+        'target',
+    )),
+    (mediated_events.EventUnlockSuccess, (
+        'identifier',
+        'secrethash',
+    )),
+    (mediated_events.EventUnlockFailed, (
+        'identifier',
+        'secrethash',
+        'reason',
+    )),
+    (mediated_events.EventWithdrawSuccess, (
+        'identifier',
+        'secrethash',
+    )),
+    (mediated_events.EventWithdrawFailed, (
+        'identifier',
+        'secrethash',
+        'reason',
+    )),
+)
+
+SCHEMAS = {
+    1: SCHEMA_V1,
+}
+BINARY_SCHEMA_VERSION = 1
+
+
+class BinarySchema:
+    """ The lookup tables for a single schema version. """
+
+    __slots__ = (
+        'version',
+        'classes',
+        'class_to_index',
+    )
+
+    def __init__(self, version, schema):
+        classes = list()
+        class_to_index = dict()
+
+        for index, (cls, fields) in enumerate(schema):
+            is_namedtuple = fields is None
+            if is_namedtuple:
+                fields = cls._fields
+
+            classes.append((cls, tuple(fields), is_namedtuple))
+            class_to_index[cls] = index
+
+        self.version = version
+        self.classes = classes
+        self.class_to_index = class_to_index
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Encoder:
+    __slots__ = (
+        'schema',
+        'out',
+        'memo',
+        'bytes_memo',
+    )
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.out = bytearray()
+        self.memo = dict()
+        self.bytes_memo = dict()
+
+    def encode(self, value):
+        out = self.out
+        value_type = type(value)
+
+        if value is None:
+            out.append(TAG_NONE)
+
+        elif value_type is bool:
+            out.append(TAG_TRUE if value else TAG_FALSE)
+
+        elif value_type is int:
+            out.append(TAG_INT)
+            # zigzag, small negative numbers stay small
+            write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+        elif value_type is bytes:
+            length = len(value)
+            if length == ADDRESS_LENGTH or length == HASH_LENGTH:
+                bytes_memo = self.bytes_memo
+                reference = bytes_memo.get(value)
+
+                if reference is not None:
+                    out.append(TAG_BYTES_REFERENCE)
+                    write_varint(out, reference)
+                    return
+
+                bytes_memo[value] = len(bytes_memo)
+                out.append(TAG_ADDRESS if length == ADDRESS_LENGTH else TAG_HASH)
+            else:
+                out.append(TAG_BYTES)
+                write_varint(out, length)
+            out += value
+
+        elif value_type is str:
+            data = value.encode('utf8')
+            out.append(TAG_STR)
+            write_varint(out, len(data))
+            out += data
+
+        elif value_type is list or value_type is tuple:
+            out.append(TAG_LIST if value_type is list else TAG_TUPLE)
+            write_varint(out, len(value))
+            for item in value:
+                self.encode(item)
+
+        elif value_type is dict:
+            out.append(TAG_DICT)
+            write_varint(out, len(value))
+            for key, item in value.items():
+                self.encode(key)
+                self.encode(item)
+
+        elif value_type in self.schema.class_to_index:
+            self.encode_object(value)
+
+        elif value is MISSING:
+            out.append(TAG_MISSING)
+
+        elif value_type is float:
+            out.append(TAG_FLOAT)
+            out += FLOAT.pack(value)
+
+        elif value_type is random.Random:
+            out.append(TAG_RANDOM)
+            self.encode(value.getstate())
+
+        elif value_type is ChannelGraph:
+            addresses, edge_bytes = value.to_packed()
+            out.append(TAG_CHANNEL_GRAPH)
+            self.encode(addresses)
+            self.encode(edge_bytes)
+
+        else:
+            raise TypeError('{} is not part of the serialization schema'.format(value_type))
+
+    def encode_object(self, value):
+        out = self.out
+        memo = self.memo
+
+        reference = memo.get(id(value))
+        if reference is not None:
+            out.append(TAG_REFERENCE)
+            write_varint(out, reference)
+            return
+
+        # The object is kept alive by the value being serialized, so the id
+        # can't be reused
+        memo[id(value)] = len(memo)
+
+        index = self.schema.class_to_index[type(value)]
+        _, fields, _ = self.schema.classes[index]
+
+        out.append(TAG_OBJECT)
+        write_varint(out, index)
+        for field in fields:
+            self.encode(getattr(value, field, MISSING))
+
+
+class _Decoder:
+    __slots__ = (
+        'schema',
+        'data',
+        'position',
+        'memo',
+        'bytes_memo',
+    )
+
+    def __init__(self, schema, data, position):
+        self.schema = schema
+        self.data = data
+        self.position = position
+        self.memo = list()
+        self.bytes_memo = list()
+
+    def read_varint(self):
+        data = self.data
+        position = self.position
+        result = 0
+        shift = 0
+
+        while True:
+            byte = data[position]
+            position += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+
+        self.position = position
+        return result
+
+    def read_bytes(self, length):
+        start = self.position
+        end = start + length
+
+        if end > len(self.data):
+            raise ValueError('truncated data')
+
+        self.position = end
+        return bytes(self.data[start:end])
+
+    def decode(self):
+        tag = self.data[self.position]
+        self.position += 1
+
+        if tag == TAG_NONE:
+            return None
+
+        if tag == TAG_TRUE:
+            return True
+
+        if tag == TAG_FALSE:
+            return False
+
+        if tag == TAG_INT:
+            value = self.read_varint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+        if tag == TAG_ADDRESS or tag == TAG_HASH:
+            value = self.read_bytes(ADDRESS_LENGTH if tag == TAG_ADDRESS else HASH_LENGTH)
+            self.bytes_memo.append(value)
+            return value
+
+        if tag == TAG_BYTES_REFERENCE:
+            return self.bytes_memo[self.read_varint()]
+
+        if tag == TAG_BYTES:
+            return self.read_bytes(self.read_varint())
+
+        if tag == TAG_STR:
+            return self.read_bytes(self.read_varint()).decode('utf8')
+
+        if tag == TAG_LIST:
+            return [self.decode() for _ in range(self.read_varint())]
+
+        if tag == TAG_TUPLE:
+            return tuple(self.decode() for _ in range(self.read_varint()))
+
+        if tag == TAG_DICT:
+            result = dict()
+            for _ in range(self.read_varint()):
+                key = self.decode()
+                result[key] = self.decode()
+            return result
+
+        if tag == TAG_OBJECT:
+            return self.decode_object()
+
+        if tag == TAG_REFERENCE:
+            return self.memo[self.read_varint()]
+
+        if tag == TAG_MISSING:
+            return MISSING
+
+        if tag == TAG_FLOAT:
+            return FLOAT.unpack(self.read_bytes(FLOAT.size))[0]
+
+        if tag == TAG_RANDOM:
+            result = random.Random()
+            result.setstate(self.decode())
+            return result
+
+        if tag == TAG_CHANNEL_GRAPH:
+            addresses = self.decode()
+            edge_bytes = self.decode()
+            return ChannelGraph.from_packed(addresses, edge_bytes)
+
+        raise ValueError('unknown tag {}'.format(tag))
+
+    def decode_object(self):
+        index = self.read_varint()
+
+        if index >= len(self.schema.classes):
+            raise ValueError('unknown class index {}'.format(index))
+
+        cls, fields, is_namedtuple = self.schema.classes[index]
+        memo_index = len(self.memo)
+
+        if is_namedtuple:
+            # Tuples are immutable, so the fields are decoded first. The memo
+            # slot is reserved to keep the indexes in the encoding order.
+            self.memo.append(None)
+            result = cls._make(self.decode() for _ in fields)
+            self.memo[memo_index] = result
+            return result
+
+        result = cls.__new__(cls)
+        self.memo.append(result)
+
+        for field in fields:
+            value = self.decode()
+            if value is not MISSING:
+                setattr(result, field, value)
+
+        return result
+
+
+class BinarySerializer:
+    """ Schema based serializer for the state, state changes and events.
+
+    It produces smaller records than PickleSerializer and only instantiates
+    the classes known to the schema.
+    """
+
+    schemas = {
+        version: BinarySchema(version, schema)
+        for version, schema in SCHEMAS.items()
+    }
+
+    @staticmethod
+    def serialize(transaction):
+        schema = BinarySerializer.schemas[BINARY_SCHEMA_VERSION]
+        encoder = _Encoder(schema)
+
+        encoder.out.append(BINARY_MAGIC)
+        write_varint(encoder.out, BINARY_SCHEMA_VERSION)
+        encoder.encode(transaction)
+
+        return bytes(encoder.out)
+
+    @staticmethod
+    def deserialize(data):
+        if not data or data[0] != BINARY_MAGIC:
+            raise ValueError('data was not serialized with BinarySerializer')
+
+        decoder = _Decoder(None, data, 1)
+        version = decoder.read_varint()
+
+        schema = BinarySerializer.schemas.get(version)
+        if schema is None:
+            raise ValueError('unknown schema version {}'.format(version))
+
+        decoder.schema = schema
+        result = decoder.decode()
+
+        if decoder.position != len(data):
+            raise ValueError('trailing data')
+
+        return result
+
+
+SERIALIZERS = {
+    'pickle': PickleSerializer,
+    'binary': BinarySerializer,
+}
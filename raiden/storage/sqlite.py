@@ -1,19 +1,114 @@
 # -*- coding: utf-8 -*-
+import contextlib
+import os
 import sqlite3
 import threading
+import uuid
 from typing import (
     Any,
+    Iterator,
     Optional,
     Tuple,
 )
 
+import cachetools
+import gevent
+from ethereum import slogging
+from gevent.event import AsyncResult
+
+from raiden.storage import archive
+
+log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Number of rows fetched at once by the iterators
+DEFAULT_PAGE_SIZE = 1000
+
+# Stored in the database `user_version`. Bump it when the schema changes and
+# add the corresponding step to `SQLiteStorage.upgrade_schema`.
+SCHEMA_VERSION = 3
+
+# What to do with the rows covered by the snapshot on compaction
+COMPACTION_ARCHIVE = 'archive'
+COMPACTION_DROP = 'drop'
+COMPACTION_MODES = (COMPACTION_ARCHIVE, COMPACTION_DROP)
+
+# Maximum number of state changes per archive segment, a segment is read
+# into memory at once
+DEFAULT_SEGMENT_SIZE = 50000
+
+# Number of archive segments kept decoded in memory for the queries
+ARCHIVE_CACHE_SIZE = 2
+
+
+def event_type_name(event_type):
+    return event_type.__name__
+
+
+def event_channel_identifier(event):
+    """ Return the identifier of the channel the `event` refers to or None. """
+    channel_identifier = getattr(event, 'channel_identifier', None)
+
+    if channel_identifier is None:
+        transfer = getattr(event, 'transfer', None)
+        balance_proof = getattr(event, 'balance_proof', None) or getattr(
+            transfer,
+            'balance_proof',
+            None,
+        )
+        channel_identifier = getattr(balance_proof, 'channel_address', None)
+
+    return channel_identifier
+
+
+def write_archive_segment(path, events, state_changes):
+    """ Write the segment and return its index, see `archive.index_events`. """
+    archive.write_segment(path, events, state_changes)
+    return archive.index_events(events)
+
+
+def default_archive_dir(database_path):
+    """ Directory of the archive segments of the database at `database_path`. """
+    return os.path.join(os.path.dirname(database_path), 'archive')
+
 
 class SQLiteStorage:
-    def __init__(self, database_path, serializer):
+    """ Storage for the write-ahead-log.
+
+    Args:
+        database_path: Path to the database file or ':memory:'.
+        serializer: Object used to (de)serialize the stored objects.
+        synchronous: The SQLite synchronous mode. With the WAL journal mode
+            'NORMAL' is still safe against corruption, but the last
+            transactions may be lost on a power failure.
+        group_commit: If True, writes are not committed immediately. Instead
+            the writes done by all greenlets until the next switch to the hub
+            are committed with a single transaction, see `wait_for_commit`.
+        archive_dir: Directory of the archive segments, defaults to the
+            `archive` directory next to the database file.
+    """
+
+    def __init__(
+            self,
+            database_path,
+            serializer,
+            synchronous='FULL',
+            group_commit=False,
+            archive_dir=None):
+
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError('synchronous must be one of {}'.format(SYNCHRONOUS_MODES))
+
         conn = sqlite3.connect(database_path)
         conn.text_factory = str
         conn.execute('PRAGMA foreign_keys=ON')
 
+        # Readers don't block the writer and a commit is a single append to
+        # the journal, this is a no-op for in-memory databases
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous={}'.format(synchronous))
+
         with conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -40,6 +135,15 @@ class SQLiteStorage:
                 ')'
             )
 
+        if archive_dir is None and database_path != ':memory:':
+            archive_dir = default_archive_dir(database_path)
+
+        self.conn = conn
+        self.serializer = serializer
+        self.archive_dir = archive_dir
+        self.archive_cache = cachetools.LRUCache(maxsize=ARCHIVE_CACHE_SIZE)
+        self.upgrade_schema()
+
         # When writting to a table where the primary key is the identifier and we want
         # to return said identifier we use cursor.lastrowid, which uses sqlite's last_insert_rowid
         # https://github.com/python/cpython/blob/2.7/Modules/_sqlite/cursor.c#L727-L732
@@ -53,14 +157,195 @@ class SQLiteStorage:
         # Improve on this and find a better way to protect against this potential race
         # condition.
         self.write_lock = threading.Lock()
-        self.conn = conn
-        self.serializer = serializer
+        self.group_commit = group_commit
+
+        # Set by the writes of the current group, and by the group commit
+        # once the transaction is durable
+        self.pending_commit = None
+
+        # The error of a failed group commit. The state changes of the group
+        # were already applied, the database is behind the node state and no
+        # write can be accepted anymore
+        self.commit_error = None
+
+    def upgrade_schema(self):
+        """ Migrate a database created by an older version to SCHEMA_VERSION.
+
+        The tables are always created with the original schema, each step
+        upgrades from one version to the next one.
+        """
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                'The database schema version {} is newer than the supported version {}'.format(
+                    version,
+                    SCHEMA_VERSION,
+                )
+            )
+
+        upgrades = [
+            self._upgrade_events_columns,
+            self._upgrade_archive_segments,
+            self._upgrade_archive_index,
+        ]
+
+        for upgrade in upgrades[version:]:
+            with self.conn:
+                upgrade()
+                version += 1
+                # PRAGMA doesn't accept parameters
+                self.conn.execute('PRAGMA user_version={:d}'.format(version))
+
+    def _upgrade_events_columns(self):
+        """ Version 1: Store the event type and channel as columns, so that the
+        events can be filtered without deserializing them.
+        """
+        conn = self.conn
+        conn.execute('ALTER TABLE state_events ADD COLUMN event_type TEXT')
+        conn.execute('ALTER TABLE state_events ADD COLUMN channel_identifier BINARY')
+
+        cursor = conn.execute('SELECT identifier, data FROM state_events')
+        backfill = list()
+        for identifier, data in cursor:
+            event = self.serializer.deserialize(data)
+            backfill.append((
+                event_type_name(type(event)),
+                event_channel_identifier(event),
+                identifier,
+            ))
+
+        conn.executemany(
+            'UPDATE state_events SET event_type = ?, channel_identifier = ? '
+            'WHERE identifier = ?',
+            backfill,
+        )
+
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS state_events_block_number '
+            'ON state_events(block_number)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS state_events_event_type '
+            'ON state_events(event_type, block_number)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS state_events_channel_identifier '
+            'ON state_events(channel_identifier, block_number)'
+        )
+
+    def _upgrade_archive_segments(self):
+        """ Version 2: Keep track of the rows moved to archive segments. """
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS archive_segments ('
+            '    identifier INTEGER PRIMARY KEY, '
+            '    filename TEXT NOT NULL, '
+            '    first_statechange_id INTEGER NOT NULL, '
+            '    last_statechange_id INTEGER NOT NULL, '
+            '    first_block INTEGER, '
+            '    last_block INTEGER'
+            ')'
+        )
+
+    def _upgrade_archive_index(self):
+        """ Version 3: Index the event types and channels of the archive
+        segments, so that the queries only read the segments with matching
+        events.
+        """
+        conn = self.conn
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS archive_segment_events ('
+            '    segment_id INTEGER NOT NULL, '
+            '    event_type TEXT, '
+            '    channel_identifier BINARY, '
+            '    first_block INTEGER NOT NULL, '
+            '    last_block INTEGER NOT NULL, '
+            '    FOREIGN KEY(segment_id) REFERENCES archive_segments(identifier)'
+            ')'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS archive_segment_events_blocks '
+            'ON archive_segment_events(last_block, first_block)'
+        )
+
+        segments = conn.execute('SELECT identifier, filename FROM archive_segments').fetchall()
+        for segment_id, filename in segments:
+            events = archive.read_segment_events(os.path.join(self.archive_dir, filename))
+            conn.executemany(
+                'INSERT INTO archive_segment_events('
+                '    segment_id, event_type, channel_identifier, first_block, last_block'
+                ') VALUES(?, ?, ?, ?, ?)',
+                [(segment_id, ) + entry for entry in archive.index_events(events)],
+            )
+
+    @contextlib.contextmanager
+    def _write(self):
+        with self.write_lock:
+            if self.commit_error is not None:
+                raise self.commit_error
+
+            if not self.group_commit:
+                with self.conn:
+                    yield self.conn
+
+            else:
+                conn = self.conn
+
+                # The group's transaction must be open, releasing the
+                # outermost savepoint would commit it
+                if not conn.in_transaction:
+                    conn.execute('BEGIN')
+
+                # A failed write must not be committed with the group
+                conn.execute('SAVEPOINT write')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK TO SAVEPOINT write')
+                    conn.execute('RELEASE SAVEPOINT write')
+                    raise
+                conn.execute('RELEASE SAVEPOINT write')
+
+                if self.pending_commit is None:
+                    self.pending_commit = AsyncResult()
+                    # Runs once the current greenlet yields, giving the
+                    # other greenlets a chance to join the transaction
+                    gevent.spawn(self._commit_group)
+
+    def _commit_group(self):
+        with self.write_lock:
+            pending_commit = self.pending_commit
+            self.pending_commit = None
+
+            try:
+                self.conn.commit()
+            except sqlite3.Error as e:
+                log.critical('write-ahead-log commit failed, refusing further writes', error=e)
+                self.conn.rollback()
+                self.commit_error = e
+                pending_commit.set_exception(e)
+            else:
+                pending_commit.set(True)
+
+    def wait_for_commit(self):
+        """ Block until the writes done so far are durable.
+
+        This is a no-op without group commit, where every write is committed
+        before returning. Raises the error of a failed group commit.
+        """
+        if self.commit_error is not None:
+            raise self.commit_error
+
+        pending_commit = self.pending_commit
+
+        if pending_commit is not None:
+            pending_commit.get()
 
     def write_state_change(self, state_change):
         serialized_data = self.serializer.serialize(state_change)
 
-        with self.write_lock, self.conn:
-            cursor = self.conn.execute(
+        with self._write() as conn:
+            cursor = conn.execute(
                 'INSERT INTO state_changes(identifier, data) VALUES(null, ?)',
                 (serialized_data,)
             )
@@ -69,15 +354,11 @@ class SQLiteStorage:
         return last_id
 
     def write_state_snapshot(self, statechange_id, snapshot):
-        # TODO: Snapshotting is not yet implemented. This is just skeleton code
-        # (Issue #682)
-        #
-        # This skeleton code assumes we only keep a single snapshot and
-        # overwrite it each time.
+        # Only a single snapshot is kept, it is overwritten each time.
         serialized_data = self.serializer.serialize(snapshot)
 
-        with self.write_lock, self.conn:
-            cursor = self.conn.execute(
+        with self._write() as conn:
+            cursor = conn.execute(
                 'INSERT OR REPLACE INTO state_snapshot('
                 '    identifier, statechange_id, data'
                 ') VALUES(?, ?, ?)',
@@ -96,18 +377,286 @@ class SQLiteStorage:
             events: List of Event objects.
         """
         events_data = [
-            (None, state_change_id, block_number, self.serializer.serialize(event))
+            (
+                None,
+                state_change_id,
+                block_number,
+                event_type_name(type(event)),
+                event_channel_identifier(event),
+                self.serializer.serialize(event),
+            )
             for event in events
         ]
 
-        with self.write_lock, self.conn:
-            self.conn.executemany(
+        with self._write() as conn:
+            conn.executemany(
                 'INSERT INTO state_events('
-                '   identifier, source_statechange_id, block_number, data'
-                ') VALUES(?, ?, ?, ?)',
+                '   identifier, source_statechange_id, block_number, event_type, '
+                '   channel_identifier, data'
+                ') VALUES(?, ?, ?, ?, ?, ?)',
                 events_data,
             )
 
+    def change_serializer(self, serializer):
+        """ Rewrite every stored object with `serializer` and use it from now
+        on.
+
+        The converted archive segments are written to new files, which the
+        database starts using in the same transaction that converts the rows.
+        If anything fails the new files are removed and both the database and
+        the archive are left untouched, the old segments are only removed
+        after the transaction is committed.
+        """
+        segments = self.conn.execute(
+            'SELECT identifier, filename, first_statechange_id, last_statechange_id '
+            'FROM archive_segments',
+        ).fetchall()
+
+        # The new segments must not overwrite the ones still in use
+        generation = uuid.uuid4().hex[:8]
+        renamed_segments = list()
+        new_paths = list()
+
+        try:
+            for segment_id, filename, first_identifier, last_identifier in segments:
+                path = os.path.join(self.archive_dir, filename)
+                events = [
+                    row[:-1] + (serializer.serialize(self.serializer.deserialize(row[-1])), )
+                    for row in archive.read_segment_events(path)
+                ]
+                state_changes = [
+                    (identifier, serializer.serialize(self.serializer.deserialize(data)))
+                    for identifier, data in archive.read_segment_state_changes(path)
+                ]
+
+                new_filename = 'segment_{:012d}_{:012d}_{}.gz'.format(
+                    first_identifier,
+                    last_identifier,
+                    generation,
+                )
+                new_path = os.path.join(self.archive_dir, new_filename)
+                new_paths.append(new_path)
+                archive.write_segment(new_path, events, state_changes)
+                renamed_segments.append((new_filename, segment_id))
+
+            tables = ('state_changes', 'state_snapshot', 'state_events')
+
+            with self._write() as conn:
+                for table in tables:
+                    cursor = conn.execute('SELECT identifier, data FROM {}'.format(table))
+                    converted = [
+                        (serializer.serialize(self.serializer.deserialize(data)), identifier)
+                        for identifier, data in cursor.fetchall()
+                    ]
+                    conn.executemany(
+                        'UPDATE {} SET data = ? WHERE identifier = ?'.format(table),
+                        converted,
+                    )
+
+                conn.executemany(
+                    'UPDATE archive_segments SET filename = ? WHERE identifier = ?',
+                    renamed_segments,
+                )
+
+            self.wait_for_commit()
+        except BaseException:
+            for new_path in new_paths:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(new_path)
+            raise
+
+        self.archive_cache.clear()
+        self.serializer = serializer
+
+        for _, filename, _, _ in segments:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.archive_dir, filename))
+
+    def compact(self, mode=COMPACTION_ARCHIVE, segment_size=DEFAULT_SEGMENT_SIZE):
+        """ Remove the state changes that are covered by the snapshot, and
+        the events they produced, from the database.
+
+        Args:
+            mode: COMPACTION_ARCHIVE moves the rows to compressed segment files
+                in `archive_dir`, which are still searched by
+                `get_events_by_block`. COMPACTION_DROP deletes them.
+            segment_size: Maximum number of state changes per segment.
+
+        Returns:
+            The number of state changes removed.
+
+        The space is reused by SQLite for new rows, call `vacuum` to shrink
+        the database file.
+        """
+        if mode not in COMPACTION_MODES:
+            raise ValueError('mode must be one of {}'.format(COMPACTION_MODES))
+
+        if mode == COMPACTION_ARCHIVE and self.archive_dir is None:
+            raise ValueError('archive_dir is required to archive the state changes')
+
+        snapshot = self.conn.execute('SELECT statechange_id FROM state_snapshot').fetchone()
+        first = self.conn.execute('SELECT MIN(identifier) FROM state_changes').fetchone()
+
+        if snapshot is None or first[0] is None:
+            return 0
+
+        # The snapshot references its state change with a foreign key, it is
+        # kept even though the restore only replays the ones after it
+        first_identifier = first[0]
+        last_identifier = snapshot[0] - 1
+
+        if mode == COMPACTION_ARCHIVE:
+            os.makedirs(self.archive_dir, exist_ok=True)
+
+        removed = 0
+        for start in range(first_identifier, last_identifier + 1, segment_size):
+            end = min(start + segment_size - 1, last_identifier)
+            removed += self._compact_range(start, end, mode)
+
+            # Let the node handle its messages between the segments
+            gevent.sleep(0)
+
+        return removed
+
+    def _compact_range(self, first_identifier, last_identifier, mode):
+        state_changes = self.conn.execute(
+            'SELECT identifier, data FROM state_changes '
+            'WHERE identifier BETWEEN ? AND ? ORDER BY identifier',
+            (first_identifier, last_identifier),
+        ).fetchall()
+
+        if not state_changes:
+            return 0
+
+        events = self.conn.execute(
+            'SELECT identifier, source_statechange_id, block_number, event_type, '
+            '    channel_identifier, data '
+            'FROM state_events WHERE source_statechange_id BETWEEN ? AND ? '
+            'ORDER BY identifier',
+            (first_identifier, last_identifier),
+        ).fetchall()
+
+        segment = None
+        index = list()
+        if mode == COMPACTION_ARCHIVE:
+            filename = 'segment_{:012d}_{:012d}.gz'.format(first_identifier, last_identifier)
+
+            # Compressing a segment takes long, zlib releases the GIL and the
+            # node keeps running while the segment is written
+            index = gevent.get_hub().threadpool.apply(
+                write_archive_segment,
+                (os.path.join(self.archive_dir, filename), events, state_changes),
+            )
+
+            block_numbers = [row[2] for row in events]
+            segment = (
+                filename,
+                first_identifier,
+                last_identifier,
+                min(block_numbers, default=None),
+                max(block_numbers, default=None),
+            )
+
+        with self._write() as conn:
+            if segment is not None:
+                segment_id = conn.execute(
+                    'INSERT INTO archive_segments('
+                    '    filename, first_statechange_id, last_statechange_id, '
+                    '    first_block, last_block'
+                    ') VALUES(?, ?, ?, ?, ?)',
+                    segment,
+                ).lastrowid
+                conn.executemany(
+                    'INSERT INTO archive_segment_events('
+                    '    segment_id, event_type, channel_identifier, first_block, last_block'
+                    ') VALUES(?, ?, ?, ?, ?)',
+                    [(segment_id, ) + entry for entry in index],
+                )
+
+            conn.execute(
+                'DELETE FROM state_events WHERE source_statechange_id BETWEEN ? AND ?',
+                (first_identifier, last_identifier),
+            )
+            conn.execute(
+                'DELETE FROM state_changes WHERE identifier BETWEEN ? AND ?',
+                (first_identifier, last_identifier),
+            )
+
+        self.wait_for_commit()
+
+        return len(state_changes)
+
+    def vacuum(self):
+        """ Shrink the database file, this rewrites the whole database. """
+        with self.write_lock:
+            self.conn.execute('VACUUM')
+
+    def get_archived_state_changes(self):
+        """ Return the list of (identifier, state_change) from the archive
+        segments, this is meant for auditing.
+        """
+        return [
+            (identifier, self.serializer.deserialize(data))
+            for filename in self._get_segment_filenames()
+            for identifier, data in archive.read_segment_state_changes(
+                os.path.join(self.archive_dir, filename),
+            )
+        ]
+
+    def _get_segment_filenames(self):
+        cursor = self.conn.execute(
+            'SELECT filename FROM archive_segments ORDER BY first_statechange_id',
+        )
+        return [filename for filename, in cursor.fetchall()]
+
+    def _get_archived_events_by_block(self, from_block, to_block, event_types, channel):
+        conditions = ['events.last_block >= ?']
+        arguments = [from_block]
+
+        if to_block != 'latest':
+            conditions.append('events.first_block <= ?')
+            arguments.append(to_block)
+
+        type_names = None
+        if event_types is not None:
+            type_names = {event_type_name(event_type) for event_type in event_types}
+            conditions.append('events.event_type IN ({})'.format(
+                ', '.join('?' * len(type_names)),
+            ))
+            arguments.extend(type_names)
+
+        if channel is not None:
+            conditions.append('events.channel_identifier = ?')
+            arguments.append(channel)
+
+        # Only the segments with matching events are read
+        segments = self.conn.execute(
+            'SELECT DISTINCT segments.filename, segments.first_statechange_id '
+            'FROM archive_segments AS segments '
+            'JOIN archive_segment_events AS events ON events.segment_id = segments.identifier '
+            'WHERE {} ORDER BY segments.first_statechange_id'.format(' AND '.join(conditions)),
+            arguments,
+        )
+
+        result = list()
+        for filename, _ in segments.fetchall():
+            rows = self.archive_cache.get(filename)
+            if rows is None:
+                rows = archive.read_segment_events(os.path.join(self.archive_dir, filename))
+                self.archive_cache[filename] = rows
+
+            for _, _, block_number, event_type, event_channel, data in rows:
+                matches = (
+                    block_number >= from_block and
+                    (to_block == 'latest' or block_number <= to_block) and
+                    (type_names is None or event_type in type_names) and
+                    (channel is None or event_channel == channel)
+                )
+                if matches:
+                    result.append((block_number, self.serializer.deserialize(data)))
+
+        return result
+
     def get_state_snapshot(self) -> Optional[Tuple[int, Any]]:
         """ Return the tuple of (last_applied_state_change_id, snapshot) or None"""
         cursor = self.conn.execute('SELECT statechange_id, data from state_snapshot')
@@ -156,6 +705,75 @@ class SQLiteStorage:
         ]
         return result
 
+    def _iter_by_identifier(self, query, from_identifier, to_identifier, page_size):
+        """ Page through the rows returned by `query` in identifier order.
+
+        `query` must select the identifier as the first column and have
+        placeholders for the first identifier, the last identifier and the page
+        size. Only a page is held in memory and no read transaction is kept
+        open in between pages.
+        """
+        if not isinstance(from_identifier, int):
+            raise ValueError('from_identifier must be an integer')
+
+        if not (to_identifier == 'latest' or isinstance(to_identifier, int)):
+            raise ValueError("to_identifier must be an integer or 'latest'")
+
+        if to_identifier == 'latest':
+            # SQLite's maximum rowid
+            to_identifier = 2 ** 63 - 1
+
+        while from_identifier <= to_identifier:
+            rows = self.conn.execute(
+                query,
+                (from_identifier, to_identifier, page_size),
+            ).fetchall()
+
+            if not rows:
+                break
+
+            yield from rows
+
+            from_identifier = rows[-1][0] + 1
+
+    def iter_statechanges_by_identifier(
+            self,
+            from_identifier,
+            to_identifier,
+            page_size=DEFAULT_PAGE_SIZE) -> Iterator[Tuple[int, Any]]:
+        """ Lazily yield the (identifier, state_change) in the range,
+        inclusive.
+        """
+        rows = self._iter_by_identifier(
+            'SELECT identifier, data FROM state_changes '
+            'WHERE identifier BETWEEN ? AND ? ORDER BY identifier LIMIT ?',
+            from_identifier,
+            to_identifier,
+            page_size,
+        )
+
+        deserialize = self.serializer.deserialize
+        for identifier, data in rows:
+            yield identifier, deserialize(data)
+
+    def iter_events_by_identifier(
+            self,
+            from_identifier,
+            to_identifier,
+            page_size=DEFAULT_PAGE_SIZE) -> Iterator[Tuple[int, Any]]:
+        """ Lazily yield the (block_number, event) in the range, inclusive. """
+        rows = self._iter_by_identifier(
+            'SELECT identifier, block_number, data FROM state_events '
+            'WHERE identifier BETWEEN ? AND ? ORDER BY identifier LIMIT ?',
+            from_identifier,
+            to_identifier,
+            page_size,
+        )
+
+        deserialize = self.serializer.deserialize
+        for _, block_number, data in rows:
+            yield block_number, deserialize(data)
+
     def get_events_by_identifier(self, from_identifier, to_identifier):
         if not (from_identifier == 'latest' or isinstance(from_identifier, int)):
             raise ValueError("from_identifier must be an integer or 'latest'")
@@ -190,7 +808,22 @@ class SQLiteStorage:
         ]
         return result
 
-    def get_events_by_block(self, from_block, to_block):
+    def get_events_by_block(
+            self,
+            from_block,
+            to_block,
+            event_types=None,
+            channel_identifier=None):
+        """ Return the list of (block_number, event) in the block range.
+
+        Args:
+            from_block: First block of the range, inclusive.
+            to_block: Last block of the range, inclusive, or 'latest'.
+            event_types: If given, only events of these exact types are
+                returned.
+            channel_identifier: If given, only events for this channel are
+                returned.
+        """
         if not (from_block == 'latest' or isinstance(from_block, int)):
             raise ValueError("from_block must be an integer or 'latest'")
 
@@ -211,20 +844,39 @@ class SQLiteStorage:
             from_block = cursor.fetchone()
 
         if to_block == 'latest':
-            cursor.execute(
-                'SELECT block_number, data FROM state_events WHERE block_number >= ?',
-                (from_block, )
-            )
+            conditions = ['block_number >= ?']
+            arguments = [from_block]
         else:
-            cursor.execute(
-                'SELECT block_number, data FROM state_events WHERE block_number '
-                'BETWEEN ? AND ?', (from_block, to_block)
-            )
-
-        result = [
+            conditions = ['block_number BETWEEN ? AND ?']
+            arguments = [from_block, to_block]
+
+        if event_types is not None:
+            type_names = [event_type_name(event_type) for event_type in event_types]
+            conditions.append('event_type IN ({})'.format(', '.join('?' * len(type_names))))
+            arguments.extend(type_names)
+
+        if channel_identifier is not None:
+            conditions.append('channel_identifier = ?')
+            arguments.append(channel_identifier)
+
+        cursor.execute(
+            'SELECT block_number, data FROM state_events WHERE {} ORDER BY identifier'.format(
+                ' AND '.join(conditions),
+            ),
+            arguments,
+        )
+
+        # The archived events are older than the ones in the database
+        result = self._get_archived_events_by_block(
+            from_block,
+            to_block,
+            event_types,
+            channel_identifier,
+        )
+        result.extend(
             (entry[0], self.serializer.deserialize(entry[1]))
             for entry in cursor.fetchall()
-        ]
+        )
         return result
 
     def __del__(self):
@@ -1,42 +1,151 @@
 # -*- coding: utf-8 -*-
+import time
 from collections import namedtuple
 
+import gevent
+from ethereum import slogging
+
 from raiden.transfer.architecture import StateManager
 
+log = slogging.get_logger(__name__)  # pylint: disable=invalid-name
+
 InternalEvent = namedtuple(
     'InternalEvent',
     ('identifier', 'state_change_id', 'block_number', 'event_object'),
 )
 
 
-def restore_from_latest_snapshot(transition_function, storage):
+def restore_from_latest_snapshot(
+        transition_function,
+        storage,
+        copy_on_write=False,
+        snapshot_policy=None,
+        compaction=None):
+    """ Restore the state from the latest snapshot and replay the state
+    changes that were logged after it.
+
+    If there is no snapshot all the state changes are replayed to rebuild
+    the state, but their events are dropped. A database written before the
+    snapshots were introduced has no snapshot, and its events were already
+    handled, handling them again would resend old messages and
+    transactions.
+    """
+    start = time.time()
     events = list()
     snapshot = storage.get_state_snapshot()
 
     if snapshot:
         last_applied_state_change_id, state = snapshot
-        unapplied_state_changes = storage.get_statechanges_by_identifier(
-            from_identifier=last_applied_state_change_id,
-            to_identifier='latest',
-        )
     else:
-        state = None
-        unapplied_state_changes = list()
+        last_applied_state_change_id, state = 0, None
+
+    # The state change recorded with the snapshot was already applied to it,
+    # the log is read lazily to avoid holding it in memory
+    unapplied_state_changes = storage.iter_statechanges_by_identifier(
+        from_identifier=last_applied_state_change_id + 1,
+        to_identifier='latest',
+    )
+
+    state_manager = StateManager(transition_function, state, copy_on_write)
+    wal = WriteAheadLog(state_manager, storage, snapshot_policy, compaction)
+
+    if snapshot:
+        wal.state_change_id = last_applied_state_change_id
+
+    replayed = 0
+    for state_change_id, state_change in unapplied_state_changes:
+        state_change_events = state_manager.dispatch(state_change)
+
+        if snapshot:
+            events.extend(state_change_events)
 
-    state_manager = StateManager(transition_function, state)
-    wal = WriteAheadLog(state_manager, storage)
+        wal.state_change_id = state_change_id
+        replayed += 1
 
-    for state_change in unapplied_state_changes:
-        events.extend(state_manager.dispatch(state_change))
+    if snapshot_policy is not None:
+        snapshot_policy.state_changes_since_snapshot = replayed
+
+    log.info(
+        'state restored',
+        snapshot_state_change_id=last_applied_state_change_id if snapshot else None,
+        replayed_state_changes=replayed,
+        elapsed=time.time() - start,
+    )
 
     return wal, events
 
 
+class SnapshotPolicy:
+    """ Decides when the node state must be snapshotted.
+
+    A snapshot is due after `state_change_interval` state changes or after
+    `block_interval` blocks, whichever comes first. Either of them may be None
+    to disable the corresponding trigger.
+    """
+
+    __slots__ = (
+        'state_change_interval',
+        'block_interval',
+        'state_changes_since_snapshot',
+        'last_snapshot_block_number',
+    )
+
+    def __init__(self, state_change_interval, block_interval):
+        if state_change_interval is not None and state_change_interval <= 0:
+            raise ValueError('state_change_interval must be a positive number')
+
+        if block_interval is not None and block_interval <= 0:
+            raise ValueError('block_interval must be a positive number')
+
+        self.state_change_interval = state_change_interval
+        self.block_interval = block_interval
+        self.state_changes_since_snapshot = 0
+        self.last_snapshot_block_number = None
+
+    def state_change_applied(self, block_number):
+        self.state_changes_since_snapshot += 1
+
+        if self.last_snapshot_block_number is None:
+            self.last_snapshot_block_number = block_number
+
+    def should_snapshot(self, block_number):
+        if self.state_changes_since_snapshot == 0:
+            return False
+
+        enough_state_changes = (
+            self.state_change_interval is not None and
+            self.state_changes_since_snapshot >= self.state_change_interval
+        )
+        enough_blocks = (
+            self.block_interval is not None and
+            self.last_snapshot_block_number is not None and
+            block_number is not None and
+            block_number - self.last_snapshot_block_number >= self.block_interval
+        )
+
+        return enough_state_changes or enough_blocks
+
+    def snapshot_taken(self, block_number):
+        self.state_changes_since_snapshot = 0
+        self.last_snapshot_block_number = block_number
+
+
 class WriteAheadLog:
-    def __init__(self, state_manager, storage):
+    """ Logs the state changes before applying them.
+
+    Args:
+        compaction: If set, the state changes covered by a periodic snapshot
+            are compacted with this mode after the snapshot is written, see
+            `SQLiteStorage.compact`.
+    """
+
+    def __init__(self, state_manager, storage, snapshot_policy=None, compaction=None):
         self.state_manager = state_manager
         self.state_change_id = None
         self.storage = storage
+        self.snapshot_policy = snapshot_policy
+        self.compaction = compaction
+        self.snapshot_greenlet = None
 
     def log_and_dispatch(self, state_change, block_number):
         """ Log and apply a state change.
@@ -54,17 +163,80 @@ class WriteAheadLog:
         self.state_change_id = state_change_id
         self.storage.write_events(state_change_id, block_number, events)
 
+        # The events may have side effects, they must be handled only once
+        # the state change is durable
+        self.storage.wait_for_commit()
+
+        policy = self.snapshot_policy
+        if policy is not None:
+            policy.state_change_applied(block_number)
+
+            if policy.should_snapshot(block_number) and not self.is_snapshotting():
+                policy.snapshot_taken(block_number)
+                self.snapshot_async()
+
         return events
 
+    def is_snapshotting(self):
+        return self.snapshot_greenlet is not None and not self.snapshot_greenlet.ready()
+
+    def snapshot_async(self):
+        """ Snapshot the application state in a separate greenlet.
+
+        The state is never modified in place by a dispatch, so the reference
+        taken here stays consistent with `state_change_id` and the
+        serialization can be done after the caller handled the events.
+        """
+        current_state = self.state_manager.current_state
+        state_change_id = self.state_change_id
+
+        # otherwise no state change was dispatched
+        if state_change_id:
+            self.snapshot_greenlet = gevent.spawn(
+                self._write_snapshot,
+                state_change_id,
+                current_state,
+                self.compaction,
+            )
+
+        return self.snapshot_greenlet
+
     def snapshot(self):
         """ Snapshot the application state.
 
         Snapshots are used to restore the application state, either after a
         restart or a crash.
         """
+        # A pending asynchronous snapshot is older and must not overwrite this
+        # one
+        if self.snapshot_greenlet is not None:
+            self.snapshot_greenlet.join()
+
         current_state = self.state_manager.current_state
         state_change_id = self.state_change_id
 
         # otherwise no state change was dispatched
         if state_change_id:
-            self.storage.write_state_snapshot(state_change_id, current_state)
+            self._write_snapshot(state_change_id, current_state)
+
+    def _write_snapshot(self, state_change_id, state, compaction=None):
+        start = time.time()
+        self.storage.write_state_snapshot(state_change_id, state)
+        self.storage.wait_for_commit()
+
+        log.debug(
+            'state snapshot written',
+            state_change_id=state_change_id,
+            elapsed=time.time() - start,
+        )
+
+        if compaction is not None:
+            start = time.time()
+            compacted = self.storage.compact(compaction)
+
+            log.debug(
+                'write-ahead-log compacted',
+                mode=compaction,
+                state_changes=compacted,
+                elapsed=time.time() - start,
+            )
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import argparse
+import random
+import timeit
+
+from raiden.tests.utils import factories
+from raiden.transfer import node
+from raiden.transfer.architecture import StateManager
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.state import (
+    PaymentNetworkState,
+    TokenNetworkGraphState,
+    TokenNetworkState,
+)
+from raiden.transfer.state_change import (
+    ActionInitNode,
+    Block,
+    ContractReceiveChannelClosed,
+    ContractReceiveNewPaymentNetwork,
+)
+
+ITERATIONS = 100
+CHANNELS = (10, 100, 1000, 10000)
+CLOSED_CHANNELS = 5
+
+
+def make_state_manager(number_of_channels, number_of_closed_channels):
+    """ Returns a node with a single token network where the first
+    `number_of_closed_channels` channels are closed, together with the
+    current block number.
+    """
+    payment_network_identifier = factories.make_address()
+    token_address = factories.make_address()
+    our_address = factories.make_address()
+
+    channels = [
+        factories.make_channel(
+            our_balance=10,
+            partner_balance=10,
+            our_address=our_address,
+            token_address=token_address,
+        )
+        for _ in range(number_of_channels)
+    ]
+    token_network = TokenNetworkState(
+        factories.make_address(),
+        token_address,
+        TokenNetworkGraphState(ChannelGraph()),
+        channels,
+    )
+    payment_network = PaymentNetworkState(
+        payment_network_identifier,
+        [token_network],
+    )
+
+    state_manager = StateManager(node.state_transition, None, copy_on_write=True)
+    state_manager.dispatch(ActionInitNode(random.Random(), 1))
+    state_manager.dispatch(ContractReceiveNewPaymentNetwork(payment_network))
+    state_manager.dispatch(Block(2))
+
+    for channel_state in channels[:number_of_closed_channels]:
+        state_manager.dispatch(ContractReceiveChannelClosed(
+            payment_network_identifier,
+            token_address,
+            channel_state.identifier,
+            channel_state.partner_state.address,
+            2,
+        ))
+
+    return state_manager
+
+
+def run_timeit(number_of_channels, rebuild, iterations=ITERATIONS):
+    """ Time the Block dispatch. With `rebuild` the deadlines index is
+    dropped before every block, so all the channels are visited as in a full
+    scan.
+    """
+    state_manager = make_state_manager(number_of_channels, CLOSED_CHANNELS)
+    block_numbers = iter(range(3, iterations + 3))
+
+    def test_dispatch_block():
+        if rebuild:
+            state_manager.current_state.block_deadlines = None
+
+        state_manager.dispatch(Block(next(block_numbers)))
+
+    return timeit.timeit(test_dispatch_block, number=iterations)
+
+
+def test_block(iterations=ITERATIONS, channels=CHANNELS):
+    for number_of_channels in channels:
+        full_scan_time = run_timeit(number_of_channels, True, iterations)
+        deadlines_time = run_timeit(number_of_channels, False, iterations)
+
+        print('{} channels: full scan {:.1f}us/block deadlines {:.1f}us/block'.format(
+            number_of_channels,
+            full_scan_time / iterations * 1e6,
+            deadlines_time / iterations * 1e6,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--channels', type=int, nargs='+', default=CHANNELS)
+    args = parser.parse_args()
+
+    test_block(args.iterations, args.channels)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ import timeit
 
 import coincurve
 
+from raiden.encoding.signing import SENDER_CACHE, get_sender_cache_stats
 from raiden.utils import sha3, privatekey_to_address
 from raiden.messages import decode
 from raiden.messages import (
@@ -16,6 +17,7 @@ PRIVKEY = coincurve.PrivateKey(PRIVKEY_BIN)
 ADDRESS = privatekey_to_address(PRIVKEY_BIN)
 HASH = sha3(PRIVKEY_BIN)
 ITERATIONS = 1000000  # timeit default
+RETRANSMISSIONS = 5
 
 
 def run_timeit(message_name, message, iterations=ITERATIONS):
@@ -34,7 +36,7 @@ def run_timeit(message_name, message, iterations=ITERATIONS):
 
 
 def test_processed(iterations=ITERATIONS):
-    msg = Processed(ADDRESS, HASH)
+    msg = Processed(ADDRESS, 1)
     run_timeit('Processed', msg, iterations=iterations)
 
 
@@ -45,11 +47,13 @@ def test_ping(iterations=ITERATIONS):
 
 
 def test_secret_request(iterations=ITERATIONS):
-    identifier = 1
+    message_identifier = 1
+    payment_identifier = 1
     secrethash = HASH
     amount = 1
     msg = SecretRequest(
-        identifier,
+        message_identifier,
+        payment_identifier,
         secrethash,
         amount,
     )
@@ -58,14 +62,16 @@ def test_secret_request(iterations=ITERATIONS):
 
 
 def test_secret(iterations=ITERATIONS):
-    identifier = 1
+    message_identifier = 1
+    payment_identifier = 1
     nonce = 1
-    channel = HASH
+    channel = ADDRESS
     transferred_amount = 1
+    locksroot = HASH
     secret = HASH
-    locksroot = ''
     msg = Secret(
-        identifier,
+        message_identifier,
+        payment_identifier,
         nonce,
         channel,
         transferred_amount,
@@ -77,18 +83,22 @@ def test_secret(iterations=ITERATIONS):
 
 
 def test_direct_transfer(iterations=ITERATIONS):
-    identifier = 1
+    message_identifier = 1
+    payment_identifier = 1
     nonce = 1
     token = ADDRESS
-    balance = 1
+    channel = ADDRESS
+    transferred_amount = 1
     recipient = ADDRESS
     locksroot = HASH
 
     msg = DirectTransfer(
-        identifier,
+        message_identifier,
+        payment_identifier,
         nonce,
         token,
-        balance,
+        channel,
+        transferred_amount,
         recipient,
         locksroot,
     )
@@ -96,69 +106,114 @@ def test_direct_transfer(iterations=ITERATIONS):
     run_timeit('DirectTransfer', msg, iterations=iterations)
 
 
-def test_mediated_transfer(iterations=ITERATIONS):
-    identifier = 1
+def make_lock():
     amount = 1
     expiration = 1
     secrethash = sha3(ADDRESS)
-    lock = Lock(amount, expiration, secrethash)
+    return Lock(amount, expiration, secrethash)
+
 
+def test_mediated_transfer(iterations=ITERATIONS):
+    message_identifier = 1
+    payment_identifier = 1
     nonce = 1
     token = ADDRESS
-    balance = 1
+    channel = ADDRESS
+    transferred_amount = 1
     recipient = ADDRESS
     locksroot = sha3(ADDRESS)
     target = ADDRESS
     initiator = ADDRESS
     msg = LockedTransfer(
-        identifier,
+        message_identifier,
+        payment_identifier,
         nonce,
         token,
-        balance,
+        channel,
+        transferred_amount,
         recipient,
         locksroot,
-        lock,
+        make_lock(),
         target,
         initiator,
         fee=0,
     )
     msg.sign(PRIVKEY, ADDRESS)
 
-    run_timeit('MediatedTranfer', msg, iterations=iterations)
+    run_timeit('LockedTransfer', msg, iterations=iterations)
 
 
-def test_cancel_transfer(iterations=ITERATIONS):
-    amount = 1
-    expiration = 1
-    secrethash = sha3(ADDRESS)
-    lock = Lock(amount, expiration, secrethash)
-
-    identifier = 1
+def test_refund_transfer(iterations=ITERATIONS):
+    message_identifier = 1
+    payment_identifier = 1
     nonce = 1
     token = ADDRESS
+    channel = ADDRESS
     transferred_amount = 1
     recipient = ADDRESS
     locksroot = sha3(ADDRESS)
+    target = ADDRESS
+    initiator = ADDRESS
     msg = RefundTransfer(
-        identifier,
+        message_identifier,
+        payment_identifier,
         nonce,
         token,
+        channel,
         transferred_amount,
         recipient,
         locksroot,
-        lock,
+        make_lock(),
+        target,
+        initiator,
     )
     msg.sign(PRIVKEY, ADDRESS)
     run_timeit('RefundTransfer', msg, iterations=iterations)
 
 
+def test_retransmissions(iterations=ITERATIONS, retransmissions=RETRANSMISSIONS):
+    """ Decode every message `retransmissions` times, as it happens when the
+    `Processed` messages are lost, with and without the sender cache.
+    """
+    number_of_messages = max(iterations // retransmissions, 1)
+
+    datas = list()
+    for nonce in range(number_of_messages):
+        msg = Ping(nonce=nonce)
+        msg.sign(PRIVKEY, ADDRESS)
+        datas.append(msg.encode())
+
+    def test_decode():
+        for data in datas:
+            for _ in range(retransmissions):
+                decode(data)
+
+    maxsize = SENDER_CACHE.maxsize
+    try:
+        for cache_name, cache_size in (('uncached', 0), ('cached', maxsize)):
+            SENDER_CACHE.clear()
+            SENDER_CACHE.maxsize = cache_size
+
+            decode_time = timeit.timeit(test_decode, number=1)
+
+            print('Ping retransmitted {} times {}: decode {} {}'.format(
+                retransmissions,
+                cache_name,
+                decode_time,
+                get_sender_cache_stats(),
+            ))
+    finally:
+        SENDER_CACHE.maxsize = maxsize
+
+
 def test_all(iterations=ITERATIONS):
     test_mediated_transfer(iterations=iterations)
     test_processed(iterations=iterations)
     test_ping(iterations=iterations)
     test_secret_request(iterations=iterations)
+    test_secret(iterations=iterations)
     test_direct_transfer(iterations=iterations)
-    test_cancel_transfer(iterations=iterations)
+    test_refund_transfer(iterations=iterations)
 
     # LockedTransferBase cannot be encoded/decoded
 
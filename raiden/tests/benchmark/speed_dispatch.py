@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import argparse
+import random
+import timeit
+
+from raiden.tests.utils import factories
+from raiden.transfer import node
+from raiden.transfer.architecture import StateManager
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.state import (
+    PaymentNetworkState,
+    TokenNetworkGraphState,
+    TokenNetworkState,
+)
+from raiden.transfer.state_change import (
+    ActionInitNode,
+    Block,
+    ContractReceiveNewPaymentNetwork,
+)
+
+ITERATIONS = 100
+CHANNELS = (10, 100, 1000)
+
+
+def make_state_manager(number_of_channels, copy_on_write):
+    token_address = factories.make_address()
+    our_address = factories.make_address()
+
+    channels = [
+        factories.make_channel(
+            our_balance=10,
+            partner_balance=10,
+            our_address=our_address,
+            token_address=token_address,
+        )
+        for _ in range(number_of_channels)
+    ]
+    token_network = TokenNetworkState(
+        factories.make_address(),
+        token_address,
+        TokenNetworkGraphState(ChannelGraph()),
+        channels,
+    )
+    payment_network = PaymentNetworkState(
+        factories.make_address(),
+        [token_network],
+    )
+
+    state_manager = StateManager(node.state_transition, None, copy_on_write=copy_on_write)
+    state_manager.dispatch(ActionInitNode(random.Random(), 1))
+    state_manager.dispatch(ContractReceiveNewPaymentNetwork(payment_network))
+
+    return state_manager
+
+
+def run_timeit(number_of_channels, copy_on_write, iterations=ITERATIONS):
+    state_manager = make_state_manager(number_of_channels, copy_on_write)
+    block_numbers = iter(range(2, iterations + 2))
+
+    def test_dispatch_block():
+        state_manager.dispatch(Block(next(block_numbers)))
+
+    return timeit.timeit(test_dispatch_block, number=iterations)
+
+
+def test_dispatch(iterations=ITERATIONS, channels=CHANNELS):
+    for number_of_channels in channels:
+        deepcopy_time = run_timeit(number_of_channels, False, iterations)
+        copy_on_write_time = run_timeit(number_of_channels, True, iterations)
+
+        print('{} channels: deepcopy {} copy_on_write {} speedup {:.1f}x'.format(
+            number_of_channels,
+            deepcopy_time,
+            copy_on_write_time,
+            deepcopy_time / copy_on_write_time,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--channels', type=int, nargs='+', default=CHANNELS)
+    args = parser.parse_args()
+
+    test_dispatch(args.iterations, args.channels)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import argparse
+import pickle
+import random
+import time
+import tracemalloc
+
+import networkx
+
+from raiden.storage.serialize import BinarySerializer
+from raiden.tests.utils import factories
+from raiden.transfer.graph import ChannelGraph
+
+NODES = 20000
+EDGES = 100000
+ROUNDS = 10
+
+
+def make_edge_list(number_of_nodes, number_of_edges, rng):
+    addresses = [factories.make_address() for _ in range(number_of_nodes)]
+
+    edges = set()
+    while len(edges) < number_of_edges:
+        first, second = rng.sample(addresses, 2)
+        if (second, first) not in edges:
+            edges.add((first, second))
+
+    return list(edges)
+
+
+def make_networkx_graph(edge_list):
+    graph = networkx.Graph()
+    graph.add_edges_from(edge_list)
+    return graph
+
+
+def measure_memory(function, *args):
+    """ Returns the result of `function` and the memory it allocated. """
+    tracemalloc.start()
+    result = function(*args)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, memory
+
+
+def measure_time(function, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        function()
+    return (time.time() - start) / rounds
+
+
+def test_graph(number_of_nodes=NODES, number_of_edges=EDGES, rounds=ROUNDS, seed=0):
+    rng = random.Random(seed)
+    edge_list = make_edge_list(number_of_nodes, number_of_edges, rng)
+    new_edge = (edge_list[0][0], edge_list[1][0])
+
+    graphs = (
+        ('networkx', make_networkx_graph),
+        ('ChannelGraph', ChannelGraph),
+    )
+
+    for name, make_graph in graphs:
+        graph, memory = measure_memory(make_graph, edge_list)
+
+        def copy_and_add(graph=graph):
+            # what path_copy does on ChannelNew
+            graph.copy().add_edge(*new_edge)
+
+        copy = measure_time(copy_and_add, rounds)
+        pickled = pickle.dumps(graph, 4)
+        pickle_time = measure_time(lambda: pickle.dumps(graph, 4), rounds)
+
+        print('{}: {:.1f}MB copy+add_edge {:.2f}ms pickle {:.1f}MB {:.2f}ms'.format(
+            name,
+            memory / 2 ** 20,
+            copy * 1000,
+            len(pickled) / 2 ** 20,
+            pickle_time * 1000,
+        ))
+
+        if isinstance(graph, ChannelGraph):
+            serialized = BinarySerializer.serialize(graph)
+            print('{}: binary {:.1f}MB'.format(name, len(serialized) / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=NODES)
+    parser.add_argument('--edges', type=int, default=EDGES)
+    parser.add_argument('--rounds', type=int, default=ROUNDS)
+    args = parser.parse_args()
+
+    test_graph(args.nodes, args.edges, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import time
+
+from raiden.transfer.merkle_tree import (
+    LEAVES,
+    compute_layers,
+    compute_layers_with,
+    compute_layers_without,
+    compute_merkleproof_for,
+    compute_merkleproofs_for,
+)
+from raiden.transfer.state import EMPTY_MERKLE_TREE, MerkleTreeState
+
+LOCKS = (10, 100, 1000)
+
+
+def add_remove_rebuild(lockhashes):
+    layers = EMPTY_MERKLE_TREE.layers
+
+    for lockhash in lockhashes:
+        leaves = list(layers[LEAVES])
+        leaves.append(lockhash)
+        layers = compute_layers(leaves)
+
+    for lockhash in lockhashes[:-1]:
+        leaves = list(layers[LEAVES])
+        leaves.remove(lockhash)
+        layers = compute_layers(leaves)
+
+
+def add_remove_incremental(lockhashes):
+    layers = EMPTY_MERKLE_TREE.layers
+
+    for lockhash in lockhashes:
+        layers = compute_layers_with(layers, lockhash)
+
+    for lockhash in lockhashes[:-1]:
+        layers = compute_layers_without(layers, lockhash)
+
+
+def run_locks_per_second(function, lockhashes):
+    start = time.time()
+    function(lockhashes)
+    elapsed = time.time() - start
+
+    # every lock is added and removed
+    return 2 * len(lockhashes) / elapsed
+
+
+def proofs_one_by_one(lockhashes):
+    merkletree = MerkleTreeState(compute_layers(lockhashes))
+
+    for lockhash in lockhashes:
+        compute_merkleproof_for(merkletree, lockhash)
+
+
+def proofs_batch(lockhashes):
+    merkletree = MerkleTreeState(compute_layers(lockhashes))
+    compute_merkleproofs_for(merkletree, lockhashes)
+
+
+def run_proofs_per_second(function, lockhashes):
+    start = time.time()
+    function(lockhashes)
+    elapsed = time.time() - start
+
+    return len(lockhashes) / elapsed
+
+
+def test_merkletree(locks=LOCKS):
+    for number_of_locks in locks:
+        lockhashes = [os.urandom(32) for _ in range(number_of_locks)]
+
+        rebuild = run_locks_per_second(add_remove_rebuild, lockhashes)
+        incremental = run_locks_per_second(add_remove_incremental, lockhashes)
+
+        print('{} locks: rebuild {:.0f} locks/s incremental {:.0f} locks/s'.format(
+            number_of_locks,
+            rebuild,
+            incremental,
+        ))
+
+        one_by_one = run_proofs_per_second(proofs_one_by_one, lockhashes)
+        batch = run_proofs_per_second(proofs_batch, lockhashes)
+
+        print('{} locks: one by one {:.0f} proofs/s batch {:.0f} proofs/s'.format(
+            number_of_locks,
+            one_by_one,
+            batch,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locks', type=int, nargs='+', default=LOCKS)
+    args = parser.parse_args()
+
+    test_merkletree(args.locks)
+
+
+if __name__ == '__main__':
+    main()
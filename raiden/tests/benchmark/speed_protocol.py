@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import argparse
+import time
+import tracemalloc
+
+import gevent
+from gevent.event import Event
+
+from raiden.network.protocol import RaidenProtocol
+from raiden.tests.utils import factories
+
+PARTNERS = (100, 1000, 10000)
+DURATION = 2
+RETRY_INTERVAL = 0.1
+NAT_KEEPALIVE_TIMEOUT = 0.5
+
+
+class ServerMock:
+    started = True
+
+
+class CountingTransport:
+    def __init__(self):
+        self.server = ServerMock()
+        self.sent = 0
+
+    def send(self, sender, host_port, bytes_):  # pylint: disable=unused-argument
+        self.sent += 1
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stop_accepting(self):
+        pass
+
+
+class Discovery:
+    def get(self, node_address):  # pylint: disable=unused-argument,no-self-use
+        return ('127.0.0.1', 1)
+
+
+class Raiden:
+    def __init__(self):
+        self.private_key, self.address = factories.make_privkey_address()
+
+    def sign(self, message):
+        message.sign(self.private_key, self.address)
+
+    def get_block_number(self):  # pylint: disable=no-self-use
+        return 1
+
+    def get_partner_next_nonce(  # pylint: disable=no-self-use,unused-argument
+            self,
+            partner,
+            channel):
+        return None
+
+    def handle_state_change(self, state_change):
+        pass
+
+
+def start_scheduler(partners, transport):
+    """ Every partner is health checked and has an unacknowledged message in
+    its queue, all of it is driven by the protocol's scheduler.
+    """
+    protocol = RaidenProtocol(
+        transport,
+        Discovery(),
+        Raiden(),
+        retry_interval=RETRY_INTERVAL,
+        retries_before_backoff=10 ** 6,
+        nat_keepalive_retries=10 ** 6,
+        nat_keepalive_timeout=NAT_KEEPALIVE_TIMEOUT,
+        nat_invitation_timeout=NAT_KEEPALIVE_TIMEOUT,
+    )
+
+    for partner in partners:
+        queue = protocol.get_channel_queue(partner, b'')
+        queue.put(partner)
+
+    protocol.start()
+    return protocol.stop_and_wait
+
+
+def retransmit(transport, event_stop, data, timeout):
+    while not event_stop.wait(timeout):
+        transport.send(None, ('127.0.0.1', 1), data)
+
+
+def start_greenlets(partners, transport):
+    """ The same load with a greenlet per queue and per health check, each
+    waiting on its own timer.
+    """
+    event_stop = Event()
+    greenlets = list()
+
+    for partner in partners:
+        greenlets.append(gevent.spawn(
+            retransmit,
+            transport,
+            event_stop,
+            partner,
+            RETRY_INTERVAL,
+        ))
+        greenlets.append(gevent.spawn(
+            retransmit,
+            transport,
+            event_stop,
+            partner,
+            NAT_KEEPALIVE_TIMEOUT,
+        ))
+
+    def stop():
+        event_stop.set()
+        gevent.wait(greenlets)
+
+    return stop
+
+
+def run(start, number_of_partners, duration=DURATION):
+    """ Returns the memory allocated for the tasks, the CPU time used per
+    second and the number of packets sent per second.
+    """
+    partners = [factories.make_address() for _ in range(number_of_partners)]
+    transport = CountingTransport()
+
+    tracemalloc.start()
+    stop = start(partners, transport)
+    gevent.sleep(0)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    transport.sent = 0
+    cpu_start = time.process_time()
+    gevent.sleep(duration)
+    cpu_time = time.process_time() - cpu_start
+    sent = transport.sent
+
+    stop()
+
+    return memory, cpu_time / duration, sent / duration
+
+
+def test_protocol(partners=PARTNERS, duration=DURATION):
+    modes = (
+        ('greenlets', start_greenlets),
+        ('scheduler', start_scheduler),
+    )
+
+    for number_of_partners in partners:
+        for mode_name, start in modes:
+            memory, cpu_usage, packets = run(start, number_of_partners, duration)
+
+            print('{} partners {}: {:.0f} bytes/partner cpu {:.1f}% {:.0f} packets/s'.format(
+                number_of_partners,
+                mode_name,
+                memory / number_of_partners,
+                cpu_usage * 100,
+                packets,
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--partners', type=int, nargs='+', default=PARTNERS)
+    parser.add_argument('--duration', type=float, default=DURATION)
+    args = parser.parse_args()
+
+    test_protocol(args.partners, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import argparse
+import time
+
+import gevent
+
+from raiden.messages import Ping
+from raiden.network.protocol import RaidenProtocol
+from raiden.tests.utils import factories
+from raiden.tests.utils.transport import LossyTransport
+
+COUNT = 10
+
+
+class Discovery:
+    def __init__(self):
+        self.nodeid_to_hostport = dict()
+
+    def get(self, node_address):
+        return self.nodeid_to_hostport[node_address]
+
+
+class Raiden:
+    def __init__(self):
+        self.private_key, self.address = factories.make_privkey_address()
+
+    def sign(self, message):
+        message.sign(self.private_key, self.address)
+
+    def get_block_number(self):  # pylint: disable=no-self-use
+        return 1
+
+    def get_partner_next_nonce(  # pylint: disable=no-self-use,unused-argument
+            self,
+            partner,
+            channel):
+        return None
+
+    def handle_state_change(self, state_change):
+        pass
+
+
+def transfer(adaptive, latency, droprate, retry_interval, count, queue_window=1):
+    """ Sends `count` messages from one protocol to another one and returns
+    the time it took and the number of packets sent.
+    """
+    protocols = list()
+    for port in (1, 2):
+        transport = LossyTransport('127.0.0.1', port)
+        transport.latency = latency
+        transport.droprate = droprate
+
+        protocol = RaidenProtocol(
+            transport,
+            Discovery(),
+            Raiden(),
+            retry_interval=retry_interval,
+            retries_before_backoff=5,
+            nat_keepalive_retries=100,
+            nat_keepalive_timeout=10,
+            nat_invitation_timeout=10,
+            adaptive_retry_timeout=adaptive,
+            queue_window=queue_window,
+        )
+        transport.protocol = protocol
+        protocols.append(protocol)
+
+    sender, receiver = protocols
+    sender.discovery.nodeid_to_hostport[receiver.raiden.address] = ('127.0.0.1', 2)
+    receiver.discovery.nodeid_to_hostport[sender.raiden.address] = ('127.0.0.1', 1)
+
+    queue = sender.get_channel_queue(receiver.raiden.address, factories.UNIT_TOKEN_ADDRESS)
+    for nonce in range(count):
+        ping = Ping(nonce=nonce)
+        sender.raiden.sign(ping)
+        queue.put(ping.encode())
+
+    start = time.monotonic()
+    for protocol in protocols:
+        protocol.start()
+
+    while queue:
+        gevent.sleep(0.001)
+
+    elapsed = time.monotonic() - start
+
+    for protocol in protocols:
+        protocol.stop_and_wait()
+
+    return elapsed, len(sender.transport.sent)
+
+
+def test_retransmission(count=COUNT):
+    scenarios = (
+        # a fast partner with losses, the losses are recovered after a few
+        # RTTs instead of the retry interval
+        ('fast fixed', dict(adaptive=False, latency=0.001, droprate=4, retry_interval=0.1)),
+        ('fast adaptive', dict(adaptive=True, latency=0.001, droprate=4, retry_interval=0.1)),
+        # a slow partner, the retry interval is shorter than the RTT
+        ('slow fixed', dict(adaptive=False, latency=0.03, droprate=0, retry_interval=0.02)),
+        ('slow adaptive', dict(adaptive=True, latency=0.03, droprate=0, retry_interval=0.02)),
+        # a slow partner, the window doesn't wait a round trip per message
+        ('slow stop-and-wait', dict(adaptive=True, latency=0.02, droprate=0, retry_interval=0.2)),
+        ('slow window', dict(
+            adaptive=True,
+            latency=0.02,
+            droprate=0,
+            retry_interval=0.2,
+            queue_window=5,
+        )),
+    )
+
+    for name, arguments in scenarios:
+        elapsed, sent = transfer(count=count, **arguments)
+        print('{}: {} messages in {:.3f}s {} packets'.format(name, count, elapsed, sent))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=COUNT)
+    args = parser.parse_args()
+
+    test_retransmission(args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+import argparse
+import random
+import time
+from heapq import heappush
+
+import networkx
+
+from raiden.routing import (
+    get_ordered_partners,
+    get_ranked_partners,
+    make_graph,
+)
+from raiden.tests.utils import factories
+from raiden.transfer.state import NODE_NETWORK_REACHABLE, NODE_NETWORK_UNREACHABLE
+
+# (nodes, channels per node), see docs/Thoughts-on-Performance.md
+NETWORKS = ((1000, 5), (1000, 10), (10000, 5))
+PATHS = 1000
+
+# channels of the hub, a node with many more channels than the others
+HUB_CHANNELS = 300
+
+# simulated transfers, see test_route_simulation
+TRANSFERS = 1000
+MAX_DEPOSIT = 100
+MAX_AMOUNT = 60
+OFFLINE_FRACTION = 0.1
+
+# the lock expiration limits the length of a path
+MAX_HOPS = 10
+
+
+def get_ordered_partners_per_neighbor(network_graph, from_address, to_address):
+    """ The previous implementation, a shortest path search per neighbor. """
+    paths = list()
+
+    for neighbor in networkx.all_neighbors(network_graph, from_address):
+        try:
+            length = networkx.shortest_path_length(
+                network_graph,
+                neighbor,
+                to_address,
+            )
+            heappush(paths, (length, neighbor))
+        except (networkx.NetworkXNoPath, networkx.NodeNotFound):
+            pass
+
+    return paths
+
+
+def make_network(number_of_nodes, channels_per_node, hub_channels, rng):
+    """ Returns the addresses, the hub and the graph of a random network. """
+    addresses = [factories.make_address() for _ in range(number_of_nodes)]
+
+    edge_list = list()
+    for address in addresses:
+        for partner in rng.sample(addresses, channels_per_node):
+            if partner != address:
+                edge_list.append((address, partner))
+
+    hub = addresses[0]
+    for partner in rng.sample(addresses[1:], hub_channels):
+        edge_list.append((hub, partner))
+
+    return addresses, hub, make_graph(edge_list)
+
+
+def run_paths_per_second(function, network_graph, pairs):
+    start = time.time()
+    for from_address, to_address in pairs:
+        function(network_graph, from_address, to_address)
+    elapsed = time.time() - start
+
+    return len(pairs) / elapsed
+
+
+def test_routing(networks=NETWORKS, paths=PATHS, hub_channels=HUB_CHANNELS, seed=0):
+    rng = random.Random(seed)
+
+    for number_of_nodes, channels_per_node in networks:
+        addresses, hub, network_graph = make_network(
+            number_of_nodes,
+            channels_per_node,
+            hub_channels,
+            rng,
+        )
+
+        scenarios = (
+            ('any node', [tuple(rng.sample(addresses, 2)) for _ in range(paths)]),
+            ('hub', [(hub, rng.choice(addresses[1:])) for _ in range(paths)]),
+        )
+
+        # the previous implementation used networkx graphs
+        reference_graph = networkx.Graph(network_graph.edges())
+
+        for scenario_name, pairs in scenarios:
+            per_neighbor = run_paths_per_second(
+                get_ordered_partners_per_neighbor,
+                reference_graph,
+                pairs,
+            )
+            single_search = run_paths_per_second(
+                get_ordered_partners,
+                network_graph,
+                pairs,
+            )
+
+            print('{}x{} from {}: per neighbor {:.0f} paths/s single search {:.0f} paths/s'.format(
+                number_of_nodes,
+                channels_per_node,
+                scenario_name,
+                per_neighbor,
+                single_search,
+            ))
+
+
+class Simulation:
+    """ Mediated transfers over a network with random balances and offline
+    nodes.
+
+    Every node knows the balances of its own channels and the liveness of
+    its partners. A mediator tries its routes in order, a route that fails
+    comes back as a refund, and a node that has seen the transfer already
+    refunds it.
+    """
+
+    def __init__(self, network_graph, rng, use_liveness):
+        self.network_graph = network_graph
+        self.use_liveness = use_liveness
+
+        self.balances = dict()
+        for first, second in network_graph.edges():
+            for payer, payee in ((first, second), (second, first)):
+                self.balances[(payer, payee)] = rng.randint(0, MAX_DEPOSIT)
+
+        nodes = list(network_graph.nodes())
+        self.offline = set(rng.sample(nodes, int(len(nodes) * OFFLINE_FRACTION)))
+
+    def network_statuses(self, node):
+        statuses = dict()
+        for partner in self.network_graph.neighbors(node):
+            if partner in self.offline:
+                statuses[partner] = NODE_NETWORK_UNREACHABLE
+            else:
+                statuses[partner] = NODE_NETWORK_REACHABLE
+        return statuses
+
+    def partners(self, node, target):
+        """ The partners in the order of get_best_routes, before and after
+        the paths through unreachable nodes are pruned.
+        """
+        if self.use_liveness:
+            ranked = get_ranked_partners(
+                self.network_graph,
+                self.network_statuses(node),
+                node,
+                target,
+            )
+            return [partner for _, partner in ranked]
+
+        ordered = get_ordered_partners(self.network_graph, node, target)
+        return [partner for _, partner in sorted(ordered)]
+
+    def forward(self, node, previous, target, amount, seen, hops=0):
+        """ Returns the path of the transfer or None, and the number of
+        messages it took.
+        """
+        if node == target:
+            return [node], 0
+
+        if hops == MAX_HOPS:
+            return None, 0
+
+        messages = 0
+        for partner in self.partners(node, target):
+            # the same checks as get_best_routes
+            if partner == previous or partner in self.offline:
+                continue
+            if self.balances[(node, partner)] < amount:
+                continue
+
+            # the transfer and, if it fails, its refund
+            messages += 1
+            if partner in seen:
+                messages += 1
+                continue
+
+            seen.add(partner)
+            path, partner_messages = self.forward(
+                partner,
+                node,
+                target,
+                amount,
+                seen,
+                hops + 1,
+            )
+            messages += partner_messages
+
+            if path is not None:
+                return [node] + path, messages
+
+            messages += 1
+
+        return None, messages
+
+    def transfer(self, initiator, target, amount):
+        path, messages = self.forward(initiator, None, target, amount, {initiator})
+
+        if path is not None:
+            for payer, payee in zip(path, path[1:]):
+                self.balances[(payer, payee)] -= amount
+                self.balances[(payee, payer)] += amount
+
+        return path is not None, messages
+
+
+def test_route_simulation(networks=NETWORKS, transfers=TRANSFERS, seed=0):
+    """ Prints the transfers that succeeded, the messages sent per transfer,
+    which includes the refunds, and the time spent per transfer to find the
+    routes.
+    """
+    for number_of_nodes, channels_per_node in networks:
+        for mode_name, use_liveness in (('hop count', False), ('liveness', True)):
+            # the same network and transfers for both modes
+            rng = random.Random(seed)
+            addresses, _, network_graph = make_network(
+                number_of_nodes,
+                channels_per_node,
+                0,
+                rng,
+            )
+            simulation = Simulation(network_graph, rng, use_liveness)
+            online = [address for address in addresses if address not in simulation.offline]
+
+            succeeded = 0
+            messages = 0
+            start = time.time()
+            for _ in range(transfers):
+                initiator, target = rng.sample(online, 2)
+                success, transfer_messages = simulation.transfer(
+                    initiator,
+                    target,
+                    rng.randint(1, MAX_AMOUNT),
+                )
+                succeeded += success
+                messages += transfer_messages
+            elapsed = time.time() - start
+
+            print('{}x{} {}: {:.1f}% succeeded {:.1f} messages {:.2f}ms routing'.format(
+                number_of_nodes,
+                channels_per_node,
+                mode_name,
+                succeeded / transfers * 100,
+                messages / transfers,
+                elapsed / transfers * 1000,
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, nargs='+')
+    parser.add_argument('--channels', type=int, default=5)
+    parser.add_argument('--paths', type=int, default=PATHS)
+    parser.add_argument('--hub-channels', type=int, default=HUB_CHANNELS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--transfers', type=int, default=TRANSFERS)
+    args = parser.parse_args()
+
+    networks = NETWORKS
+    if args.nodes:
+        networks = [(nodes, args.channels) for nodes in args.nodes]
+
+    test_routing(networks, args.paths, args.hub_channels, args.seed)
+    test_route_simulation(networks, args.transfers, args.seed)
+
+
+if __name__ == '__main__':
+    main()
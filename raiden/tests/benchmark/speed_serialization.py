@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import argparse
+import random
+import timeit
+
+from raiden.storage.serialize import SERIALIZERS
+from raiden.tests.utils import factories
+from raiden.transfer import node
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.state import (
+    PaymentNetworkState,
+    TokenNetworkGraphState,
+    TokenNetworkState,
+)
+from raiden.transfer.state_change import (
+    ActionInitNode,
+    ActionTransferDirect,
+    Block,
+    ContractReceiveNewPaymentNetwork,
+)
+
+ITERATIONS = 10
+CHANNELS = 100
+TRANSFERS = 500
+
+
+def make_wal(number_of_channels, number_of_transfers):
+    """ Returns the state changes, events and the final node state of a node
+    doing direct transfers, one per block.
+    """
+    payment_network_identifier = factories.make_address()
+    token_address = factories.make_address()
+    our_address = factories.make_address()
+
+    channels = [
+        factories.make_channel(
+            our_balance=number_of_transfers,
+            partner_balance=number_of_transfers,
+            our_address=our_address,
+            token_address=token_address,
+        )
+        for _ in range(number_of_channels)
+    ]
+
+    graph = ChannelGraph()
+    for channel_state in channels:
+        graph.add_edge(our_address, channel_state.partner_state.address)
+
+    token_network = TokenNetworkState(
+        factories.make_address(),
+        token_address,
+        TokenNetworkGraphState(graph),
+        channels,
+    )
+    payment_network = PaymentNetworkState(payment_network_identifier, [token_network])
+
+    state_changes = [
+        ActionInitNode(random.Random(), 1),
+        ContractReceiveNewPaymentNetwork(payment_network),
+    ]
+    for payment_identifier in range(number_of_transfers):
+        state_changes.append(Block(payment_identifier + 2))
+        state_changes.append(ActionTransferDirect(
+            payment_network_identifier,
+            token_address,
+            random.choice(channels).partner_state.address,
+            payment_identifier,
+            1,
+        ))
+
+    node_state = None
+    events = list()
+    for state_change in state_changes:
+        iteration = node.state_transition(node_state, state_change)
+        node_state = iteration.new_state
+        events.extend(iteration.events)
+
+    return state_changes, events, node_state
+
+
+def run_timeit(serializer_name, records, iterations=ITERATIONS):
+    serializer = SERIALIZERS[serializer_name]
+    serialized = [serializer.serialize(record) for record in records]
+
+    def test_serialize():
+        for record in records:
+            serializer.serialize(record)
+
+    def test_deserialize():
+        for data in serialized:
+            serializer.deserialize(data)
+
+    serialize_time = timeit.timeit(test_serialize, number=iterations)
+    deserialize_time = timeit.timeit(test_deserialize, number=iterations)
+
+    total_bytes = sum(len(data) for data in serialized)
+    count = len(records) * iterations
+
+    return total_bytes / len(records), serialize_time / count, deserialize_time / count
+
+
+def test_serialization(iterations=ITERATIONS, channels=CHANNELS, transfers=TRANSFERS):
+    state_changes, events, node_state = make_wal(channels, transfers)
+
+    groups = (
+        ('state changes', state_changes),
+        ('events', events),
+        ('snapshot', [node_state]),
+    )
+
+    for group_name, records in groups:
+        for serializer_name in sorted(SERIALIZERS):
+            bytes_per_record, serialize_time, deserialize_time = run_timeit(
+                serializer_name,
+                records,
+                iterations,
+            )
+            print('{} {}: {:.1f} bytes/record serialize {:.1f}us deserialize {:.1f}us'.format(
+                group_name,
+                serializer_name,
+                bytes_per_record,
+                serialize_time * 1e6,
+                deserialize_time * 1e6,
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--channels', type=int, default=CHANNELS)
+    parser.add_argument('--transfers', type=int, default=TRANSFERS)
+    args = parser.parse_args()
+
+    test_serialization(args.iterations, args.channels, args.transfers)
+
+
+if __name__ == '__main__':
+    main()
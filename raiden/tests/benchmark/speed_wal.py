@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import gevent
+
+from raiden.storage.serialize import PickleSerializer
+from raiden.storage.sqlite import SQLiteStorage, SYNCHRONOUS_MODES
+from raiden.storage.wal import WriteAheadLog
+from raiden.transfer.architecture import StateManager, TransitionResult
+from raiden.transfer.events import EventTransferSentFailed
+from raiden.transfer.state_change import Block
+
+STATE_CHANGES = 2000
+CONCURRENCY = 50
+
+
+def state_transition_noop(state, state_change):  # pylint: disable=unused-argument
+    return TransitionResult(state, [EventTransferSentFailed(1, 'benchmark')])
+
+
+def run_wal(database_path, synchronous, group_commit, state_changes, concurrency):
+    storage = SQLiteStorage(
+        database_path,
+        PickleSerializer,
+        synchronous=synchronous,
+        group_commit=group_commit,
+    )
+    wal = WriteAheadLog(StateManager(state_transition_noop, None), storage)
+
+    per_greenlet = state_changes // concurrency
+
+    def log_state_changes(offset):
+        for block_number in range(offset, offset + per_greenlet):
+            wal.log_and_dispatch(Block(block_number), block_number)
+
+    start = time.time()
+    greenlets = [
+        gevent.spawn(log_state_changes, greenlet_number * per_greenlet)
+        for greenlet_number in range(concurrency)
+    ]
+    gevent.joinall(greenlets, raise_error=True)
+    elapsed = time.time() - start
+
+    return (per_greenlet * concurrency) / elapsed
+
+
+def test_wal(state_changes=STATE_CHANGES, concurrency=CONCURRENCY, synchronous='FULL'):
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        for group_commit in (False, True):
+            database_path = os.path.join(tmpdir, 'group_commit_{}.db'.format(group_commit))
+            throughput = run_wal(
+                database_path,
+                synchronous,
+                group_commit,
+                state_changes,
+                concurrency,
+            )
+
+            print('group_commit={} synchronous={}: {:.1f} state changes/s'.format(
+                group_commit,
+                synchronous,
+                throughput,
+            ))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--state-changes', type=int, default=STATE_CHANGES)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--synchronous', choices=SYNCHRONOUS_MODES, default='FULL')
+    args = parser.parse_args()
+
+    test_wal(args.state_changes, args.concurrency, args.synchronous)
+
+
+if __name__ == '__main__':
+    main()
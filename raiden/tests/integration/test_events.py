@@ -11,6 +11,7 @@ from raiden.blockchain.abi import (
 )
 from raiden.blockchain.events import (
     ALL_EVENTS,
+    BlockchainEvents,
     get_all_channel_manager_events,
     get_all_netting_channel_events,
     get_all_registry_events,
@@ -22,8 +23,9 @@ from raiden.tests.utils.transfer import (
 )
 from raiden.tests.utils.blockchain import wait_until_block
 from raiden.tests.utils.network import CHAIN
+from raiden.tests.utils.tester_client import BlockChainServiceTesterMock
 from raiden.transfer import views, channel
-from raiden.utils import address_encoder, sha3
+from raiden.utils import address_encoder, privatekey_to_address, sha3
 
 
 def event_dicts_are_equal(dict1, dict2):
@@ -332,3 +334,75 @@ def test_secret_revealed(raiden_chain, deposit, settle_timeout, token_addresses)
         app0, deposit - amount, [],
         app1, deposit + amount, [],
     )
+
+
+@pytest.mark.parametrize('number_of_nodes', [2])
+def test_blockchain_events_one_request_per_poll(
+        deposit,
+        private_keys,
+        settle_timeout,
+        tester_chain,
+        tester_registry_address,
+        tester_token_address):
+    chain = BlockChainServiceTesterMock(private_keys[0], tester_chain)
+    partner_address = privatekey_to_address(private_keys[1])
+
+    requests = list()
+    get_logs = chain.client.get_logs
+
+    def counting_get_logs(json_data):
+        requests.append(json_data)
+        return get_logs(json_data)
+
+    chain.client.get_logs = counting_get_logs
+
+    def poll_event_types(blockchain_events):
+        # the alarm task passes the current block
+        return [
+            event.event_data['_event_type']
+            for event in blockchain_events.poll_blockchain_events(chain.block_number())
+        ]
+
+    blockchain_events = BlockchainEvents(chain)
+    registry = chain.registry(tester_registry_address)
+    blockchain_events.add_registry_listener(registry)
+
+    registry.add_token(tester_token_address)
+    assert poll_event_types(blockchain_events) == [b'TokenAdded']
+
+    manager = registry.manager_by_token(tester_token_address)
+    blockchain_events.add_channel_manager_listener(manager)
+
+    channel_address = manager.new_netting_channel(partner_address, settle_timeout)
+    assert poll_event_types(blockchain_events) == [b'ChannelNew']
+
+    netting_channel = chain.netting_channel(channel_address)
+    blockchain_events.add_netting_channel_listener(netting_channel)
+
+    # the events of the token are not polled
+    chain.token(tester_token_address).approve(channel_address, deposit)
+    netting_channel.deposit(deposit)
+    assert poll_event_types(blockchain_events) == [b'ChannelNewBalance']
+
+    assert len(requests) == 3
+    assert len(requests[-1]['address']) == 3
+
+    # the listeners that start from an older block get their older events
+    # once, in bounded block ranges
+    blockchain_events = BlockchainEvents(chain, max_block_range=10)
+    blockchain_events.add_registry_listener(registry, from_block=0)
+    blockchain_events.add_channel_manager_listener(manager, from_block=0)
+    blockchain_events.add_netting_channel_listener(netting_channel, from_block=0)
+    catch_up_ranges = len(range(0, blockchain_events.last_polled_block + 1, 10))
+
+    assert poll_event_types(blockchain_events) == [
+        b'TokenAdded',
+        b'ChannelNew',
+        b'ChannelNewBalance',
+    ]
+    assert poll_event_types(blockchain_events) == []
+    assert len(requests) == 3 + catch_up_ranges
+    assert all(
+        int(request['toBlock'], 16) - int(request['fromBlock'], 16) < 10
+        for request in requests[3:]
+    )
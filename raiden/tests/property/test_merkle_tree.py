@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from hypothesis import given
+from hypothesis.strategies import (
+    binary,
+    booleans,
+    lists,
+    tuples,
+)
+
+from raiden.transfer.merkle_tree import (
+    LEAVES,
+    compute_layers,
+    compute_layers_with,
+    compute_layers_without,
+    compute_merkleproof_for,
+    is_leaf,
+)
+from raiden.transfer.state import EMPTY_MERKLE_TREE, MerkleTreeState
+
+lockhashes = binary(min_size=32, max_size=32)
+
+
+@given(lists(lockhashes, min_size=1, unique=True))
+def test_compute_layers_with_matches_compute_layers(elements):
+    layers = EMPTY_MERKLE_TREE.layers
+
+    for position, element in enumerate(elements):
+        layers = compute_layers_with(layers, element)
+        assert layers == compute_layers(elements[:position + 1])
+
+
+@given(lists(lockhashes, min_size=2, unique=True), lists(booleans(), min_size=1))
+def test_compute_layers_without_matches_compute_layers(elements, choices):
+    layers = compute_layers(elements)
+    remaining = sorted(elements)
+
+    for remove_first in choices:
+        if len(remaining) < 2:
+            break
+
+        element = remaining.pop(0 if remove_first else len(remaining) // 2)
+        layers = compute_layers_without(layers, element)
+
+        assert layers == compute_layers(remaining)
+        assert not is_leaf(layers, element)
+
+
+@given(lists(tuples(booleans(), lockhashes), min_size=1))
+def test_incremental_proofs_match_compute_layers(operations):
+    """ Random adds and removes produce the same proofs as a full rebuild. """
+    layers = EMPTY_MERKLE_TREE.layers
+    elements = set()
+
+    for is_add, element in operations:
+        if is_add and element not in elements:
+            layers = compute_layers_with(layers, element)
+            elements.add(element)
+
+        elif not is_add and len(elements) > 1:
+            removed = min(elements)
+            layers = compute_layers_without(layers, removed)
+            elements.remove(removed)
+
+    assert set(layers[LEAVES]) == elements
+
+    if elements:
+        expected = MerkleTreeState(compute_layers(elements))
+        merkletree = MerkleTreeState(layers)
+
+        assert merkletree == expected
+        for element in elements:
+            assert compute_merkleproof_for(merkletree, element) == (
+                compute_merkleproof_for(expected, element)
+            )
@@ -9,6 +9,8 @@ from raiden.messages import (
     Ping,
 )
 from raiden.constants import UINT256_MAX, UINT64_MAX
+from raiden.encoding.signing import SENDER_CACHE
+from raiden.exceptions import InvalidProtocolMessage
 from raiden.utils import sha3
 from raiden.tests.utils.messages import (
     make_direct_transfer,
@@ -38,6 +40,35 @@ def test_encoding():
     assert ping.hash == decoded_ping.hash
 
 
+def test_decoding_reuses_the_recovered_sender():
+    ping = Ping(nonce=random.randint(0, UINT64_MAX))
+    ping.sign(PRIVKEY, ADDRESS)
+    data = ping.encode()
+
+    misses = SENDER_CACHE.misses
+    hits = SENDER_CACHE.hits
+
+    assert decode(data).sender == ADDRESS
+    assert decode(data).sender == ADDRESS
+    assert SENDER_CACHE.misses == misses + 1
+    assert SENDER_CACHE.hits == hits + 1
+
+    # a different signature for the same data is recovered again
+    other_privkey, other_address = make_privkey_address()
+    ping.sign(other_privkey, other_address)
+    assert decode(ping.encode()).sender == other_address
+
+
+def test_decoding_invalid_signature():
+    ping = Ping(nonce=0)
+    ping.sign(PRIVKEY, ADDRESS)
+    data = ping.encode()
+
+    invalid_data = data[:-1] + bytes([data[-1] + 10])
+    with pytest.raises(InvalidProtocolMessage):
+        decode(invalid_data)
+
+
 def test_hash():
     ping = Ping(nonce=0)
     ping.sign(PRIVKEY, ADDRESS)
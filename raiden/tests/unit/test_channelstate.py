@@ -458,6 +458,10 @@ def test_deposit_must_wait_for_confirmation():
     )
     unconfirmed_state = iteration.new_state
 
+    assert channel.get_block_deadline(unconfirmed_state, block_number) == (
+        confirmed_deposit_block_number
+    )
+
     for block_number in range(block_number, confirmed_deposit_block_number):
         unconfirmed_block = Block(block_number)
         iteration = channel.state_transition(
@@ -490,6 +494,7 @@ def test_deposit_must_wait_for_confirmation():
 
     assert_partner_state(confirmed_state.our_state, confirmed_state.partner_state, our_model2)
     assert_partner_state(confirmed_state.partner_state, confirmed_state.our_state, partner_model2)
+    assert channel.get_block_deadline(confirmed_state, confirmed_deposit_block_number) is None
 
 
 def test_channelstate_send_lockedtransfer():
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import pickle
+
+from raiden.storage.serialize import BinarySerializer
+from raiden.tests.utils import factories
+from raiden.transfer.graph import ChannelGraph
+
+
+def test_channel_graph_edges():
+    first, second, third = [factories.make_address() for _ in range(3)]
+    graph = ChannelGraph([(first, second), (second, third), (third, second)])
+
+    assert len(graph) == 3
+    assert graph.number_of_edges() == 2
+    assert graph.has_edge(second, first)
+    assert not graph.has_edge(first, third)
+    assert sorted(graph.neighbors(second)) == sorted([first, third])
+
+    graph.remove_edge(second, first)
+
+    # the node is kept without its channel
+    assert first in graph
+    assert graph.neighbors(first) == []
+    assert graph.number_of_edges() == 1
+
+
+def test_channel_graph_copy_on_write():
+    first, second, third = [factories.make_address() for _ in range(3)]
+    graph = ChannelGraph([(first, second)])
+
+    copy = graph.copy()
+    copy.add_edge(first, third)
+    graph.remove_edge(first, second)
+
+    assert graph.edges() == []
+    assert third not in graph
+
+    assert sorted(copy.neighbors(first)) == sorted([second, third])
+
+
+def test_channel_graph_roundtrip():
+    addresses = [factories.make_address() for _ in range(10)]
+    graph = ChannelGraph(zip(addresses, addresses[1:]))
+    graph.add_node(factories.make_address())
+
+    for restored in (
+            BinarySerializer.deserialize(BinarySerializer.serialize(graph)),
+            pickle.loads(pickle.dumps(graph, 4)),
+    ):
+        assert restored == graph
+        assert restored.addresses == graph.addresses
+
+        # the restored graph doesn't share the arrays
+        restored.add_edge(addresses[0], addresses[2])
+        assert not graph.has_edge(addresses[0], addresses[2])
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import pytest
 
-from raiden.messages import Ping
+from raiden.constants import UDP_MAX_MESSAGE_SIZE, UINT64_MAX
+from raiden.encoding import messages
+from raiden.exceptions import InvalidProtocolMessage
+from raiden.messages import decode, Message, Ping, ProcessedBatch
 from raiden.tests.utils.messages import (
     make_direct_transfer,
     make_lock,
@@ -12,6 +15,7 @@ from raiden.tests.utils.messages import (
     DIRECT_TRANSFER_INVALID_VALUES,
 )
 from raiden.tests.utils.factories import make_privkey_address
+from raiden.utils import sha3
 
 PRIVKEY, ADDRESS = make_privkey_address()
 
@@ -51,3 +55,52 @@ def test_direct_transfer_out_of_bounds_values():
 def test_amount_out_of_bounds(amount, make):
     with pytest.raises(ValueError):
         make(amount=amount)
+
+
+def test_processed_batch_roundtrip():
+    identifiers = [1, 2, 3, UINT64_MAX - 1]
+    processed_batch = ProcessedBatch(ADDRESS, identifiers)
+
+    data = processed_batch.encode()
+    assert len(data) == messages.ProcessedBatch.size + len(identifiers) * 8
+
+    decoded = decode(data)
+    assert isinstance(decoded, ProcessedBatch)
+    assert decoded.sender == ADDRESS
+    assert decoded.processed_message_identifiers == identifiers
+    assert decoded == processed_batch
+    assert decoded != ProcessedBatch(ADDRESS, identifiers[:-1])
+
+    with pytest.raises(InvalidProtocolMessage):
+        decode(data[:-1])
+
+    with pytest.raises(ValueError):
+        ProcessedBatch(ADDRESS, range(ProcessedBatch.max_identifiers + 1))
+
+    full_batch = ProcessedBatch(ADDRESS, range(ProcessedBatch.max_identifiers))
+    assert len(full_batch.encode()) <= UDP_MAX_MESSAGE_SIZE
+
+
+def test_signed_message_memoizes_the_encoding():
+    transfer = make_direct_transfer()
+    transfer.sign(PRIVKEY, ADDRESS)
+
+    data = transfer.encode()
+    assert transfer.encode() is data
+    assert data == Message.encode(transfer)
+    assert transfer.hash == sha3(data)
+    assert transfer.message_hash == sha3(data[:-65])
+
+    decoded = decode(data)
+    assert decoded.message_hash == transfer.message_hash
+    assert decoded.encode() == data
+    assert decoded == transfer
+
+    # changing a field invalidates the memoized values
+    message_hash = transfer.message_hash
+    transfer.nonce += 1
+    assert transfer.encode() != data
+    assert transfer.encode() == Message.encode(transfer)
+    assert transfer.message_hash != message_hash
+    assert transfer.hash == sha3(transfer.encode())
+    assert transfer != decoded
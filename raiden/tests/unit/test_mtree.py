@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import pickle
+from copy import deepcopy
+
 import pytest
 
 from raiden.exceptions import HashLengthNot32
@@ -7,11 +10,14 @@ from raiden.transfer.state import EMPTY_MERKLE_ROOT
 from raiden.transfer.merkle_tree import (
     MERKLEROOT,
     compute_layers,
+    compute_layers_with,
+    compute_layers_without,
     compute_merkleproof_for,
+    compute_merkleproofs_for,
     validate_proof,
     merkleroot,
 )
-from raiden.transfer.state import MerkleTreeState
+from raiden.transfer.state import EMPTY_MERKLE_TREE, MerkleTreeState
 
 
 def sort_join(first, second):
@@ -47,6 +53,24 @@ def test_compute_layers_duplicated():
         compute_layers([hash_0, hash_1, hash_0])
 
 
+def test_compute_layers_with_duplicated():
+    hash_0 = sha3(b'x')
+    layers = compute_layers_with(EMPTY_MERKLE_TREE.layers, hash_0)
+
+    with pytest.raises(ValueError):
+        compute_layers_with(layers, hash_0)
+
+    with pytest.raises(HashLengthNot32):
+        compute_layers_with(layers, b'not32bytes')
+
+
+def test_compute_layers_without_unknown():
+    layers = compute_layers([sha3(b'x'), sha3(b'y')])
+
+    with pytest.raises(ValueError):
+        compute_layers_without(layers, sha3(b'z'))
+
+
 def test_compute_layers_single_entry():
     hash_0 = sha3(b'x')
     layers = compute_layers([hash_0])
@@ -144,3 +168,42 @@ def test_many(tree_up_to=10):
 
         reversed_tree = MerkleTreeState(compute_layers(reversed(leaves)))
         assert root == merkleroot(reversed_tree)
+
+
+def test_many_incremental(tree_up_to=10):
+    leaves = [
+        sha3(str(value).encode())
+        for value in range(tree_up_to)
+    ]
+
+    layers = EMPTY_MERKLE_TREE.layers
+    for number_of_leaves, value in enumerate(leaves, start=1):
+        layers = compute_layers_with(layers, value)
+        assert layers == compute_layers(leaves[:number_of_leaves])
+
+    for number_of_leaves, value in enumerate(leaves[:-1], start=1):
+        layers = compute_layers_without(layers, value)
+        assert layers == compute_layers(leaves[number_of_leaves:])
+
+
+def test_compute_merkleproofs_for():
+    leaves = [
+        sha3(str(value).encode())
+        for value in range(7)
+    ]
+    tree = MerkleTreeState(compute_layers(leaves))
+    root = merkleroot(tree)
+
+    proofs = compute_merkleproofs_for(tree, leaves)
+    for value, proof in zip(leaves, proofs):
+        assert proof == compute_merkleproof_for(tree, value)
+        assert validate_proof(proof, root, value)
+
+    with pytest.raises(ValueError):
+        compute_merkleproofs_for(tree, [leaves[0], sha3(b'unknown')])
+
+    # the leaf index is derived data, it is not copied
+    assert tree.leaves_to_index
+    assert deepcopy(tree).leaves_to_index is None
+    assert pickle.loads(pickle.dumps(tree)).leaves_to_index is None
+    assert deepcopy(tree) == tree
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import random
+
 import pytest
 
-from raiden.encoding.format import Field, namedbuffer
+from raiden.encoding import messages
+from raiden.encoding.format import Field, Pad, buffer_for, namedbuffer
 from raiden.encoding.encoders import integer
 
 # pylint: disable=invalid-name
@@ -66,3 +69,72 @@ def test_namedbuffer_does_not_expose_internals():
 def test_namedbuffer_type_exposes_details():
     assert SingleByte.format == '>B'
     assert SingleByte.fields_spec == [byte]
+
+
+def random_values(klass):
+    values = dict()
+    for field in klass.fields_spec:
+        if isinstance(field, Pad):
+            continue
+
+        if field.name == 'cmdid':
+            values['cmdid'] = field.encoder.minimum
+        elif isinstance(field.encoder, integer):
+            values[field.name] = random.randint(0, field.encoder.maximum)
+        else:
+            values[field.name] = bytes(random.getrandbits(8) for _ in range(field.size_bytes))
+
+    return values
+
+
+@pytest.mark.parametrize('klass', list(messages.CMDID_MESSAGE.values()) + [messages.Lock])
+def test_codec_is_compatible_with_the_fields(klass):
+    for _ in range(10):
+        values = random_values(klass)
+
+        packed = klass(buffer_for(klass))
+        for name, value in values.items():
+            setattr(packed, name, value)
+
+        data = klass.pack_values(values)
+        assert data == bytes(packed.data)
+        assert klass.from_values(values).data == packed.data
+
+        unpacked = klass.unpack_values(data)
+        assert unpacked._asdict() == values
+        for name, value in values.items():
+            assert getattr(klass(data), name) == value
+
+
+def test_codec_padding_and_validation():
+    Padded = namedbuffer('Padded', [
+        Field('short', 8, '8s', None),
+        Field('number', 8, '8s', integer(0, 2 ** 64 - 1)),
+        Field('limited', 2, '2s', integer(0, 10)),
+    ])
+
+    # short values are left padded as by the fields
+    packed = Padded(buffer_for(Padded))
+    packed.short = b'ab'
+    packed.number = 3
+    packed.limited = 5
+    values = {'short': b'ab', 'number': 3, 'limited': 5}
+    assert Padded.pack_values(values) == bytes(packed.data)
+
+    # missing values are zeroed
+    assert Padded.pack_values(dict()) == bytes(Padded.size)
+
+    with pytest.raises(ValueError):
+        Padded.pack_values({'short': b'x' * 9})
+
+    with pytest.raises(ValueError):
+        Padded.pack_values({'number': 2 ** 64})
+
+    with pytest.raises(ValueError):
+        Padded.pack_values({'number': -1})
+
+    with pytest.raises(ValueError):
+        Padded.pack_values({'number': b'1'})
+
+    with pytest.raises(ValueError):
+        Padded.pack_values({'limited': 11})
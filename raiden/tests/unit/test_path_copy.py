@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import random
+from copy import deepcopy
+
+from raiden.tests.utils import factories
+from raiden.transfer import deadlines, node
+from raiden.transfer.architecture import StateManager
+from raiden.transfer.events import ContractSendChannelSettle
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.state import (
+    PaymentNetworkState,
+    TokenNetworkGraphState,
+    TokenNetworkState,
+)
+from raiden.transfer.state_change import (
+    ActionInitNode,
+    Block,
+    ContractReceiveChannelClosed,
+    ContractReceiveChannelSettled,
+    ContractReceiveNewPaymentNetwork,
+)
+
+
+def make_node_state_changes(number_of_channels):
+    """ Returns the state changes to create a node with a single token network
+    of `number_of_channels` channels, close the first channel and wait for the
+    settlement period to expire.
+    """
+    payment_network_identifier = factories.make_address()
+    token_network_identifier = factories.make_address()
+    token_address = factories.make_address()
+    our_address = factories.make_address()
+
+    channels = [
+        factories.make_channel(
+            our_balance=10,
+            partner_balance=10,
+            our_address=our_address,
+            token_address=token_address,
+        )
+        for _ in range(number_of_channels)
+    ]
+
+    graph = ChannelGraph([
+        (our_address, channel_state.partner_state.address)
+        for channel_state in channels
+    ])
+    token_network = TokenNetworkState(
+        token_network_identifier,
+        token_address,
+        TokenNetworkGraphState(graph),
+        channels,
+    )
+    payment_network = PaymentNetworkState(
+        payment_network_identifier,
+        [token_network],
+    )
+
+    closed_channel = channels[0]
+    closed_block_number = 2
+    settlement_block_number = closed_block_number + closed_channel.settle_timeout + 1
+
+    state_changes = [
+        ActionInitNode(random.Random(42), 1),
+        ContractReceiveNewPaymentNetwork(payment_network),
+        ContractReceiveChannelClosed(
+            payment_network_identifier,
+            token_address,
+            closed_channel.identifier,
+            closed_channel.partner_state.address,
+            closed_block_number,
+        ),
+        Block(settlement_block_number),
+    ]
+
+    return payment_network_identifier, token_address, state_changes
+
+
+def get_channels(node_state, payment_network_identifier, token_address):
+    token_network_state = node.get_token_network(
+        node_state,
+        payment_network_identifier,
+        token_address,
+    )
+
+    if token_network_state is None:
+        return dict()
+
+    return token_network_state.channelidentifiers_to_channels
+
+
+def test_state_transition_does_not_modify_previous_state():
+    payment_network_identifier, token_address, state_changes = make_node_state_changes(5)
+
+    node_state = None
+    for state_change in state_changes:
+        previous_state = node_state
+        previous_copy = deepcopy(previous_state)
+
+        iteration = node.state_transition(previous_state, state_change)
+        node_state = iteration.new_state
+
+        if previous_state is not None:
+            assert node_state is not previous_state
+            assert get_channels(
+                previous_state,
+                payment_network_identifier,
+                token_address,
+            ) == get_channels(
+                previous_copy,
+                payment_network_identifier,
+                token_address,
+            )
+            assert previous_state.block_number == previous_copy.block_number
+
+    assert any(isinstance(event, ContractSendChannelSettle) for event in iteration.events)
+    assert previous_state.block_number != node_state.block_number
+
+    previous_channels = get_channels(previous_state, payment_network_identifier, token_address)
+    new_channels = get_channels(node_state, payment_network_identifier, token_address)
+
+    # only the closed channel had to be updated by the Block
+    copied = [
+        channel_identifier
+        for channel_identifier, channel_state in new_channels.items()
+        if previous_channels[channel_identifier] is not channel_state
+    ]
+    assert len(copied) == 1
+    assert new_channels[copied[0]].settle_transaction is not None
+    assert previous_channels[copied[0]].settle_transaction is None
+
+
+def test_copy_on_write_matches_deepcopy():
+    payment_network_identifier, token_address, state_changes = make_node_state_changes(5)
+
+    deepcopy_manager = StateManager(node.state_transition, None)
+    copy_on_write_manager = StateManager(node.state_transition, None, copy_on_write=True)
+
+    for state_change in state_changes:
+        deepcopy_events = deepcopy_manager.dispatch(state_change)
+        copy_on_write_events = copy_on_write_manager.dispatch(state_change)
+
+        assert deepcopy_events == copy_on_write_events
+
+    deepcopy_state = deepcopy_manager.current_state
+    copy_on_write_state = copy_on_write_manager.current_state
+
+    assert deepcopy_state.block_number == copy_on_write_state.block_number
+    assert deepcopy_state.payment_mapping == copy_on_write_state.payment_mapping
+    assert deepcopy_state.queueids_to_queues == copy_on_write_state.queueids_to_queues
+    assert get_channels(
+        deepcopy_state,
+        payment_network_identifier,
+        token_address,
+    ) == get_channels(
+        copy_on_write_state,
+        payment_network_identifier,
+        token_address,
+    )
+
+
+def test_block_is_dispatched_to_due_channels_only():
+    payment_network_identifier, token_address, state_changes = make_node_state_changes(5)
+    init_node, new_payment_network, channel_closed, settlement_block = state_changes
+
+    node_state = None
+    for state_change in (init_node, new_payment_network, Block(2), channel_closed):
+        node_state = node.state_transition(node_state, state_change).new_state
+
+    closed_key = deadlines.channel_key(
+        payment_network_identifier,
+        token_address,
+        channel_closed.channel_identifier,
+    )
+    assert node_state.block_deadlines.scheduled == {
+        closed_key: settlement_block.block_number,
+    }
+
+    # a block before the deadline doesn't copy any channel
+    iteration = node.state_transition(node_state, Block(settlement_block.block_number - 1))
+    assert not iteration.events
+    assert get_channels(
+        iteration.new_state,
+        payment_network_identifier,
+        token_address,
+    ) is get_channels(node_state, payment_network_identifier, token_address)
+
+    iteration = node.state_transition(iteration.new_state, settlement_block)
+    assert iteration.events == [ContractSendChannelSettle(channel_closed.channel_identifier)]
+    assert iteration.new_state.block_deadlines.scheduled == dict()
+
+
+def test_block_deadlines_are_rebuilt():
+    _, _, state_changes = make_node_state_changes(5)
+    *other_state_changes, settlement_block = state_changes
+
+    node_state = None
+    for state_change in other_state_changes:
+        node_state = node.state_transition(node_state, state_change).new_state
+
+    # e.g. restored from a snapshot without the index
+    node_state.block_deadlines = None
+    iteration = node.state_transition(node_state, settlement_block)
+
+    channel_closed = other_state_changes[2]
+    assert iteration.events == [ContractSendChannelSettle(channel_closed.channel_identifier)]
+
+
+def test_block_deadlines_are_shared_by_the_new_states():
+    _, _, state_changes = make_node_state_changes(5)
+    *other_state_changes, settlement_block = state_changes
+
+    node_state = None
+    for state_change in other_state_changes:
+        node_state = node.state_transition(node_state, state_change).new_state
+
+    # the first block builds the index
+    node_state = node.state_transition(
+        node_state,
+        Block(settlement_block.block_number - 2),
+    ).new_state
+    block_deadlines = node_state.block_deadlines
+    assert block_deadlines.owner is node_state
+
+    # the index is updated in place instead of being copied
+    iteration = node.state_transition(node_state, Block(settlement_block.block_number - 1))
+    assert iteration.new_state.block_deadlines is block_deadlines
+    assert block_deadlines.owner is iteration.new_state
+
+    # the index is ahead of the previous state, it is rebuilt for it
+    channel_closed = other_state_changes[2]
+    settled = node.state_transition(iteration.new_state, settlement_block)
+    assert settled.events == [ContractSendChannelSettle(channel_closed.channel_identifier)]
+
+    replayed = node.state_transition(iteration.new_state, settlement_block)
+    assert replayed.events == settled.events
+    assert replayed.new_state.block_deadlines is not block_deadlines
+
+    # a copy of the state doesn't carry the index
+    assert deepcopy(replayed.new_state).block_deadlines.owner is None
+
+
+def test_settled_channel_is_removed_from_the_graph():
+    payment_network_identifier, token_address, state_changes = make_node_state_changes(3)
+
+    node_state = None
+    for state_change in state_changes:
+        node_state = node.state_transition(node_state, state_change).new_state
+
+    token_network_state = node.get_token_network(
+        node_state,
+        payment_network_identifier,
+        token_address,
+    )
+    closed_channel = next(
+        channel_state
+        for channel_state in token_network_state.channelidentifiers_to_channels.values()
+        if channel_state.close_transaction
+    )
+    our_address = closed_channel.our_state.address
+    partner_address = closed_channel.partner_state.address
+
+    settled = ContractReceiveChannelSettled(
+        payment_network_identifier,
+        token_address,
+        closed_channel.identifier,
+        node_state.block_number,
+    )
+    new_state = node.state_transition(node_state, settled).new_state
+
+    new_token_network_state = node.get_token_network(
+        new_state,
+        payment_network_identifier,
+        token_address,
+    )
+    assert not new_token_network_state.network_graph.network.has_edge(
+        our_address,
+        partner_address,
+    )
+    assert new_token_network_state.network_graph.network.number_of_edges() == 2
+
+    # the previous state is not modified
+    assert token_network_state.network_graph.network.has_edge(our_address, partner_address)
@@ -0,0 +1,725 @@
+# -*- coding: utf-8 -*-
+import gevent
+
+from raiden.exceptions import UnknownAddress
+from raiden.messages import Ping, Processed, ProcessedBatch
+from raiden.network.cache import MessageCache
+from raiden.network.protocol import RaidenProtocol, messageid_from_data
+from raiden.network.rtt import RTTEstimator
+from raiden.network.scheduler import RetryScheduler
+from raiden.tests.utils import factories
+from raiden.tests.utils.messages import make_direct_transfer
+from raiden.tests.utils.transport import LossyTransport
+from raiden.transfer.state import (
+    NODE_NETWORK_REACHABLE,
+    NODE_NETWORK_UNKNOWN,
+    NODE_NETWORK_UNREACHABLE,
+)
+
+
+class Task:
+    def __init__(self, name):
+        self.name = name
+        self.deadline = None
+
+    def fire(self):
+        pass
+
+
+class ServerMock:
+    started = True
+
+
+class SentTransport:
+    """ Records the sent packets instead of sending them. """
+
+    def __init__(self):
+        self.server = ServerMock()
+        self.sent = list()
+
+    def send(self, sender, host_port, bytes_):  # pylint: disable=unused-argument
+        self.sent.append(bytes_)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stop_accepting(self):
+        pass
+
+
+class Discovery:
+    def __init__(self):
+        self.nodeid_to_hostport = dict()
+
+    def get(self, node_address):
+        try:
+            return self.nodeid_to_hostport[node_address]
+        except KeyError:
+            raise UnknownAddress('Unknown address {}'.format(node_address))
+
+
+class Raiden:
+    def __init__(self):
+        self.private_key, self.address = factories.make_privkey_address()
+        self.state_changes = list()
+
+    def sign(self, message):
+        message.sign(self.private_key, self.address)
+
+    def get_block_number(self):  # pylint: disable=no-self-use
+        return 1
+
+    def get_partner_next_nonce(  # pylint: disable=no-self-use,unused-argument
+            self,
+            partner,
+            channel):
+        return None
+
+    def handle_state_change(self, state_change):
+        self.state_changes.append(state_change)
+
+
+def make_protocol(
+        retry_interval=0.01,
+        nat_keepalive_retries=2,
+        nat_keepalive_timeout=0.05,
+        **kwargs):
+    discovery = Discovery()
+    protocol = RaidenProtocol(
+        SentTransport(),
+        discovery,
+        Raiden(),
+        retry_interval=retry_interval,
+        retries_before_backoff=5,
+        nat_keepalive_retries=nat_keepalive_retries,
+        nat_keepalive_timeout=nat_keepalive_timeout,
+        nat_invitation_timeout=nat_keepalive_timeout,
+        **kwargs
+    )
+    return protocol, discovery
+
+
+def acknowledge(protocol, data, receiver_address):
+    message_id = messageid_from_data(data, receiver_address)
+    protocol.receive_processed(Processed(receiver_address, message_id))
+
+
+def keep_acknowledging_pings(protocol, node_address):
+    node_health = protocol.get_node_health(node_address)
+    while True:
+        if node_health.ping_data is not None:
+            acknowledge(protocol, node_health.ping_data, node_address)
+        gevent.sleep(0.01)
+
+
+def network_states(protocol, node_address):
+    return [
+        state_change.network_state
+        for state_change in protocol.raiden.state_changes
+        if state_change.node_address == node_address
+    ]
+
+
+def test_retry_scheduler_deadline_order():
+    now = [0]
+    scheduler = RetryScheduler(clock=lambda: now[0])
+
+    first, second, third = Task('first'), Task('second'), Task('third')
+    scheduler.schedule(third, 3)
+    scheduler.schedule(second, 2)
+    scheduler.schedule(first, 5)
+    assert len(scheduler) == 3
+
+    # rescheduling replaces the deadline
+    scheduler.schedule(first, 1)
+    assert len(scheduler) == 3
+    assert scheduler.next_timeout(0) == 1
+
+    scheduler.cancel(third)
+    scheduler.cancel(third)
+    assert len(scheduler) == 2
+
+    now[0] = 10
+    assert scheduler.pop_due(10) is first
+    assert scheduler.pop_due(10) is second
+    assert scheduler.pop_due(10) is None
+    assert scheduler.next_timeout(10) is None
+    assert len(scheduler) == 0
+
+
+def test_retry_scheduler_stale_entries_are_compacted():
+    scheduler = RetryScheduler(clock=lambda: 0)
+    task = Task('task')
+
+    for delay in range(1000, 0, -1):
+        scheduler.schedule(task, delay)
+
+    assert len(scheduler) == 1
+    assert len(scheduler.heap) < 100
+    assert scheduler.pop_due(1) is task
+
+
+def test_channel_queue_is_processed_in_order():
+    protocol, discovery = make_protocol()
+    partner = factories.make_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    messages = [b'first', b'second', b'third']
+    queue = protocol.get_channel_queue(partner, factories.UNIT_TOKEN_ADDRESS)
+    for data in messages:
+        queue.put(data)
+
+    protocol.start()
+    gevent.sleep(0.05)
+
+    sent_messages = [data for data in protocol.transport.sent if data in messages]
+    assert len(sent_messages) > 1, 'the head of the queue must be retransmitted'
+
+    processed_count = 0
+    for position, data in enumerate(messages):
+        sent_messages = [data for data in protocol.transport.sent if data in messages]
+
+        # only the head of the queue is sent
+        assert set(sent_messages[processed_count:]) == {data}
+        processed_count = len(sent_messages)
+
+        acknowledge(protocol, data, partner)
+        gevent.sleep(0.02)
+        assert queue.copy() == messages[position + 1:]
+
+    protocol.stop_and_wait()
+
+
+def test_unreachable_node_stops_its_queues():
+    protocol, discovery = make_protocol()
+    partner = factories.make_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    queue = protocol.get_channel_queue(partner, factories.UNIT_TOKEN_ADDRESS)
+    queue.put(b'message')
+
+    protocol.start()
+    gevent.sleep(0.3)
+
+    # the pings were not acknowledged
+    assert network_states(protocol, partner) == [
+        NODE_NETWORK_UNKNOWN,
+        NODE_NETWORK_UNREACHABLE,
+    ]
+    node_health = protocol.get_node_health(partner)
+    assert not node_health.healthy
+
+    sent_count = protocol.transport.sent.count(b'message')
+    gevent.sleep(0.1)
+    assert protocol.transport.sent.count(b'message') == sent_count
+
+    # the node answers the ping, the queue is resumed after a random delay of
+    # up to a second
+    acknowledge(protocol, node_health.ping_data, partner)
+    acknowledge_pings = gevent.spawn(keep_acknowledging_pings, protocol, partner)
+    gevent.sleep(1.1)
+
+    assert network_states(protocol, partner)[2:] == [NODE_NETWORK_REACHABLE]
+    assert protocol.transport.sent.count(b'message') > sent_count
+
+    acknowledge(protocol, b'message', partner)
+    gevent.sleep(0.01)
+    assert not queue
+
+    acknowledge_pings.kill()
+
+    protocol.stop_and_wait()
+
+
+def test_health_check_waits_for_the_endpoint():
+    protocol, discovery = make_protocol()
+    partner = factories.make_address()
+
+    queue = protocol.get_channel_queue(partner, factories.UNIT_TOKEN_ADDRESS)
+    queue.put(b'message')
+
+    protocol.start()
+    gevent.sleep(0.1)
+    assert not protocol.transport.sent
+
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+    gevent.sleep(0.2)
+    assert b'message' in protocol.transport.sent
+
+    protocol.stop_and_wait()
+    assert protocol.scheduler.greenlet.dead
+
+
+def test_message_cache_expiration():
+    now = [0]
+    cache = MessageCache(maxsize=3, ttl=10, ttl_blocks=5, clock=lambda: now[0])
+
+    cache.add(1, 'one', block_number=1)
+    now[0] = 5
+    cache.add(2, 'two', block_number=4)
+    assert cache.get(1) == 'one'
+    assert cache.get(3) is None
+
+    # expired by time
+    now[0] = 10
+    cache.expire(block_number=4)
+    assert 1 not in cache
+    assert 2 in cache
+
+    # expired by block number
+    cache.expire(block_number=9)
+    assert 2 not in cache
+
+    # bounded size, the oldest entries are evicted
+    for message_id in range(10, 15):
+        cache.add(message_id, message_id, block_number=9)
+    assert len(cache) == 3
+    assert 14 in cache and 11 not in cache
+
+    assert cache.stats() == {
+        'size': 3,
+        'hits': 1,
+        'misses': 1,
+        'evictions': 4,
+    }
+
+
+def test_message_cache_pinned_entries_expire_after_release():
+    now = [0]
+    cache = MessageCache(maxsize=1, ttl=10, clock=lambda: now[0])
+
+    cache.add(1, 'pending', block_number=1, pin=True)
+    cache.add(2, 'two', block_number=1)
+    cache.add(3, 'three', block_number=1)
+
+    now[0] = 100
+    cache.expire(block_number=1)
+    assert cache.get(1) == 'pending'
+    assert 3 not in cache
+
+    cache.release(1, block_number=1)
+    assert 1 in cache
+
+    now[0] = 110
+    cache.expire(block_number=1)
+    assert 1 not in cache
+
+
+def test_message_cache_balance_proofs_are_superseded():
+    now = [0]
+    cache = MessageCache(maxsize=1, ttl=10, clock=lambda: now[0])
+    channel_key = (b'sender', b'token', b'channel')
+    other_channel_key = (b'sender', b'', b'channel')
+
+    cache.add(1, 'nonce 1', block_number=1, balance_proof=(channel_key, 1))
+    cache.add(2, 'secret nonce 2', block_number=1, balance_proof=(other_channel_key, 2))
+
+    # balance proofs are not evicted by age, the partner may still be
+    # retransmitting them
+    now[0] = 100
+    cache.add(3, 'three', block_number=1)
+    cache.add(4, 'four', block_number=1)
+    assert 1 in cache and 2 in cache
+
+    cache.add(5, 'nonce 3', block_number=1, balance_proof=(channel_key, 3))
+    assert 1 not in cache
+    assert 2 in cache
+    assert 5 in cache
+
+
+def test_duplicate_message_is_answered_from_the_cache():
+    protocol, discovery = make_protocol()
+    partner_key, partner = factories.make_privkey_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    ping = Ping(nonce=1)
+    ping.sign(partner_key, partner)
+    data = ping.encode()
+
+    protocol.receive(data)
+    protocol.receive(data)
+
+    message_id = messageid_from_data(data, protocol.raiden.address)
+    processed_data = Processed(protocol.raiden.address, message_id).encode()
+    assert protocol.transport.sent == [processed_data, processed_data]
+
+    stats = protocol.get_message_cache_stats()['processed']
+    assert stats['size'] == 1
+    assert stats['hits'] == 1
+
+
+def test_processed_messages_are_batched():
+    protocol, discovery = make_protocol()
+    protocol.processed_batch_delay = 0.05
+    partner_key, partner = factories.make_privkey_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    protocol.start()
+
+    message_ids = list()
+    for nonce in range(3):
+        ping = Ping(nonce=nonce)
+        ping.sign(partner_key, partner)
+        data = ping.encode()
+
+        protocol.receive(data)
+        message_ids.append(messageid_from_data(data, protocol.raiden.address))
+
+    # a retransmission doesn't duplicate the id
+    protocol.receive(data)
+    assert not protocol.transport.sent
+
+    gevent.sleep(0.1)
+    assert protocol.transport.sent == [
+        ProcessedBatch(protocol.raiden.address, message_ids).encode(),
+    ]
+
+    protocol.stop_and_wait()
+
+
+def test_processed_batch_resolves_all_messages():
+    protocol, discovery = make_protocol()
+    partner = factories.make_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    messages = [b'first', b'second']
+    async_results = [
+        protocol.send_raw_with_result(data, partner)
+        for data in messages
+    ]
+    message_ids = [messageid_from_data(data, partner) for data in messages]
+
+    processed_batch = ProcessedBatch(partner, message_ids)
+    protocol.receive(processed_batch.encode())
+
+    assert all(async_result.get(block=False) for async_result in async_results)
+
+
+def test_recovery_pipeline_keeps_the_arrival_order():
+    protocol, discovery = make_protocol(
+        signature_recovery_workers=2,
+        signature_recovery_max_pending=20,
+    )
+
+    partners = [factories.make_privkey_address() for _ in range(3)]
+    for _, partner in partners:
+        discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    protocol.start()
+
+    received = list()
+    for nonce in range(10):
+        partner_key, partner = partners[nonce % len(partners)]
+        ping = Ping(nonce=nonce)
+        ping.sign(partner_key, partner)
+        data = ping.encode()
+
+        protocol.receive(data)
+        received.append(data)
+
+    # a retransmission queued before the first copy is handled is answered
+    # from the cache
+    protocol.receive(received[-1])
+
+    gevent.sleep(0.1)
+    assert not protocol.recovery_pipeline
+
+    processed = [
+        Processed(protocol.raiden.address, messageid_from_data(data, protocol.raiden.address))
+        for data in received
+    ]
+    expected = [message.encode() for message in processed]
+    expected.append(expected[-1])
+    assert protocol.transport.sent == expected
+
+    protocol.stop_and_wait()
+
+
+def test_recovery_pipeline_drops_datagrams_when_full():
+    protocol, discovery = make_protocol(
+        signature_recovery_workers=2,
+        signature_recovery_max_pending=3,
+    )
+
+    partner_key, partner = factories.make_privkey_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+    protocol.start()
+
+    pings = list()
+    for nonce in range(5):
+        ping = Ping(nonce=nonce)
+        ping.sign(partner_key, partner)
+        pings.append(ping.encode())
+
+    # the pipeline is drained by its greenlet, which doesn't run until the
+    # receiving greenlet yields
+    for data in pings:
+        protocol.receive(data)
+
+    assert len(protocol.recovery_pipeline) == 3
+    assert protocol.recovery_pipeline.dropped == 2
+
+    gevent.sleep(0.1)
+    assert len(protocol.transport.sent) == 3
+
+    # the retransmissions of the dropped datagrams are handled
+    for data in pings[3:]:
+        protocol.receive(data)
+
+    gevent.sleep(0.1)
+    assert len(protocol.transport.sent) == 5
+
+    protocol.stop_and_wait()
+
+
+def test_rtt_estimator():
+    rtt = RTTEstimator(initial=1, minimum=0.1, maximum=10)
+    assert rtt.timeout(0) == 1
+
+    rtt.update(0.2)
+    assert rtt.srtt == 0.2
+    assert rtt.rto == 0.2 + 4 * 0.1
+
+    for _ in range(100):
+        rtt.update(0.02)
+    assert abs(rtt.srtt - 0.02) < 0.001
+    assert rtt.rto == 0.1
+
+    # the timeout doubles for every retransmission, up to the maximum
+    assert rtt.timeout(1) == 0.2
+    assert rtt.timeout(1000) == 10
+
+
+def transfer_over_lossy_network(
+        adaptive,
+        latency,
+        droprate,
+        retry_interval,
+        count=10):
+    """ Sends `count` messages from one protocol to another one and returns
+    the number of packets sent.
+
+    The losses are deterministic, the times are compared by the
+    speed_retransmission benchmark.
+    """
+    protocols = list()
+    for port in (1, 2):
+        raiden = Raiden()
+        transport = LossyTransport('127.0.0.1', port)
+        transport.latency = latency
+        transport.droprate = droprate
+
+        protocol = RaidenProtocol(
+            transport,
+            Discovery(),
+            raiden,
+            retry_interval=retry_interval,
+            retries_before_backoff=5,
+            nat_keepalive_retries=100,
+            nat_keepalive_timeout=10,
+            nat_invitation_timeout=10,
+            adaptive_retry_timeout=adaptive,
+        )
+        transport.protocol = protocol
+        protocols.append(protocol)
+
+    sender, receiver = protocols
+    sender.discovery.nodeid_to_hostport[receiver.raiden.address] = ('127.0.0.1', 2)
+    receiver.discovery.nodeid_to_hostport[sender.raiden.address] = ('127.0.0.1', 1)
+
+    queue = sender.get_channel_queue(receiver.raiden.address, factories.UNIT_TOKEN_ADDRESS)
+    for nonce in range(count):
+        ping = Ping(nonce=nonce)
+        sender.raiden.sign(ping)
+        queue.put(ping.encode())
+
+    for protocol in protocols:
+        protocol.start()
+
+    with gevent.Timeout(10):
+        while queue:
+            gevent.sleep(0.001)
+
+    for protocol in protocols:
+        protocol.stop_and_wait()
+
+    return len(sender.transport.sent)
+
+
+def test_adaptive_timeout_retransmits_only_the_losses():
+    """ A fast partner with losses, the adaptive timeout is much shorter than
+    the retry interval and still doesn't retransmit the messages in flight.
+    """
+    fixed_sent = transfer_over_lossy_network(
+        adaptive=False,
+        latency=0.001,
+        droprate=4,
+        retry_interval=0.2,
+    )
+    adaptive_sent = transfer_over_lossy_network(
+        adaptive=True,
+        latency=0.001,
+        droprate=4,
+        retry_interval=0.2,
+    )
+
+    assert adaptive_sent == fixed_sent
+
+
+def test_adaptive_timeout_avoids_spurious_retransmissions():
+    """ A slow partner without losses, the fixed retry interval is shorter than
+    the RTT and the messages are retransmitted while in flight.
+    """
+    fixed_sent = transfer_over_lossy_network(
+        adaptive=False,
+        latency=0.03,
+        droprate=0,
+        retry_interval=0.02,
+    )
+    adaptive_sent = transfer_over_lossy_network(
+        adaptive=True,
+        latency=0.03,
+        droprate=0,
+        retry_interval=0.02,
+    )
+
+    assert adaptive_sent < fixed_sent / 2
+
+
+def test_queue_window_keeps_many_messages_in_flight():
+    protocol, discovery = make_protocol(queue_window=2)
+    partner = factories.make_address()
+    discovery.nodeid_to_hostport[partner] = ('127.0.0.1', 1)
+
+    messages = [b'first', b'second', b'third']
+    queue = protocol.get_channel_queue(partner, factories.UNIT_TOKEN_ADDRESS)
+    for data in messages:
+        queue.put(data)
+
+    protocol.start()
+    gevent.sleep(0.05)
+
+    sent_messages = {data for data in protocol.transport.sent if data in messages}
+    assert sent_messages == {b'first', b'second'}
+
+    # the window moves forward once the head is acknowledged
+    acknowledge(protocol, b'first', partner)
+    gevent.sleep(0.02)
+    assert queue.copy() == [b'second', b'third']
+    assert b'third' in protocol.transport.sent
+
+    # the Processed of a message may be lost while the next one's arrives
+    acknowledge(protocol, b'third', partner)
+    gevent.sleep(0.02)
+    assert queue.copy() == [b'second']
+
+    acknowledge(protocol, b'second', partner)
+    gevent.sleep(0.02)
+    assert not queue
+
+    protocol.stop_and_wait()
+
+
+def test_out_of_order_balance_proofs_are_held(monkeypatch):
+    protocol, _ = make_protocol()
+    sender_key, sender = factories.make_privkey_address()
+    channel_address = factories.make_address()
+
+    handled = list()
+    next_nonce = {channel_address: 1}
+
+    def on_udp_message(raiden, message):  # pylint: disable=unused-argument
+        # like the state machine, stale balance proofs are ignored
+        if message.nonce == next_nonce[message.channel]:
+            handled.append(message.nonce)
+            next_nonce[message.channel] += 1
+        else:
+            assert message.nonce < next_nonce[message.channel], 'nonce out of order'
+
+    monkeypatch.setattr('raiden.network.protocol.on_udp_message', on_udp_message)
+
+    def get_partner_next_nonce(partner, channel):
+        if partner != sender:
+            return None
+        return next_nonce.get(channel)
+
+    monkeypatch.setattr(protocol.raiden, 'get_partner_next_nonce', get_partner_next_nonce)
+
+    transfers = dict()
+    for nonce in range(1, 5):
+        transfer = make_direct_transfer(
+            nonce=nonce,
+            channel=channel_address,
+            transferred_amount=nonce,
+        )
+        transfer.sign(sender_key, sender)
+        transfers[nonce] = transfer
+
+    def receive(nonce):
+        transfer = transfers[nonce]
+        message_id = messageid_from_data(transfer.encode(), sender)
+        protocol.receive_message(transfer, message_id)
+        return message_id
+
+    held_ids = [receive(3), receive(4)]
+    assert not handled
+    for message_id in held_ids:
+        assert message_id not in protocol.messageids_to_processedmessages, (
+            'held messages must not be acknowledged'
+        )
+
+    receive(1)
+    assert handled == [1]
+
+    # a retransmission of a handled message is not held
+    receive(1)
+    assert handled == [1]
+
+    receive(2)
+    assert handled == [1, 2, 3, 4]
+    assert held_ids[-1] in protocol.messageids_to_processedmessages
+    assert not protocol.channels_to_held_envelopes
+    assert protocol.held_envelopes == 0
+
+
+def test_only_the_partner_balance_proofs_are_held(monkeypatch):
+    protocol, _ = make_protocol()
+    partner_key, partner = factories.make_privkey_address()
+    other_key, other = factories.make_privkey_address()
+    channel_address = factories.make_address()
+
+    handled = list()
+    monkeypatch.setattr(
+        'raiden.network.protocol.on_udp_message',
+        lambda raiden, message: handled.append(message.nonce),
+    )
+    monkeypatch.setattr(
+        protocol.raiden,
+        'get_partner_next_nonce',
+        lambda sender, channel: 1 if sender == partner else None,
+    )
+    monkeypatch.setattr('raiden.network.protocol.MAX_HELD_ENVELOPES_TOTAL', 2)
+
+    def receive(key, address, nonce):
+        transfer = make_direct_transfer(
+            nonce=nonce,
+            channel=channel_address,
+            transferred_amount=nonce,
+        )
+        transfer.sign(key, address)
+        protocol.receive_message(transfer, messageid_from_data(transfer.encode(), address))
+
+    # the state machine rejects them
+    receive(other_key, other, 3)
+    assert handled == [3]
+    assert not protocol.channels_to_held_envelopes
+
+    # the ones beyond the limit are dropped
+    for nonce in (3, 4, 5, 3):
+        receive(partner_key, partner, nonce)
+    assert handled == [3]
+    assert sorted(protocol.channels_to_held_envelopes[(partner, channel_address)]) == [3, 4]
+    assert protocol.held_envelopes == 2
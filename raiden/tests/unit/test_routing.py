@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+import random
+from heapq import heappush
+
+import networkx
+
+from raiden.routing import (
+    RouteCache,
+    get_ordered_partners,
+    get_ranked_partners,
+    make_graph,
+)
+from raiden.tests.utils import factories
+from raiden.transfer.state import NODE_NETWORK_REACHABLE, NODE_NETWORK_UNREACHABLE
+from raiden.transfer.state_change import ActionChangeNodeNetworkState, ContractReceiveRouteNew
+
+
+def ordered_partners_one_search_per_neighbor(network_graph, from_address, to_address):
+    reference_graph = networkx.Graph(network_graph.edges())
+    paths = list()
+
+    for neighbor in reference_graph.neighbors(from_address):
+        try:
+            length = networkx.shortest_path_length(reference_graph, neighbor, to_address)
+            heappush(paths, (length, neighbor))
+        except networkx.NetworkXNoPath:
+            pass
+
+    return paths
+
+
+def test_get_ordered_partners():
+    first, second, third, fourth, fifth = [factories.make_address() for _ in range(5)]
+    network_graph = make_graph([
+        (first, second),
+        (second, third),
+        (third, fourth),
+        (first, fourth),
+    ])
+    network_graph.add_node(fifth)
+
+    assert sorted(get_ordered_partners(network_graph, first, third)) == sorted([
+        (1, second),
+        (1, fourth),
+    ])
+    assert sorted(get_ordered_partners(network_graph, first, fourth)) == sorted([
+        (0, fourth),
+        (2, second),
+    ])
+
+    assert get_ordered_partners(network_graph, first, fifth) == []
+    assert get_ordered_partners(network_graph, fifth, first) == []
+    assert get_ordered_partners(network_graph, factories.make_address(), first) == []
+    assert get_ordered_partners(network_graph, first, factories.make_address()) == []
+
+
+def test_get_ordered_partners_matches_the_shortest_paths():
+    rng = random.Random(42)
+    addresses = [factories.make_address() for _ in range(200)]
+    hub = addresses[0]
+
+    edges = set()
+    for address in addresses:
+        for partner in rng.sample(addresses, 3):
+            if partner != address:
+                edges.add((address, partner))
+    for partner in rng.sample(addresses[1:], 50):
+        edges.add((hub, partner))
+    network_graph = make_graph(list(edges))
+
+    pairs = [tuple(rng.sample(addresses, 2)) for _ in range(50)]
+    pairs.extend((hub, rng.choice(addresses)) for _ in range(50))
+
+    for from_address, to_address in pairs:
+        assert sorted(get_ordered_partners(network_graph, from_address, to_address)) == sorted(
+            ordered_partners_one_search_per_neighbor(network_graph, from_address, to_address)
+        )
+
+
+def test_get_ranked_partners():
+    """ `short` has a path through an unreachable node, `long` has a longer
+    path of reachable nodes and `back` only reaches the target through us.
+    """
+    our, short, offline, long, hop1, hop2, back, island, target = [
+        factories.make_address()
+        for _ in range(9)
+    ]
+    network_graph = make_graph([
+        (our, short),
+        (short, offline),
+        (offline, target),
+        (our, long),
+        (long, hop1),
+        (hop1, hop2),
+        (hop2, target),
+        (our, back),
+        (back, island),
+        (our, target),
+    ])
+    network_statuses = {offline: NODE_NETWORK_UNREACHABLE}
+
+    assert get_ranked_partners(network_graph, network_statuses, our, target) == [
+        (0, target),
+        (3, long),
+    ]
+
+    # the breadth-first search without the network states ranks them all
+    assert sorted(get_ordered_partners(network_graph, our, target)) == sorted([
+        (0, target),
+        (2, back),
+        (2, long),
+        (2, short),
+    ])
+
+    network_graph.remove_edge(our, target)
+    assert get_ranked_partners(network_graph, network_statuses, our, target) == [
+        (3, long),
+    ]
+
+    network_statuses[long] = NODE_NETWORK_UNREACHABLE
+    assert get_ranked_partners(network_graph, network_statuses, our, target) == []
+
+    del network_statuses[offline]
+    assert get_ranked_partners(network_graph, network_statuses, our, target) == [
+        (2, short),
+    ]
+
+    network_statuses[target] = NODE_NETWORK_UNREACHABLE
+    assert get_ranked_partners(network_graph, network_statuses, our, target) == []
+
+
+def test_route_cache():
+    our, partner, hop, target = [factories.make_address() for _ in range(4)]
+    payment_network_id = factories.make_address()
+    token_address = factories.make_address()
+    other_token_address = factories.make_address()
+    token_network_key = (payment_network_id, token_address)
+
+    network_graph = make_graph([
+        (our, partner),
+        (partner, target),
+    ])
+    network_statuses = {partner: NODE_NETWORK_REACHABLE}
+
+    route_cache = RouteCache(maxsize=2)
+
+    def ranked_partners(to_address, key=token_network_key):
+        return route_cache.get_ranked_partners(
+            key,
+            network_graph,
+            network_statuses,
+            our,
+            to_address,
+        )
+
+    assert ranked_partners(target) == [(1, partner)]
+    assert ranked_partners(target) == [(1, partner)]
+    assert route_cache.stats()['hits'] == 1
+    assert route_cache.stats()['misses'] == 1
+
+    # a new channel of another token network doesn't change this one
+    network_graph.add_edge(our, hop)
+    network_graph.add_edge(hop, target)
+    route_cache.on_state_change(ContractReceiveRouteNew(
+        payment_network_id,
+        other_token_address,
+        hop,
+        target,
+    ))
+    assert ranked_partners(target) == [(1, partner)]
+
+    route_cache.on_state_change(ContractReceiveRouteNew(
+        payment_network_id,
+        token_address,
+        hop,
+        target,
+    ))
+    assert sorted(ranked_partners(target)) == sorted([(1, partner), (1, hop)])
+
+    network_statuses[hop] = NODE_NETWORK_UNREACHABLE
+    route_cache.on_state_change(ActionChangeNodeNetworkState(hop, NODE_NETWORK_UNREACHABLE))
+    assert ranked_partners(target) == [(1, partner)]
+
+    # the least recently used entry is evicted
+    assert ranked_partners(partner) == [(0, partner)]
+    assert ranked_partners(hop) == []
+    assert len(route_cache) == 2
+    assert ranked_partners(partner) == [(0, partner)]
+    misses = route_cache.stats()['misses']
+    ranked_partners(target)
+    assert route_cache.stats()['misses'] == misses + 1
+
+    stats = route_cache.stats()
+    assert stats['invalidations'] == 2
+    assert stats['hit_rate'] == stats['hits'] / (stats['hits'] + stats['misses'])
+
+
+def test_route_cache_network_state_changes():
+    our, partner, other_partner, stranger, target = [factories.make_address() for _ in range(5)]
+    payment_network_id = factories.make_address()
+    token_network_key = (payment_network_id, factories.make_address())
+    other_token_network_key = (payment_network_id, factories.make_address())
+
+    network_graph = make_graph([
+        (our, partner),
+        (partner, target),
+    ])
+    other_network_graph = make_graph([
+        (our, other_partner),
+        (other_partner, target),
+    ])
+    network_statuses = {
+        partner: NODE_NETWORK_REACHABLE,
+        other_partner: NODE_NETWORK_REACHABLE,
+    }
+
+    route_cache = RouteCache(maxsize=2)
+
+    def fill():
+        route_cache.get_ranked_partners(
+            token_network_key,
+            network_graph,
+            network_statuses,
+            our,
+            target,
+        )
+        route_cache.get_ranked_partners(
+            other_token_network_key,
+            other_network_graph,
+            network_statuses,
+            our,
+            target,
+        )
+
+    fill()
+    assert len(route_cache) == 2
+
+    # only the token networks with the node are dropped
+    route_cache.on_state_change(ActionChangeNodeNetworkState(partner, NODE_NETWORK_REACHABLE))
+    assert len(route_cache) == 1
+    assert route_cache.stats()['invalidations'] == 1
+
+    # the network state didn't change
+    fill()
+    route_cache.on_state_change(ActionChangeNodeNetworkState(partner, NODE_NETWORK_REACHABLE))
+    assert len(route_cache) == 2
+
+    # a node outside of the graphs
+    route_cache.on_state_change(ActionChangeNodeNetworkState(stranger, NODE_NETWORK_UNREACHABLE))
+    assert len(route_cache) == 2
+
+    # the target is in both graphs
+    route_cache.on_state_change(ActionChangeNodeNetworkState(target, NODE_NETWORK_UNREACHABLE))
+    assert len(route_cache) == 0
+    assert route_cache.stats()['invalidations'] == 3
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+import inspect
+import os
+import random
+
+import pytest
+
+from raiden.storage.serialize import (
+    BinarySerializer,
+    PickleSerializer,
+    SCHEMA_V1,
+)
+from raiden.storage.sqlite import COMPACTION_ARCHIVE, SQLiteStorage
+from raiden.tests.utils import factories
+from raiden.transfer import events, node, state, state_change
+from raiden.transfer.architecture import Event, State, StateChange
+from raiden.transfer.graph import ChannelGraph
+from raiden.transfer.mediated_transfer import events as mediated_events
+from raiden.transfer.mediated_transfer import state as mediated_state
+from raiden.transfer.mediated_transfer import state_change as mediated_state_change
+from raiden.transfer.mediated_transfer.state_change import ActionInitInitiator
+
+
+def make_node_wal():
+    """ Returns the state changes, events and final state of a node that
+    started a mediated transfer.
+    """
+    our_address = factories.UNIT_TRANSFER_INITIATOR
+    channels = [
+        factories.make_channel(
+            our_balance=100,
+            our_address=our_address,
+            partner_address=factories.HOP1,
+            token_address=factories.UNIT_TOKEN_ADDRESS,
+        ),
+        factories.make_channel(
+            our_balance=100,
+            our_address=our_address,
+            token_address=factories.UNIT_TOKEN_ADDRESS,
+        ),
+    ]
+
+    graph = ChannelGraph()
+    graph.add_edge(our_address, factories.HOP1)
+
+    token_network = state.TokenNetworkState(
+        factories.make_address(),
+        factories.UNIT_TOKEN_ADDRESS,
+        state.TokenNetworkGraphState(graph),
+        channels,
+    )
+    payment_network = state.PaymentNetworkState(
+        factories.UNIT_REGISTRY_IDENTIFIER,
+        [token_network],
+    )
+
+    state_changes = [
+        state_change.ActionInitNode(random.Random(), 1),
+        state_change.ContractReceiveNewPaymentNetwork(payment_network),
+        ActionInitInitiator(
+            factories.UNIT_REGISTRY_IDENTIFIER,
+            factories.UNIT_TRANSFER_DESCRIPTION,
+            [factories.route_from_channel(channels[0])],
+        ),
+        state_change.Block(2),
+    ]
+
+    node_state = None
+    all_events = list()
+    for change in state_changes:
+        iteration = node.state_transition(node_state, change)
+        node_state = iteration.new_state
+        all_events.extend(iteration.events)
+
+    return state_changes, all_events, node_state
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    True,
+    False,
+    0,
+    -1,
+    2 ** 256,
+    -2 ** 70,
+    1.5,
+    b'',
+    b'a' * 20,
+    b'b' * 32,
+    b'c' * 65,
+    'text',
+    [1, [2, b'x']],
+    (1, (2, 'y')),
+    {b'k': [None], 1: {}},
+])
+def test_binary_roundtrip_primitives(value):
+    data = BinarySerializer.serialize(value)
+    assert BinarySerializer.deserialize(data) == value
+
+
+def test_binary_roundtrip_node_wal():
+    state_changes, all_events, node_state = make_node_wal()
+
+    assert any(isinstance(event, mediated_events.SendLockedTransfer) for event in all_events)
+    assert node_state.payment_mapping.secrethashes_to_task
+
+    # random.Random doesn't implement equality, the node
+    # state is compared below
+    init_node, new_payment_network, *other_state_changes = state_changes
+    restored_init_node = BinarySerializer.deserialize(BinarySerializer.serialize(init_node))
+    assert restored_init_node.pseudo_random_generator.getstate() == (
+        init_node.pseudo_random_generator.getstate()
+    )
+    restored_new_payment_network = BinarySerializer.deserialize(
+        BinarySerializer.serialize(new_payment_network),
+    )
+    assert restored_new_payment_network.payment_network.address == (
+        new_payment_network.payment_network.address
+    )
+
+    for obj in other_state_changes + all_events:
+        assert BinarySerializer.deserialize(BinarySerializer.serialize(obj)) == obj
+
+    data = BinarySerializer.serialize(node_state)
+    restored = BinarySerializer.deserialize(data)
+
+    assert len(data) < len(PickleSerializer.serialize(node_state))
+    assert restored.block_number == node_state.block_number
+    assert restored.payment_mapping == node_state.payment_mapping
+    assert restored.queueids_to_queues == node_state.queueids_to_queues
+    assert restored.pseudo_random_generator.getstate() == (
+        node_state.pseudo_random_generator.getstate()
+    )
+
+    payment_network = node_state.identifiers_to_paymentnetworks[
+        factories.UNIT_REGISTRY_IDENTIFIER
+    ]
+    token_network = payment_network.tokenaddresses_to_tokennetworks[
+        factories.UNIT_TOKEN_ADDRESS
+    ]
+    restored_payment_network = restored.identifiers_to_paymentnetworks[
+        factories.UNIT_REGISTRY_IDENTIFIER
+    ]
+    restored_token_network = restored_payment_network.tokenaddresses_to_tokennetworks[
+        factories.UNIT_TOKEN_ADDRESS
+    ]
+
+    assert (
+        restored_token_network.channelidentifiers_to_channels ==
+        token_network.channelidentifiers_to_channels
+    )
+    assert set(restored_token_network.network_graph.network.edges()) == set(
+        token_network.network_graph.network.edges()
+    )
+
+    # objects shared by the mappings are still shared
+    assert restored_token_network is restored_payment_network.tokenidentifiers_to_tokennetworks[
+        token_network.address
+    ]
+    for channel_state in restored_token_network.channelidentifiers_to_channels.values():
+        partner_address = channel_state.partner_state.address
+        assert restored_token_network.partneraddresses_to_channels[partner_address] is (
+            channel_state
+        )
+
+
+def test_binary_rejects_unknown_data():
+    class Unknown:
+        pass
+
+    with pytest.raises(TypeError):
+        BinarySerializer.serialize(Unknown())
+
+    with pytest.raises(ValueError):
+        BinarySerializer.deserialize(PickleSerializer.serialize(1))
+
+
+def test_binary_schema_is_complete():
+    modules = (
+        state,
+        state_change,
+        events,
+        mediated_state,
+        mediated_state_change,
+        mediated_events,
+    )
+    schema_classes = {cls for cls, _ in SCHEMA_V1}
+
+    for module in modules:
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            is_transfer_class = (
+                cls.__module__ == module.__name__ and
+                issubclass(cls, (State, StateChange, Event))
+            )
+            if is_transfer_class:
+                assert cls in schema_classes, cls
+
+
+def test_change_serializer(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    state_changes, all_events, node_state = make_node_wal()
+
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    for change in state_changes:
+        state_change_id = storage.write_state_change(change)
+    storage.write_events(state_change_id, 2, all_events)
+    storage.write_state_snapshot(state_change_id, node_state.payment_mapping)
+
+    storage.change_serializer(BinarySerializer)
+
+    migrated = SQLiteStorage(database_path, BinarySerializer)
+    # random.Random doesn't implement equality
+    migrated_state_changes = migrated.get_statechanges_by_identifier(0, 'latest')
+    assert [type(change) for change in migrated_state_changes] == [
+        type(change) for change in state_changes
+    ]
+    assert migrated_state_changes[2:] == state_changes[2:]
+    assert [event for _, event in migrated.get_events_by_block(0, 'latest')] == all_events
+    assert migrated.get_state_snapshot() == (state_change_id, node_state.payment_mapping)
+
+
+class FailingSerializer:
+    """ Fails to serialize the snapshot, after the archive was converted. """
+
+    @staticmethod
+    def serialize(obj):
+        if isinstance(obj, state.PaymentMappingState):
+            raise ValueError('cannot serialize the snapshot')
+        return BinarySerializer.serialize(obj)
+
+    @staticmethod
+    def deserialize(data):
+        return BinarySerializer.deserialize(data)
+
+
+def make_archived_storage(database_path):
+    state_changes, all_events, node_state = make_node_wal()
+
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    state_change_ids = [storage.write_state_change(change) for change in state_changes]
+    # the state change of the snapshot is not archived, only the older ones
+    storage.write_events(state_change_ids[0], 2, all_events)
+    storage.write_state_snapshot(state_change_ids[-1], node_state.payment_mapping)
+    assert storage.compact(COMPACTION_ARCHIVE, segment_size=2) == len(state_changes) - 1
+
+    return storage, all_events
+
+
+def test_change_serializer_rewrites_the_archive(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage, all_events = make_archived_storage(database_path)
+    old_segments = set(os.listdir(storage.archive_dir))
+
+    storage.change_serializer(BinarySerializer)
+    assert storage.get_events_by_block(0, 'latest') == [(2, event) for event in all_events]
+
+    # the old segments are removed once the new ones are in use
+    assert set(os.listdir(storage.archive_dir)).isdisjoint(old_segments)
+    migrated = SQLiteStorage(database_path, BinarySerializer)
+    assert migrated.get_events_by_block(0, 'latest') == [(2, event) for event in all_events]
+
+
+def test_change_serializer_failure_leaves_the_archive(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage, all_events = make_archived_storage(database_path)
+    old_segments = set(os.listdir(storage.archive_dir))
+    archived_state_changes = storage.get_archived_state_changes()
+
+    with pytest.raises(ValueError):
+        storage.change_serializer(FailingSerializer)
+
+    assert storage.serializer is PickleSerializer
+    assert set(os.listdir(storage.archive_dir)) == old_segments
+
+    reopened = SQLiteStorage(database_path, PickleSerializer)
+    assert reopened.get_events_by_block(0, 'latest') == [(2, event) for event in all_events]
+    assert [type(change) for _, change in reopened.get_archived_state_changes()] == [
+        type(change) for _, change in archived_state_changes
+    ]
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
-from raiden.network.transport import TokenBucket
+import gevent
+
+from raiden.network.transport import BatchedUDPTransport, TokenBucket
 
 
 def test_token_bucket():
@@ -21,3 +23,45 @@ def test_token_bucket():
 
     for num in range(1, 9):
         assert num * token_refill == bucket.consume(1)
+
+
+class CountingPolicy:
+    def __init__(self):
+        self.consumed = 0
+
+    def consume(self, tokens):
+        self.consumed += tokens
+        return 0.
+
+
+class ReceivedProtocol:
+    def __init__(self):
+        self.raiden = None
+        self.received = list()
+
+    def receive(self, data):
+        self.received.append(data)
+
+
+def test_batched_transport_keeps_the_order():
+    policy = CountingPolicy()
+    sender = BatchedUDPTransport('127.0.0.1', 0, protocol=ReceivedProtocol())
+    sender.throttle_policy = policy
+    receiver = BatchedUDPTransport('127.0.0.1', 0, protocol=ReceivedProtocol())
+
+    sender.start()
+    receiver.start()
+
+    messages = [str(number).encode() for number in range(200)]
+    for data in messages:
+        sender.send(None, receiver.server.address, data)
+
+    with gevent.Timeout(5):
+        while len(receiver.protocol.received) < len(messages):
+            gevent.sleep(0.01)
+
+    assert receiver.protocol.received == messages
+    assert policy.consumed == len(messages)
+
+    sender.stop()
+    receiver.stop()
@@ -1,15 +1,33 @@
 # -*- coding: utf-8 -*-
+import itertools
 import sqlite3
+import tracemalloc
 
+import gevent
 import pytest
 
 from raiden.transfer.architecture import StateManager
+from raiden.storage import archive
 from raiden.storage.serialize import PickleSerializer
-from raiden.storage.sqlite import SQLiteStorage
-from raiden.storage.wal import WriteAheadLog
+from raiden.storage.sqlite import (
+    COMPACTION_ARCHIVE,
+    COMPACTION_DROP,
+    SCHEMA_VERSION,
+    SQLiteStorage,
+)
+from raiden.storage.wal import (
+    SnapshotPolicy,
+    WriteAheadLog,
+    restore_from_latest_snapshot,
+)
 from raiden.tests.utils import factories
-from raiden.transfer.architecture import TransitionResult
-from raiden.transfer.events import EventTransferSentFailed
+from raiden.transfer.architecture import State, TransitionResult
+from raiden.transfer.events import (
+    ContractSendChannelSettle,
+    EventTransferSentFailed,
+    EventTransferSentSuccess,
+)
+from raiden.transfer.state import PaymentMappingState
 from raiden.transfer.state_change import (
     Block,
     ContractReceiveChannelWithdraw,
@@ -20,6 +38,28 @@ def state_transition_noop(state, state_change):  # pylint: disable=unused-argume
     return TransitionResult(state, list())
 
 
+class CounterState(State):
+    def __init__(self, count):
+        self.count = count
+
+    def __eq__(self, other):
+        return isinstance(other, CounterState) and self.count == other.count
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def state_transition_count(state, state_change):  # pylint: disable=unused-argument
+    count = state.count if state is not None else 0
+    return TransitionResult(CounterState(count + 1), list())
+
+
+def state_transition_settle(state, state_change):
+    count = state.count if state is not None else 0
+    events = [ContractSendChannelSettle(state_change.block_number)]
+    return TransitionResult(CounterState(count + 1), events)
+
+
 def new_wal():
     state = None
     serializer = PickleSerializer
@@ -125,3 +165,450 @@ def test_write_read_events():
     latest_event = new_events[-1]
     assert latest_event[0] == block_number
     assert isinstance(latest_event[1], EventTransferSentFailed)
+
+
+def test_snapshot_policy():
+    policy = SnapshotPolicy(state_change_interval=3, block_interval=10)
+
+    policy.state_change_applied(1)
+    policy.state_change_applied(1)
+    assert not policy.should_snapshot(1)
+
+    policy.state_change_applied(1)
+    assert policy.should_snapshot(1)
+
+    policy.snapshot_taken(1)
+    assert not policy.should_snapshot(1)
+
+    policy.state_change_applied(11)
+    assert policy.should_snapshot(11)
+
+    with pytest.raises(ValueError):
+        SnapshotPolicy(state_change_interval=0, block_interval=None)
+
+
+def test_restore_replays_only_state_changes_after_snapshot():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    policy = SnapshotPolicy(state_change_interval=4, block_interval=None)
+    state_manager = StateManager(state_transition_count, None)
+    wal = WriteAheadLog(state_manager, storage, policy)
+
+    for block_number in range(1, 7):
+        wal.log_and_dispatch(Block(block_number), block_number)
+
+    # the snapshot is written asynchronously
+    wal.snapshot_greenlet.join()
+    assert storage.get_state_snapshot() == (4, CounterState(4))
+
+    restored_wal, _ = restore_from_latest_snapshot(
+        state_transition_count,
+        storage,
+        snapshot_policy=SnapshotPolicy(state_change_interval=4, block_interval=None),
+    )
+
+    # the state change recorded with the snapshot must not be applied twice
+    assert restored_wal.state_manager.current_state == CounterState(6)
+    assert restored_wal.state_change_id == 6
+    assert restored_wal.snapshot_policy.state_changes_since_snapshot == 2
+
+    restored_wal.snapshot()
+    assert storage.get_state_snapshot() == (6, CounterState(6))
+
+
+def test_restore_without_snapshot_replays_everything():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    wal = WriteAheadLog(StateManager(state_transition_count, None), storage)
+
+    for block_number in range(1, 4):
+        wal.log_and_dispatch(Block(block_number), block_number)
+
+    restored_wal, _ = restore_from_latest_snapshot(state_transition_count, storage)
+    assert restored_wal.state_manager.current_state == CounterState(3)
+
+
+def test_restore_without_snapshot_drops_the_events(tmpdir):
+    """ A database written before the snapshots has no snapshot, the events
+    of its state changes were handled and must not be handled again.
+    """
+    database_path = str(tmpdir.join('v1.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    wal = WriteAheadLog(StateManager(state_transition_settle, None), storage)
+
+    for block_number in range(1, 4):
+        events = wal.log_and_dispatch(Block(block_number), block_number)
+        assert events == [ContractSendChannelSettle(block_number)]
+
+    storage.conn.close()
+
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    restored_wal, unapplied_events = restore_from_latest_snapshot(
+        state_transition_settle,
+        storage,
+    )
+
+    assert restored_wal.state_manager.current_state == CounterState(3)
+    assert restored_wal.state_change_id == 3
+    assert unapplied_events == []
+
+    # once there is a snapshot only the events after it are returned
+    restored_wal.snapshot()
+    restored_wal.log_and_dispatch(Block(4), 4)
+    storage.conn.close()
+
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    _, unapplied_events = restore_from_latest_snapshot(state_transition_settle, storage)
+    assert unapplied_events == [ContractSendChannelSettle(4)]
+
+
+def test_group_commit(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer, group_commit=True)
+    state_manager = StateManager(state_transition_count, None)
+    wal = WriteAheadLog(state_manager, storage)
+
+    commits = list()
+    commit_group = storage._commit_group
+
+    def counting_commit_group():
+        commits.append(True)
+        commit_group()
+
+    storage._commit_group = counting_commit_group
+
+    greenlets = [
+        gevent.spawn(wal.log_and_dispatch, Block(block_number), block_number)
+        for block_number in range(1, 11)
+    ]
+    gevent.joinall(greenlets, raise_error=True)
+
+    # all the concurrent writes were coalesced
+    assert len(commits) == 1
+    assert state_manager.current_state == CounterState(10)
+
+    # the data is visible to other connections, i.e. committed
+    other_storage = SQLiteStorage(database_path, PickleSerializer)
+    state_changes = other_storage.get_statechanges_by_identifier(0, 'latest')
+    assert [state_change.block_number for state_change in state_changes] == list(range(1, 11))
+
+
+class FailingCommitConnection:
+    """ Proxy to a sqlite connection whose commits fail. """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def commit(self):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_group_commit_failure_stops_the_writes(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer, group_commit=True)
+    storage.conn = FailingCommitConnection(storage.conn)
+
+    storage.write_state_change(Block(1))
+    with pytest.raises(sqlite3.OperationalError):
+        storage.wait_for_commit()
+
+    # the node state is ahead of the database, nothing else can be written
+    with pytest.raises(sqlite3.OperationalError):
+        storage.write_state_change(Block(2))
+    with pytest.raises(sqlite3.OperationalError):
+        storage.wait_for_commit()
+
+    other_storage = SQLiteStorage(database_path, PickleSerializer)
+    assert other_storage.get_statechanges_by_identifier(0, 'latest') == list()
+
+
+def test_group_commit_drops_the_failed_write(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer, group_commit=True)
+
+    storage.write_state_change(Block(1))
+
+    with pytest.raises(ValueError):
+        with storage._write() as conn:
+            conn.execute(
+                'INSERT INTO state_changes(identifier, data) VALUES(null, ?)',
+                (PickleSerializer.serialize(Block(2)), ),
+            )
+            raise ValueError('write failed halfway')
+
+    storage.write_state_change(Block(3))
+    storage.wait_for_commit()
+
+    other_storage = SQLiteStorage(database_path, PickleSerializer)
+    state_changes = other_storage.get_statechanges_by_identifier(0, 'latest')
+    assert [state_change.block_number for state_change in state_changes] == [1, 3]
+
+
+def test_get_events_by_block_filters():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    channel1 = factories.make_address()
+    channel2 = factories.make_address()
+
+    state_change_id = storage.write_state_change('statechangedata')
+    storage.write_events(state_change_id, 1, [
+        ContractSendChannelSettle(channel1),
+        EventTransferSentFailed(1, 'whatever'),
+    ])
+    storage.write_events(state_change_id, 2, [
+        ContractSendChannelSettle(channel2),
+        EventTransferSentSuccess(2, 10, factories.HOP1),
+    ])
+
+    assert len(storage.get_events_by_block(0, 'latest')) == 4
+    assert storage.get_events_by_block(0, 1, channel_identifier=channel2) == []
+    assert storage.get_events_by_block(0, 'latest', channel_identifier=channel2) == [
+        (2, ContractSendChannelSettle(channel2)),
+    ]
+
+    visible_events = storage.get_events_by_block(
+        0,
+        'latest',
+        event_types=(EventTransferSentFailed, EventTransferSentSuccess),
+    )
+    assert visible_events == [
+        (1, EventTransferSentFailed(1, 'whatever')),
+        (2, EventTransferSentSuccess(2, 10, factories.HOP1)),
+    ]
+
+
+def test_upgrade_schema_backfills_events(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    channel = factories.make_address()
+
+    # the schema of version 0
+    conn = sqlite3.connect(database_path)
+    with conn:
+        conn.execute(
+            'CREATE TABLE state_changes ('
+            '    identifier INTEGER PRIMARY KEY AUTOINCREMENT, '
+            '    data BINARY'
+            ')'
+        )
+        conn.execute(
+            'CREATE TABLE state_events ('
+            '    identifier INTEGER PRIMARY KEY, '
+            '    source_statechange_id INTEGER NOT NULL, '
+            '    block_number INTEGER NOT NULL, '
+            '    data BINARY'
+            ')'
+        )
+        conn.execute(
+            'INSERT INTO state_changes(identifier, data) VALUES(1, ?)',
+            (PickleSerializer.serialize('statechangedata'), ),
+        )
+        conn.execute(
+            'INSERT INTO state_events(source_statechange_id, block_number, data) VALUES(1, 5, ?)',
+            (PickleSerializer.serialize(ContractSendChannelSettle(channel)), ),
+        )
+    conn.close()
+
+    storage = SQLiteStorage(database_path, PickleSerializer)
+
+    assert storage.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert storage.get_events_by_block(
+        0,
+        'latest',
+        event_types=[ContractSendChannelSettle],
+        channel_identifier=channel,
+    ) == [(5, ContractSendChannelSettle(channel))]
+
+
+def log_blocks_with_events(storage, channel, first_block, last_block):
+    for block_number in range(first_block, last_block + 1):
+        state_change_id = storage.write_state_change(Block(block_number))
+        storage.write_events(state_change_id, block_number, [
+            ContractSendChannelSettle(channel),
+            EventTransferSentFailed(block_number, 'whatever'),
+        ])
+    return state_change_id
+
+
+def test_compaction_archive(tmpdir):
+    database_path = str(tmpdir.join('log.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    channel = factories.make_address()
+
+    state_change_id = log_blocks_with_events(storage, channel, 1, 10)
+    storage.write_state_snapshot(state_change_id - 3, CounterState(7))
+    log_blocks_with_events(storage, channel, 11, 12)
+
+    all_events = storage.get_events_by_block(0, 'latest')
+    assert storage.compact(COMPACTION_ARCHIVE, segment_size=3) == 6
+    assert len(tmpdir.join('archive').listdir()) == 2
+
+    # only the state changes from the snapshot on are left
+    assert [block.block_number for block in storage.get_statechanges_by_identifier(0, 12)] == [
+        7, 8, 9, 10, 11, 12,
+    ]
+    assert [block.block_number for _, block in storage.get_archived_state_changes()] == list(
+        range(1, 7),
+    )
+
+    # the queries read the archive transparently
+    assert storage.get_events_by_block(0, 'latest') == all_events
+    assert storage.get_events_by_block(6, 9, channel_identifier=channel) == [
+        (block_number, ContractSendChannelSettle(channel))
+        for block_number in range(6, 10)
+    ]
+    assert storage.get_events_by_block(
+        2,
+        3,
+        event_types=[EventTransferSentFailed],
+    ) == [
+        (2, EventTransferSentFailed(2, 'whatever')),
+        (3, EventTransferSentFailed(3, 'whatever')),
+    ]
+
+    # nothing left to compact
+    assert storage.compact(COMPACTION_ARCHIVE) == 0
+
+    restored_wal, _ = restore_from_latest_snapshot(state_transition_count, storage)
+    assert restored_wal.state_manager.current_state == CounterState(12)
+
+
+def test_archived_events_queries_read_the_matching_segments(tmpdir, monkeypatch):
+    database_path = str(tmpdir.join('log.db'))
+    storage = SQLiteStorage(database_path, PickleSerializer)
+    channel1 = factories.make_address()
+    channel2 = factories.make_address()
+
+    log_blocks_with_events(storage, channel1, 1, 3)
+    state_change_id = log_blocks_with_events(storage, channel2, 4, 6)
+    storage.write_state_snapshot(state_change_id, CounterState(6))
+    assert storage.compact(COMPACTION_ARCHIVE, segment_size=3) == 5
+
+    reads = list()
+    read_segment_events = archive.read_segment_events
+
+    def counting_read_segment_events(path):
+        reads.append(path)
+        return read_segment_events(path)
+
+    monkeypatch.setattr(archive, 'read_segment_events', counting_read_segment_events)
+
+    # the first segment only has events of channel1
+    assert storage.get_events_by_block(0, 'latest', channel_identifier=channel2) == [
+        (4, ContractSendChannelSettle(channel2)),
+        (5, ContractSendChannelSettle(channel2)),
+        (6, ContractSendChannelSettle(channel2)),
+    ]
+    assert len(reads) == 1
+
+    # the decoded segment is reused
+    assert storage.get_events_by_block(5, 5, event_types=[ContractSendChannelSettle]) == [
+        (5, ContractSendChannelSettle(channel2)),
+    ]
+    assert len(reads) == 1
+
+    assert storage.get_events_by_block(7, 'latest', channel_identifier=channel1) == list()
+    assert len(reads) == 1
+
+    # the index is rebuilt from the segments by the migration
+    with storage.conn:
+        storage.conn.execute('DROP TABLE archive_segment_events')
+        storage.conn.execute('PRAGMA user_version=2')
+
+    upgraded_storage = SQLiteStorage(database_path, PickleSerializer)
+    assert upgraded_storage.get_events_by_block(2, 2, channel_identifier=channel1) == [
+        (2, ContractSendChannelSettle(channel1)),
+    ]
+
+
+def test_compaction_drop():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    channel = factories.make_address()
+
+    with pytest.raises(ValueError):
+        storage.compact(COMPACTION_ARCHIVE)
+
+    state_change_id = log_blocks_with_events(storage, channel, 1, 4)
+    storage.write_state_snapshot(state_change_id, 'snapshotdata')
+
+    assert storage.compact(COMPACTION_DROP) == 3
+    assert storage.get_events_by_block(0, 'latest') == [
+        (4, ContractSendChannelSettle(channel)),
+        (4, EventTransferSentFailed(4, 'whatever')),
+    ]
+    assert storage.get_statechanges_by_identifier(0, 'latest') == [Block(4)]
+
+    # the identifiers are not reused
+    assert storage.write_state_change(Block(5)) == 5
+
+
+def test_background_compaction(tmpdir):
+    storage = SQLiteStorage(str(tmpdir.join('log.db')), PickleSerializer)
+    policy = SnapshotPolicy(state_change_interval=4, block_interval=None)
+    state_manager = StateManager(state_transition_count, None)
+    wal = WriteAheadLog(state_manager, storage, policy, compaction=COMPACTION_ARCHIVE)
+
+    for block_number in range(1, 6):
+        wal.log_and_dispatch(Block(block_number), block_number)
+
+    wal.snapshot_greenlet.join()
+    assert storage.get_statechanges_by_identifier(0, 'latest') == [Block(4), Block(5)]
+
+    restored_wal, _ = restore_from_latest_snapshot(state_transition_count, storage)
+    assert restored_wal.state_manager.current_state == CounterState(5)
+
+
+def test_snapshot_with_payment_tasks():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    state_change_id = storage.write_state_change('statechangedata')
+
+    payment_mapping = PaymentMappingState()
+    payment_mapping.secrethashes_to_task[factories.UNIT_SECRETHASH] = (
+        PaymentMappingState.InitiatorTask(
+            factories.UNIT_REGISTRY_IDENTIFIER,
+            factories.UNIT_TOKEN_ADDRESS,
+            None,
+        )
+    )
+
+    storage.write_state_snapshot(state_change_id, payment_mapping)
+    assert storage.get_state_snapshot() == (state_change_id, payment_mapping)
+
+
+def test_iter_statechanges_pages():
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+    for block_number in range(1, 11):
+        storage.write_state_change(Block(block_number))
+
+    state_changes = list(storage.iter_statechanges_by_identifier(3, 8, page_size=2))
+    assert [identifier for identifier, _ in state_changes] == list(range(3, 9))
+    assert [change.block_number for _, change in state_changes] == list(range(3, 9))
+
+    assert len(list(storage.iter_statechanges_by_identifier(0, 'latest', page_size=3))) == 10
+    assert list(storage.iter_statechanges_by_identifier(11, 'latest')) == []
+
+
+def test_restore_memory_is_bounded():
+    number_of_state_changes = 1000000
+    storage = SQLiteStorage(':memory:', PickleSerializer)
+
+    data = PickleSerializer.serialize(Block(1))
+    with storage.conn:
+        storage.conn.executemany(
+            'INSERT INTO state_changes(identifier, data) VALUES(null, ?)',
+            itertools.repeat((data, ), number_of_state_changes),
+        )
+
+    tracemalloc.start()
+    try:
+        wal, _ = restore_from_latest_snapshot(
+            state_transition_noop,
+            storage,
+            copy_on_write=True,
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert wal.state_change_id == number_of_state_changes
+    # holding the deserialized log in memory would take hundreds of MB
+    assert peak < 10 * 1024 * 1024
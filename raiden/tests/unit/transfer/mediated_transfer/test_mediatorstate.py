@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=invalid-name,too-many-locals,too-many-arguments,too-many-lines
 import random
+from copy import deepcopy
 
 import pytest
 
@@ -686,6 +687,45 @@ def test_set_expired_pairs():
     assert pair.payer_state == 'payer_expired'
 
 
+def test_get_block_deadline():
+    """ No block before the deadline produces events, also when the payee
+    was paid and the channel must be closed.
+    """
+    amount = 10
+
+    for payee_state in ('payee_pending', 'payee_balance_proof'):
+        channelmap, transfers_pair = make_transfers_pair(
+            [HOP2_KEY, HOP3_KEY],
+            amount,
+        )
+        transfers_pair[0].payee_state = payee_state
+
+        mediator_state = MediatorTransferState(UNIT_SECRETHASH)
+        mediator_state.transfers_pair = transfers_pair
+
+        block_number = 1
+        deadline = mediator.get_block_deadline(mediator_state, channelmap, block_number)
+        payer_expiration = transfers_pair[0].payer_transfer.lock.expiration
+        assert block_number < deadline <= payer_expiration + 1
+
+        for new_block_number in range(block_number + 1, deadline):
+            iteration = mediator.handle_block(
+                deepcopy(channelmap),
+                deepcopy(mediator_state),
+                Block(new_block_number),
+                new_block_number,
+            )
+            assert not iteration.events
+
+        iteration = mediator.handle_block(
+            channelmap,
+            mediator_state,
+            Block(payer_expiration + 1),
+            payer_expiration + 1,
+        )
+        assert iteration.events
+
+
 def test_events_for_refund():
     amount = 10
     expiration = 30
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=invalid-name,too-many-locals
 import random
+from copy import deepcopy
 
 import pytest
 
@@ -348,6 +349,41 @@ def test_handle_block_lower_block_number():
     assert not iteration.events
 
 
+def test_get_block_deadline():
+    """ No block before the deadline produces events. """
+    initiator = factories.HOP6
+    our_address = factories.ADDR
+    amount = 3
+    block_number = 1
+    pseudo_random_generator = random.Random()
+
+    from_channel, state = make_target_state(
+        our_address,
+        amount,
+        block_number,
+        initiator,
+    )
+    expiration = state.transfer.lock.expiration
+
+    deadline = target.get_block_deadline(state, from_channel, block_number)
+    assert block_number < deadline <= expiration + 1
+
+    for new_block_number in range(block_number + 1, expiration + 2):
+        iteration = target.state_transition(
+            deepcopy(state),
+            Block(new_block_number),
+            deepcopy(from_channel),
+            pseudo_random_generator,
+            new_block_number,
+        )
+
+        if new_block_number < deadline:
+            assert not iteration.events
+
+    # the lock expired, it is reported
+    assert must_contain_entry(iteration.events, EventWithdrawFailed, {})
+
+
 def test_state_transition():
     """ Happy case testing. """
     lock_amount = 7
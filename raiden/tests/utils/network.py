@@ -7,6 +7,16 @@ from ethereum import slogging
 
 from raiden.app import App
 from raiden.network.transport import DummyPolicy
+from raiden.settings import (
+    DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+    DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+    DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+    DEFAULT_PROTOCOL_QUEUE_WINDOW,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+    DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
+)
 from raiden.utils import privatekey_to_address
 
 log = slogging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -262,6 +272,14 @@ def create_apps(
                 'nat_invitation_timeout': nat_invitation_timeout,
                 'nat_keepalive_retries': nat_keepalive_retries,
                 'nat_keepalive_timeout': nat_keepalive_timeout,
+                'message_cache_size': DEFAULT_PROTOCOL_MESSAGE_CACHE_SIZE,
+                'message_cache_ttl': DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL,
+                'message_cache_ttl_blocks': DEFAULT_PROTOCOL_MESSAGE_CACHE_TTL_BLOCKS,
+                'processed_batch_delay': DEFAULT_PROTOCOL_PROCESSED_BATCH_DELAY,
+                'signature_recovery_workers': DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_WORKERS,
+                'signature_recovery_max_pending': DEFAULT_PROTOCOL_SIGNATURE_RECOVERY_MAX_PENDING,
+                'adaptive_retry_timeout': DEFAULT_PROTOCOL_ADAPTIVE_RETRY_TIMEOUT,
+                'queue_window': DEFAULT_PROTOCOL_QUEUE_WINDOW,
             },
             'rpc': True,
             'console': False,
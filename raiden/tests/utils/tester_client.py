@@ -25,9 +25,12 @@ from raiden.constants import (
 from raiden.utils import (
     address_decoder,
     address_encoder,
+    data_encoder,
     isaddress,
     pex,
     privatekey_to_address,
+    topic_decoder,
+    topic_encoder,
 )
 from raiden.blockchain.abi import (
     CONTRACT_MANAGER,
@@ -159,12 +162,79 @@ class FilterTesterMock:
 
 
 class ClientMock:
-    def __init__(self):
+    """ Stand-in for the JSONRPCClient, only `eth_getLogs` is supported.
+
+    The logs are recorded by a log listener with the number of the block that
+    is being built, which is also the one returned by `block_number`. An
+    ethereum client returns the last mined block instead, and a poller that
+    already queried up to that block would miss the logs added to it. The
+    logs are only returned for a range that includes the next block, i.e.
+    once their block is mined.
+    """
+
+    def __init__(self, tester_chain):
         self.stop_event = None
+        self.tester_chain = tester_chain
+        self.logs = list()
+
+        self.tester_chain.head_state.log_listeners.append(self.log_listener)
 
     def inject_stop_event(self, event):
         self.stop_event = event
 
+    def log_listener(self, event):
+        self.logs.append((self.tester_chain.block.number, event))
+
+    def call(self, method, *args):
+        if method != 'eth_getLogs':
+            raise NotImplementedError('{} is not supported by the tester'.format(method))
+
+        return self.get_logs(*args)
+
+    def get_logs(self, json_data):
+        def block_number(block_tag):
+            if block_tag in ('latest', 'pending'):
+                return self.tester_chain.block.number
+            if block_tag == 'earliest':
+                return 0
+            return int(block_tag, 16)
+
+        from_block = block_number(json_data.get('fromBlock', 'latest'))
+        to_block = block_number(json_data.get('toBlock', 'latest'))
+
+        addresses = json_data.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if addresses is not None:
+            addresses = {address_decoder(address) for address in addresses}
+
+        topics = [
+            None if topic is None else {
+                topic_decoder(alternative)
+                for alternative in (topic if isinstance(topic, list) else [topic])
+            }
+            for topic in json_data.get('topics') or list()
+        ]
+
+        result = list()
+        for log_block_number, event in self.logs:
+            valid_block = from_block <= log_block_number + 1 <= to_block
+            valid_address = addresses is None or event.address in addresses
+            valid_topics = len(topics) <= len(event.topics) and all(
+                alternatives is None or event_topic in alternatives
+                for alternatives, event_topic in zip(topics, event.topics)
+            )
+
+            if valid_block and valid_address and valid_topics:
+                result.append({
+                    'address': address_encoder(event.address),
+                    'topics': [topic_encoder(topic) for topic in event.topics],
+                    'data': data_encoder(event.data),
+                    'blockNumber': hex(log_block_number),
+                })
+
+        return result
+
 
 class BlockChainServiceTesterMock:
     def __init__(self, private_key, tester_chain):
@@ -178,7 +248,7 @@ class BlockChainServiceTesterMock:
         self.address_to_discovery = dict()
         self.address_to_nettingchannel = dict()
         self.address_to_registry = dict()
-        self.client = ClientMock()
+        self.client = ClientMock(tester_chain)
 
     def block_number(self):
         return self.tester_chain.block.number
@@ -71,3 +71,33 @@ class UnreliableTransport(DummyTransport):
                 counter=self.network.counter,
                 msghash=pex(sha3(bytes_))
             )
+
+
+class LossyTransport(DummyTransport):
+    """ A transport that delivers the packets after `latency` seconds and
+    drops every `droprate`-th packet.
+
+    Note:
+        The packets are counted per instance, so the losses are deterministic.
+    """
+
+    def __init__(
+            self,
+            host,
+            port,
+            protocol=None,
+            throttle_policy=DummyPolicy()):
+
+        super().__init__(host, port, protocol, throttle_policy)
+        self.latency = 0
+        self.droprate = 0
+        self.sent = list()
+
+    def send(self, sender, host_port, bytes_):
+        self.sent.append(bytes_)
+
+        if self.droprate and len(self.sent) % self.droprate == 0:
+            return
+
+        receive_end = self.network.transports[host_port].receive
+        gevent.spawn_later(self.latency, receive_end, bytes_)
@@ -94,20 +94,26 @@ class StateManager:
     __slots__ = (
         'state_transition',
         'current_state',
+        'copy_on_write',
     )
 
-    def __init__(self, state_transition, current_state):
+    def __init__(self, state_transition, current_state, copy_on_write=False):
         """ Initialize the state manager.
 
         Args:
             state_transition: function that can apply a StateChange message.
             current_state: current application state.
+            copy_on_write: If True the state_transition function is trusted to
+                not modify its input state, copying only the sub-trees it
+                changes, otherwise the whole state is copied before each
+                transition.
         """
         if not callable(state_transition):
             raise ValueError('state_transition must be a callable')
 
         self.state_transition = state_transition
         self.current_state = current_state
+        self.copy_on_write = copy_on_write
 
     def dispatch(self, state_change: StateChange) -> List[Event]:
         """ Apply the `state_change` in the current machine and return the
@@ -125,8 +131,12 @@ class StateManager:
         assert isinstance(state_change, StateChange)
 
         # the state objects must be treated as immutable, so make a copy of the
-        # current state and pass the copy to the state machine to be modified.
-        next_state = deepcopy(self.current_state)
+        # current state and pass the copy to the state machine to be modified,
+        # unless the state machine does the copying itself.
+        if self.copy_on_write:
+            next_state = self.current_state
+        else:
+            next_state = deepcopy(self.current_state)
 
         # update the current state by applying the change
         iteration = self.state_transition(
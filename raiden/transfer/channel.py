@@ -4,7 +4,7 @@ import heapq
 from binascii import hexlify
 from collections import namedtuple
 
-from raiden.encoding.signing import recover_publickey
+from raiden.encoding.signing import recover_address
 from raiden.transfer.architecture import TransitionResult
 from raiden.transfer.balance_proof import signing_data
 from raiden.transfer.events import (
@@ -26,8 +26,11 @@ from raiden.transfer.mediated_transfer.events import (
 from raiden.transfer.merkle_tree import (
     LEAVES,
     merkleroot,
-    compute_layers,
+    compute_layers_with,
+    compute_layers_without,
     compute_merkleproof_for,
+    compute_merkleproofs_for,
+    is_leaf,
 )
 from raiden.transfer.state import (
     CHANNEL_STATE_CLOSED,
@@ -57,7 +60,7 @@ from raiden.transfer.state_change import (
     ContractReceiveChannelWithdraw,
     ReceiveTransferDirect,
 )
-from raiden.utils import publickey_to_address, typing
+from raiden.utils import typing
 from raiden.settings import DEFAULT_NUMBER_OF_CONFIRMATIONS_BLOCK
 
 
@@ -87,6 +90,29 @@ def is_deposit_confirmed(channel_state, block_number):
     )
 
 
+def get_block_deadline(channel_state, block_number):
+    """ Return the first block after `block_number` that can change the
+    channel state, i.e. the end of the settlement period or the confirmation
+    of a deposit, or None if no block can.
+    """
+    deadlines = list()
+
+    if get_status(channel_state) == CHANNEL_STATE_CLOSED:
+        closed_block_number = channel_state.close_transaction.finished_block_number
+        settlement_end = closed_block_number + channel_state.settle_timeout
+        deadlines.append(settlement_end + 1)
+
+    if channel_state.deposit_transaction_queue:
+        transaction_block_number = channel_state.deposit_transaction_queue[0].block_number
+        confirmation_block = transaction_block_number + DEFAULT_NUMBER_OF_CONFIRMATIONS_BLOCK
+        deadlines.append(confirmation_block + 1)
+
+    if not deadlines:
+        return None
+
+    return max(min(deadlines), block_number + 1)
+
+
 def is_lock_locked(end_state, secrethash):
     """True if the `secrethash` is for a lock with an unknown secret."""
     return secrethash in end_state.secrethashes_to_lockedlocks
@@ -114,7 +140,7 @@ def is_valid_signature(balance_proof, sender_address):
     try:
         # ValueError is raised if the PublicKey instantiation failed, let it
         # propagate because it's a memory pressure problem
-        publickey = recover_publickey(
+        signer_address = recover_address(
             data_that_was_signed,
             balance_proof.signature,
         )
@@ -124,7 +150,7 @@ def is_valid_signature(balance_proof, sender_address):
         msg = 'Signature invalid, could not be recovered.'
         return (False, msg)
 
-    is_correct_sender = sender_address == publickey_to_address(publickey)
+    is_correct_sender = sender_address == signer_address
     if is_correct_sender:
         return (True, None)
 
@@ -490,14 +516,19 @@ def get_distributable(sender, receiver):
 
 def get_known_unlocks(end_state):
     """Generate unlocking proofs for the known secrets."""
+    partialproofs = list(end_state.secrethashes_to_unlockedlocks.values())
+    merkle_proofs = compute_merkleproofs_for(
+        end_state.merkletree,
+        [partialproof.lock.lockhash for partialproof in partialproofs],
+    )
 
     return [
-        compute_proof_for_lock(
-            end_state,
+        UnlockProofState(
+            merkle_proof,
+            partialproof.lock.encoded,
             partialproof.secret,
-            partialproof.lock,
         )
-        for partialproof in end_state.secrethashes_to_unlockedlocks.values()
+        for partialproof, merkle_proof in zip(partialproofs, merkle_proofs)
     ]
 
 
@@ -630,11 +661,8 @@ def compute_merkletree_with(
     # Use None to inform the caller the lockshash is already known
     result = None
 
-    leaves = merkletree.layers[LEAVES]
-    if lockhash not in leaves:
-        leaves = list(leaves)
-        leaves.append(lockhash)
-        result = MerkleTreeState(compute_layers(leaves))
+    if not is_leaf(merkletree.layers, lockhash):
+        result = MerkleTreeState(compute_layers_with(merkletree.layers, lockhash))
 
     return result
 
@@ -643,13 +671,9 @@ def compute_merkletree_without(merkletree, lockhash):
     # Use None to inform the caller the lockshash is unknown
     result = None
 
-    leaves = merkletree.layers[LEAVES]
-    if lockhash in leaves:
-        leaves = list(leaves)
-        leaves.remove(lockhash)
-
-        if leaves:
-            result = MerkleTreeState(compute_layers(leaves))
+    if is_leaf(merkletree.layers, lockhash):
+        if len(merkletree.layers[LEAVES]) > 1:
+            result = MerkleTreeState(compute_layers_without(merkletree.layers, lockhash))
         else:
             result = EMPTY_MERKLE_TREE
 
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import heapq
+
+from raiden.transfer import channel
+from raiden.transfer.mediated_transfer import mediator, target
+from raiden.transfer.state import PaymentMappingState
+
+# Block deadlines
+# ---------------
+#
+# Only a few channels and payment tasks have work to do on a given block: a
+# closed channel waiting for the end of the settlement period, a deposit
+# waiting for confirmations, a lock about to expire. Instead of dispatching
+# every `Block` to every channel and task, the node keeps a heap of the next
+# block at which each of them may change.
+#
+# Entries are invalidated lazily, `scheduled` has the current deadline of
+# every key and the heap entries that don't match it are skipped. The
+# deadlines are recomputed for every channel and task touched by a
+# transition, see `PathCopy.touched_channels` and `PathCopy.touched_tasks`.
+#
+# The index is derived from the node state. It is not part of the binary
+# serialization schema and is rebuilt after a restore or when whole networks
+# are added, since their channels were not touched by a transition.
+#
+# Copying the index on every Block would make the dispatch linear in the
+# number of channels and tasks again, so a single index is shared by the
+# successive node states and updated in place. `owner` is the only state the
+# index is consistent with, it is None while a transition updates it and
+# handed to the new state once the transition succeeded. An index used with
+# any other state, e.g. a transition applied to an older state or after a
+# failed transition, is rebuilt. The index is never serialized, a copy
+# restored from a snapshot has no owner.
+
+
+class BlockDeadlines:
+    """ Heap of (block_number, key) entries, where key identifies a channel
+    with ('channel', payment_network_identifier, token_address,
+    channel_identifier) or a payment task with ('task', secrethash).
+    """
+
+    __slots__ = (
+        'heap',
+        'owner',
+        'scheduled',
+    )
+
+    def __init__(self, heap=None, scheduled=None):
+        self.heap = heap if heap is not None else list()
+        self.scheduled = scheduled if scheduled is not None else dict()
+        self.owner = None
+
+    def __repr__(self):
+        return '<BlockDeadlines scheduled:{}>'.format(len(self.scheduled))
+
+    def __reduce__(self):
+        # Copies and snapshots don't carry the index, it is rebuilt
+        return (BlockDeadlines, ())
+
+
+def channel_key(payment_network_identifier, token_address, channel_identifier):
+    return ('channel', payment_network_identifier, token_address, channel_identifier)
+
+
+def task_key(secrethash):
+    return ('task', secrethash)
+
+
+def schedule(deadlines, key, block_number):
+    """ Set the deadline of `key`, None removes it. """
+    if block_number is None:
+        deadlines.scheduled.pop(key, None)
+    elif deadlines.scheduled.get(key) != block_number:
+        deadlines.scheduled[key] = block_number
+        heapq.heappush(deadlines.heap, (block_number, key))
+
+
+def pop_due(deadlines, block_number):
+    """ Remove and return the keys with a deadline up to `block_number`. """
+    heap = deadlines.heap
+    scheduled = deadlines.scheduled
+
+    due = list()
+    while heap and heap[0][0] <= block_number:
+        deadline, key = heapq.heappop(heap)
+
+        if scheduled.get(key) == deadline:
+            del scheduled[key]
+            due.append(key)
+
+    return due
+
+
+def get_channel_state(node_state, key):
+    _, payment_network_identifier, token_address, channel_identifier = key
+
+    payment_network = node_state.identifiers_to_paymentnetworks.get(payment_network_identifier)
+    if payment_network is None:
+        return None
+
+    token_network = payment_network.tokenaddresses_to_tokennetworks.get(token_address)
+    if token_network is None:
+        return None
+
+    return token_network.channelidentifiers_to_channels.get(channel_identifier)
+
+
+def get_channel_deadline(node_state, key):
+    channel_state = get_channel_state(node_state, key)
+
+    if channel_state is None:
+        return None
+
+    return channel.get_block_deadline(channel_state, node_state.block_number)
+
+
+def get_task_deadline(node_state, secrethash):
+    sub_task = node_state.payment_mapping.secrethashes_to_task.get(secrethash)
+
+    # The initiator doesn't handle blocks
+    if sub_task is None or isinstance(sub_task, PaymentMappingState.InitiatorTask):
+        return None
+
+    payment_network = node_state.identifiers_to_paymentnetworks.get(
+        sub_task.payment_network_identifier,
+    )
+    token_network = None
+    if payment_network is not None:
+        token_network = payment_network.tokenaddresses_to_tokennetworks.get(
+            sub_task.token_address,
+        )
+
+    if token_network is None:
+        return None
+
+    channelidentifiers_to_channels = token_network.channelidentifiers_to_channels
+
+    if isinstance(sub_task, PaymentMappingState.MediatorTask):
+        return mediator.get_block_deadline(
+            sub_task.mediator_state,
+            channelidentifiers_to_channels,
+            node_state.block_number,
+        )
+
+    channel_state = channelidentifiers_to_channels.get(sub_task.channel_identifier)
+    if channel_state is None:
+        return None
+
+    return target.get_block_deadline(
+        sub_task.target_state,
+        channel_state,
+        node_state.block_number,
+    )
+
+
+def build(node_state):
+    """ Return the deadlines of all the channels and payment tasks, relative
+    to `node_state.block_number`.
+    """
+    deadlines = BlockDeadlines()
+
+    payment_networks = node_state.identifiers_to_paymentnetworks.items()
+    for payment_network_identifier, payment_network in payment_networks:
+        token_networks = payment_network.tokenaddresses_to_tokennetworks.items()
+        for token_address, token_network in token_networks:
+            for channel_identifier in token_network.channelidentifiers_to_channels:
+                key = channel_key(payment_network_identifier, token_address, channel_identifier)
+                schedule(deadlines, key, get_channel_deadline(node_state, key))
+
+    for secrethash in node_state.payment_mapping.secrethashes_to_task:
+        schedule(deadlines, task_key(secrethash), get_task_deadline(node_state, secrethash))
+
+    return deadlines
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import sys
+from array import array
+
+from raiden.utils import typing
+
+# Channel graph
+# -------------
+#
+# The graph of the channels of a token network is part of the node state, it
+# is copied by every state change that adds or removes a channel and it is
+# stored with the snapshots. A networkx graph keeps a dictionary per node and
+# per edge, which makes it large and slow to copy.
+#
+# The addresses are interned as indexes, in the order they were added, and
+# each node has an array with the indexes of its neighbors. A copy shares the
+# arrays with the original, an array is copied the first time a graph
+# changes it (copy on write). Indexes are never reused, a node stays in the
+# graph after its last channel was removed.
+
+# unsigned 32 bits, see array.array
+INDEX_TYPECODE = 'L' if array('L').itemsize == 4 else 'I'
+
+
+class ChannelGraph:
+    """ An undirected graph of the channels of a token network. """
+
+    __slots__ = (
+        'addresses',
+        'indexes',
+        'adjacency',
+        'owned',
+    )
+
+    def __init__(self, edge_list=None):
+        self.addresses = list()
+        self.indexes = dict()
+        self.adjacency = list()
+
+        # indexes of the arrays that are not shared with a copy
+        self.owned = set()
+
+        if edge_list is not None:
+            for first, second in edge_list:
+                self.add_edge(first, second)
+
+    def __repr__(self):
+        return '<ChannelGraph nodes:{} edges:{}>'.format(
+            len(self.addresses),
+            self.number_of_edges(),
+        )
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, address):
+        return address in self.indexes
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ChannelGraph) and
+            set(self.addresses) == set(other.addresses) and
+            set(map(frozenset, self.edges())) == set(map(frozenset, other.edges()))
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __reduce__(self):
+        # Pickled as the packed edge list, an array per node is slow to pickle
+        return (ChannelGraph.from_packed, self.to_packed())
+
+    def copy(self) -> 'ChannelGraph':
+        """ Returns a copy that shares the adjacency arrays until they are
+        changed.
+        """
+        result = ChannelGraph()
+        result.addresses = list(self.addresses)
+        result.indexes = dict(self.indexes)
+        result.adjacency = list(self.adjacency)
+
+        self.owned = set()
+        return result
+
+    def add_node(self, address: typing.Address) -> int:
+        """ Returns the index of `address`, adding it if necessary. """
+        index = self.indexes.get(address)
+
+        if index is None:
+            index = len(self.addresses)
+            self.addresses.append(address)
+            self.indexes[address] = index
+            self.adjacency.append(array(INDEX_TYPECODE))
+            self.owned.add(index)
+
+        return index
+
+    def _owned_neighbors(self, index):
+        if index not in self.owned:
+            self.adjacency[index] = array(INDEX_TYPECODE, self.adjacency[index])
+            self.owned.add(index)
+
+        return self.adjacency[index]
+
+    def add_edge(self, first: typing.Address, second: typing.Address):
+        first_index = self.add_node(first)
+        second_index = self.add_node(second)
+
+        if second_index not in self.adjacency[first_index]:
+            self._owned_neighbors(first_index).append(second_index)
+            self._owned_neighbors(second_index).append(first_index)
+
+    def remove_edge(self, first: typing.Address, second: typing.Address):
+        """ Removes the channel, the nodes are kept. """
+        first_index = self.indexes.get(first)
+        second_index = self.indexes.get(second)
+
+        if first_index is None or second_index is None:
+            return
+
+        if second_index in self.adjacency[first_index]:
+            self._owned_neighbors(first_index).remove(second_index)
+            self._owned_neighbors(second_index).remove(first_index)
+
+    def has_edge(self, first: typing.Address, second: typing.Address) -> bool:
+        first_index = self.indexes.get(first)
+        second_index = self.indexes.get(second)
+
+        return (
+            first_index is not None and
+            second_index is not None and
+            second_index in self.adjacency[first_index]
+        )
+
+    def nodes(self) -> typing.List[typing.Address]:
+        return list(self.addresses)
+
+    def neighbors(self, address: typing.Address) -> typing.List[typing.Address]:
+        addresses = self.addresses
+        return [addresses[index] for index in self.adjacency[self.indexes[address]]]
+
+    def edges(self) -> typing.List[typing.Tuple[typing.Address, typing.Address]]:
+        """ Returns every channel once. """
+        addresses = self.addresses
+        return [
+            (addresses[index], addresses[neighbor])
+            for index, neighbors in enumerate(self.adjacency)
+            for neighbor in neighbors
+            if index < neighbor
+        ]
+
+    def number_of_edges(self) -> int:
+        return sum(len(neighbors) for neighbors in self.adjacency) // 2
+
+    def to_packed(self):
+        """ Returns the addresses and the index pairs of the channels as
+        little endian bytes.
+        """
+        edge_indexes = array(INDEX_TYPECODE)
+        for index, neighbors in enumerate(self.adjacency):
+            for neighbor in neighbors:
+                if index < neighbor:
+                    edge_indexes.append(index)
+                    edge_indexes.append(neighbor)
+
+        if sys.byteorder != 'little':
+            edge_indexes.byteswap()
+
+        return list(self.addresses), edge_indexes.tobytes()
+
+    @classmethod
+    def from_packed(cls, addresses, edge_bytes):
+        """ The inverse of `to_packed`. """
+        result = cls()
+
+        for address in addresses:
+            result.add_node(address)
+
+        edge_indexes = array(INDEX_TYPECODE)
+        edge_indexes.frombytes(edge_bytes)
+        if sys.byteorder != 'little':
+            edge_indexes.byteswap()
+
+        adjacency = result.adjacency
+        for position in range(0, len(edge_indexes), 2):
+            first_index = edge_indexes[position]
+            second_index = edge_indexes[position + 1]
+            adjacency[first_index].append(second_index)
+            adjacency[second_index].append(first_index)
+
+        return result
@@ -217,6 +217,36 @@ def get_pending_transfer_pairs(transfers_pair):
     return pending_pairs
 
 
+def get_block_deadline(state, channelidentifiers_to_channels, block_number):
+    """ Return the first block after `block_number` for which `handle_block`
+    can emit events, i.e. a payer channel entering the unsafe region or a
+    lock expiring, or None if there is none.
+    """
+    deadlines = list()
+
+    for pair in get_pending_transfer_pairs(state.transfers_pair):
+        payer_expiration = pair.payer_transfer.lock.expiration
+        payer_channel = channelidentifiers_to_channels.get(
+            pair.payer_transfer.balance_proof.channel_address,
+        )
+
+        if payer_channel is not None:
+            deadlines.append(payer_expiration - payer_channel.reveal_timeout)
+        else:
+            deadlines.append(block_number + 1)
+
+        if pair.payee_state != 'payee_expired':
+            deadlines.append(pair.payee_transfer.lock.expiration + 1)
+
+        if pair.payer_state != 'payer_expired':
+            deadlines.append(payer_expiration + 1)
+
+    if not deadlines:
+        return None
+
+    return max(min(deadlines), block_number + 1)
+
+
 def get_timeout_blocks(settle_timeout, closed_block_number, payer_lock_expiration, block_number):
     """ Return the timeout blocks, it's the base value from which the payees
     lock timeout must be computed.
@@ -44,6 +44,29 @@ def events_for_close(target_state, channel_state, block_number):
     return list()
 
 
+def get_block_deadline(target_state, channel_state, block_number):
+    """ Return the first block after `block_number` for which `handle_block`
+    can emit events, or None if there is none.
+    """
+    transfer = target_state.transfer
+    secret_known = channel.is_secret_known(
+        channel_state.partner_state,
+        transfer.lock.secrethash,
+    )
+
+    deadlines = list()
+    if not secret_known:
+        deadlines.append(transfer.lock.expiration + 1)
+
+    if target_state.state != 'waiting_close':
+        deadlines.append(transfer.lock.expiration - channel_state.reveal_timeout)
+
+    if not deadlines:
+        return None
+
+    return max(min(deadlines), block_number + 1)
+
+
 def handle_inittarget(
         state_change,
         channel_state,
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from bisect import bisect_left
+
 from raiden.utils import split_in_pairs
 from raiden.exceptions import HashLengthNot32
 from raiden.utils import sha3
@@ -61,32 +63,166 @@ def compute_layers(elements):
     return tree
 
 
-def compute_merkleproof_for(merkletree, element):
-    """ Containment proof for element.
+def _validate_element(element):
+    if not isinstance(element, (str, bytes)):
+        raise ValueError('all elements must be str')
 
-    The proof contains only the entries that are sufficient to recompute the
-    merkleroot, from the leaf `element` up to `root`.
+    if len(element) != 32:
+        raise HashLengthNot32()
+
+
+def _update_layers(layers, leaves, start):
+    """ Computes the layers for the new `leaves`, knowing that only the
+    leaves from the index `start` on differ from the leaves of `layers`.
+
+    The leaves are sorted, so adding or removing an element shifts all the
+    elements after it and changes their pairs. The nodes before the first
+    changed pair are reused, the rest of each layer is rehashed.
+    """
+    tree = [leaves]
+
+    layer = leaves
+    height = 1
+    while len(layer) > 1:
+        # the first pair that includes a changed element
+        start = start - start % 2
+
+        if height < len(layers):
+            parent = layers[height][:start // 2]
+        else:
+            parent = list()
+
+        parent.extend(
+            hash_pair(layer[position], layer[position + 1] if position + 1 < len(layer) else None)
+            for position in range(start, len(layer), 2)
+        )
+        tree.append(parent)
+
+        layer = parent
+        start = start // 2
+        height += 1
+
+    return tree
+
+
+def is_leaf(layers, element):
+    """ True if `element` is one of the leaves, the leaves are sorted. """
+    leaves = layers[LEAVES]
+    index = bisect_left(leaves, element)
+    return index < len(leaves) and leaves[index] == element
+
+
+def compute_layers_with(layers, element):
+    """ Computes the layers of the merkletree with `element` added to the
+    leaves, rehashing only the nodes that changed. The result is equal to
+    `compute_layers` of the new leaves.
+
+    `layers` is not modified.
 
     Raises:
-        IndexError: If the element is not part of the merkletree.
+        ValueError: If `element` is already a leaf.
     """
-    idx = merkletree.layers[LEAVES].index(element)
+    _validate_element(element)
+
+    leaves = layers[LEAVES]
+    index = bisect_left(leaves, element)
+
+    if index < len(leaves) and leaves[index] == element:
+        raise ValueError('Duplicated element')
+
+    new_leaves = list(leaves)
+    new_leaves.insert(index, element)
+
+    return _update_layers(layers, new_leaves, index)
+
+
+def compute_layers_without(layers, element):
+    """ Computes the layers of the merkletree with `element` removed from the
+    leaves, rehashing only the nodes that changed. The result is equal to
+    `compute_layers` of the new leaves.
 
-    proof = []
+    `layers` is not modified, and must have at least two leaves, use
+    EMPTY_MERKLE_TREE when the last element is removed.
+
+    Raises:
+        ValueError: If `element` is not a leaf.
+    """
+    leaves = layers[LEAVES]
+    assert len(leaves) > 1, 'Use EMPTY_MERKLE_TREE if there are no elements'
+
+    index = bisect_left(leaves, element)
+
+    if index == len(leaves) or leaves[index] != element:
+        raise ValueError('Unknown element')
+
+    new_leaves = list(leaves)
+    del new_leaves[index]
+
+    return _update_layers(layers, new_leaves, index)
+
+
+def get_leaves_to_index(merkletree):
+    """ Return the mapping from leaf to its position in the leaves. """
+    leaves_to_index = getattr(merkletree, 'leaves_to_index', None)
+
+    if leaves_to_index is None:
+        leaves_to_index = {
+            leaf: position
+            for position, leaf in enumerate(merkletree.layers[LEAVES])
+        }
+        merkletree.leaves_to_index = leaves_to_index
+
+    return leaves_to_index
+
+
+def compute_merkleproofs_for(merkletree, elements):
+    """ Containment proofs for all the `elements`, computed with a single
+    pass over the layers.
+
+    Raises:
+        ValueError: If an element is not part of the merkletree.
+    """
+    leaves_to_index = get_leaves_to_index(merkletree)
+
+    indexes = list()
+    for element in elements:
+        idx = leaves_to_index.get(element)
+
+        if idx is None:
+            raise ValueError('{!r} is not part of the merkletree'.format(element))
+
+        indexes.append(idx)
+
+    proofs = [list() for _ in indexes]
     for layer in merkletree.layers:
-        if idx % 2:
-            pair = idx - 1
-        else:
-            pair = idx + 1
+        layer_length = len(layer)
+
+        for proof, idx in zip(proofs, indexes):
+            if idx % 2:
+                pair = idx - 1
+            else:
+                pair = idx + 1
 
-        # with an odd number of elements the rightmost one does not have a pair.
-        if pair < len(layer):
-            proof.append(layer[pair])
+            # with an odd number of elements the rightmost one does not have a pair.
+            if pair < layer_length:
+                proof.append(layer[pair])
 
         # the tree is binary and balanced
-        idx = idx // 2
+        indexes = [idx // 2 for idx in indexes]
+
+    return proofs
+
 
-    return proof
+def compute_merkleproof_for(merkletree, element):
+    """ Containment proof for element.
+
+    The proof contains only the entries that are sufficient to recompute the
+    merkleroot, from the leaf `element` up to `root`.
+
+    Raises:
+        ValueError: If the element is not part of the merkletree.
+    """
+    return compute_merkleproofs_for(merkletree, [element])[0]
 
 
 def validate_proof(proof, root, leaf_element):
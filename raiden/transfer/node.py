@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 from raiden.transfer import (
     channel,
+    deadlines,
     token_network,
-    views,
 )
 from raiden.transfer.mediated_transfer import (
     initiator_manager,
@@ -13,6 +13,7 @@ from raiden.transfer.architecture import (
     SendMessageEvent,
     TransitionResult,
 )
+from raiden.transfer.path_copy import PathCopy
 from raiden.transfer.state import (
     NodeState,
     PaymentMappingState,
@@ -72,36 +73,58 @@ def get_token_network(node_state, payment_network_identifier, token_address):
     return token_network_state
 
 
-def subdispatch_to_all_channels(node_state, state_change, block_number):
+def subdispatch_to_channel(path_copy, state_change, key, block_number):
+    node_state = path_copy.node_state
+    _, payment_network_identifier, token_address, channel_identifier = key
     events = list()
 
-    for payment_network in node_state.identifiers_to_paymentnetworks.values():
-        for token_network_state in payment_network.tokenaddresses_to_tokennetworks.values():
-            for channel_state in token_network_state.channelidentifiers_to_channels.values():
-                result = channel.state_transition(
-                    channel_state,
-                    state_change,
-                    node_state.pseudo_random_generator,
-                    block_number,
-                )
-                events.extend(result.events)
+    token_network_state = path_copy.token_network(payment_network_identifier, token_address)
+    channel_state = None
+    if token_network_state is not None:
+        channel_state = path_copy.channel(token_network_state, channel_identifier)
+
+    if channel_state is not None:
+        result = channel.state_transition(
+            channel_state,
+            state_change,
+            node_state.pseudo_random_generator,
+            block_number,
+        )
+        events.extend(result.events)
 
     return TransitionResult(node_state, events)
 
 
-def subdispatch_to_all_lockedtransfers(node_state, state_change):
-    events = list()
+def update_block_deadlines(path_copy):
+    """ Recompute the block deadlines of the channels and payment tasks
+    touched by the transition.
+    """
+    node_state = path_copy.node_state
 
-    for secrethash in node_state.payment_mapping.secrethashes_to_task.keys():
-        result = subdispatch_to_paymenttask(node_state, state_change, secrethash)
-        events.extend(result.events)
+    if not path_copy.touched_channels and not path_copy.touched_tasks:
+        return
 
-    return TransitionResult(node_state, events)
+    block_deadlines = path_copy.block_deadlines()
+    if block_deadlines is None:
+        return
+
+    for channel_path in path_copy.touched_channels:
+        key = deadlines.channel_key(*channel_path)
+        deadlines.schedule(block_deadlines, key, deadlines.get_channel_deadline(node_state, key))
+
+    for secrethash in path_copy.touched_tasks:
+        key = deadlines.task_key(secrethash)
+        deadlines.schedule(
+            block_deadlines,
+            key,
+            deadlines.get_task_deadline(node_state, secrethash),
+        )
 
 
-def subdispatch_to_paymenttask(node_state, state_change, secrethash):
+def subdispatch_to_paymenttask(path_copy, state_change, secrethash):
+    node_state = path_copy.node_state
     block_number = node_state.block_number
-    sub_task = node_state.payment_mapping.secrethashes_to_task.get(secrethash)
+    sub_task = path_copy.payment_task(secrethash)
     events = list()
 
     if sub_task:
@@ -111,17 +134,16 @@ def subdispatch_to_paymenttask(node_state, state_change, secrethash):
             payment_network_identifier = sub_task.payment_network_identifier
             token_address = sub_task.token_address
 
-            token_network_state = get_token_network(
-                node_state,
+            channel_map = path_copy.channel_map(
                 payment_network_identifier,
                 token_address,
             )
 
-            if token_network_state:
+            if channel_map is not None:
                 sub_iteration = initiator_manager.state_transition(
                     sub_task.manager_state,
                     state_change,
-                    token_network_state.channelidentifiers_to_channels,
+                    channel_map,
                     pseudo_random_generator,
                     block_number,
                 )
@@ -131,17 +153,16 @@ def subdispatch_to_paymenttask(node_state, state_change, secrethash):
             payment_network_identifier = sub_task.payment_network_identifier
             token_address = sub_task.token_address
 
-            token_network_state = get_token_network(
-                node_state,
+            channel_map = path_copy.channel_map(
                 payment_network_identifier,
                 token_address,
             )
 
-            if token_network_state:
+            if channel_map is not None:
                 sub_iteration = mediator.state_transition(
                     sub_task.mediator_state,
                     state_change,
-                    token_network_state.channelidentifiers_to_channels,
+                    channel_map,
                     pseudo_random_generator,
                     block_number,
                 )
@@ -152,12 +173,13 @@ def subdispatch_to_paymenttask(node_state, state_change, secrethash):
             token_address = sub_task.token_address
             channel_identifier = sub_task.channel_identifier
 
-            channel_state = views.get_channelstate_by_tokenaddress(
-                node_state,
+            channel_state = None
+            token_network_state = path_copy.token_network(
                 payment_network_identifier,
                 token_address,
-                channel_identifier,
             )
+            if token_network_state:
+                channel_state = path_copy.channel(token_network_state, channel_identifier)
 
             if channel_state:
                 sub_iteration = target.state_transition(
@@ -173,14 +195,15 @@ def subdispatch_to_paymenttask(node_state, state_change, secrethash):
 
 
 def subdispatch_initiatortask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
         secrethash):
 
+    node_state = path_copy.node_state
     block_number = node_state.block_number
-    sub_task = node_state.payment_mapping.secrethashes_to_task.get(secrethash)
+    sub_task = path_copy.payment_task(secrethash)
 
     if not sub_task:
         is_valid_subtask = True
@@ -199,15 +222,14 @@ def subdispatch_initiatortask(
     if is_valid_subtask:
         pseudo_random_generator = node_state.pseudo_random_generator
 
-        token_network_state = get_token_network(
-            node_state,
+        channel_map = path_copy.channel_map(
             payment_network_identifier,
             token_address,
         )
         iteration = initiator_manager.state_transition(
             manager_state,
             state_change,
-            token_network_state.channelidentifiers_to_channels,
+            channel_map,
             pseudo_random_generator,
             block_number,
         )
@@ -219,20 +241,21 @@ def subdispatch_initiatortask(
                 token_address,
                 iteration.new_state,
             )
-            node_state.payment_mapping.secrethashes_to_task[secrethash] = sub_task
+            path_copy.set_payment_task(secrethash, sub_task)
 
     return TransitionResult(node_state, events)
 
 
 def subdispatch_mediatortask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
         secrethash):
 
+    node_state = path_copy.node_state
     block_number = node_state.block_number
-    sub_task = node_state.payment_mapping.secrethashes_to_task.get(secrethash)
+    sub_task = path_copy.payment_task(secrethash)
 
     if not sub_task:
         is_valid_subtask = True
@@ -249,8 +272,7 @@ def subdispatch_mediatortask(
 
     events = list()
     if is_valid_subtask:
-        token_network_state = get_token_network(
-            node_state,
+        channel_map = path_copy.channel_map(
             payment_network_identifier,
             token_address,
         )
@@ -259,7 +281,7 @@ def subdispatch_mediatortask(
         iteration = mediator.state_transition(
             mediator_state,
             state_change,
-            token_network_state.channelidentifiers_to_channels,
+            channel_map,
             pseudo_random_generator,
             block_number,
         )
@@ -271,21 +293,22 @@ def subdispatch_mediatortask(
                 token_address,
                 iteration.new_state,
             )
-            node_state.payment_mapping.secrethashes_to_task[secrethash] = sub_task
+            path_copy.set_payment_task(secrethash, sub_task)
 
     return TransitionResult(node_state, events)
 
 
 def subdispatch_targettask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
         channel_identifier,
         secrethash):
 
+    node_state = path_copy.node_state
     block_number = node_state.block_number
-    sub_task = node_state.payment_mapping.secrethashes_to_task.get(secrethash)
+    sub_task = path_copy.payment_task(secrethash)
 
     if not sub_task:
         is_valid_subtask = True
@@ -303,12 +326,12 @@ def subdispatch_targettask(
     events = list()
     channel_state = None
     if is_valid_subtask:
-        channel_state = views.get_channelstate_by_tokenaddress(
-            node_state,
+        token_network_state = path_copy.token_network(
             payment_network_identifier,
             token_address,
-            channel_identifier,
         )
+        if token_network_state:
+            channel_state = path_copy.channel(token_network_state, channel_identifier)
 
     if channel_state:
         pseudo_random_generator = node_state.pseudo_random_generator
@@ -329,12 +352,13 @@ def subdispatch_targettask(
                 channel_identifier,
                 iteration.new_state,
             )
-            node_state.payment_mapping.secrethashes_to_task[secrethash] = sub_task
+            path_copy.set_payment_task(secrethash, sub_task)
 
     return TransitionResult(node_state, events)
 
 
-def maybe_add_tokennetwork(node_state, payment_network_identifier, token_network_state):
+def maybe_add_tokennetwork(path_copy, payment_network_identifier, token_network_state):
+    node_state = path_copy.node_state
     token_network_identifier = token_network_state.address
     token_address = token_network_state.token_address
 
@@ -350,40 +374,62 @@ def maybe_add_tokennetwork(node_state, payment_network_identifier, token_network
             [token_network_state],
         )
 
-        ids_to_payments = node_state.identifiers_to_paymentnetworks
+        ids_to_payments = path_copy.own_attribute(node_state, 'identifiers_to_paymentnetworks')
         ids_to_payments[payment_network_identifier] = payment_network_state
+        path_copy.invalidate_block_deadlines()
 
     elif token_network_state_previous is None:
-        ids_to_tokens = payment_network_state.tokenidentifiers_to_tokennetworks
-        addrs_to_tokens = payment_network_state.tokenaddresses_to_tokennetworks
+        payment_network_state = path_copy.payment_network(payment_network_identifier)
+        ids_to_tokens = path_copy.own_attribute(
+            payment_network_state,
+            'tokenidentifiers_to_tokennetworks',
+        )
+        addrs_to_tokens = path_copy.own_attribute(
+            payment_network_state,
+            'tokenaddresses_to_tokennetworks',
+        )
 
         ids_to_tokens[token_network_identifier] = token_network_state
         addrs_to_tokens[token_address] = token_network_state
+        path_copy.invalidate_block_deadlines()
 
 
 def sanity_check(iteration):
     assert isinstance(iteration.new_state, NodeState)
 
 
-def handle_block(node_state, state_change):
+def handle_block(path_copy, state_change):
+    node_state = path_copy.node_state
     block_number = state_change.block_number
+
+    # Subdispatch Block state change, only to the channels and payment tasks
+    # with a deadline
+    block_deadlines = path_copy.block_deadlines()
+    if block_deadlines is None:
+        # The deadlines must be computed relative to the previous block
+        block_deadlines = path_copy.own(deadlines.build(node_state))
+        node_state.block_deadlines = block_deadlines
+
     node_state.block_number = block_number
 
-    # Subdispatch Block state change
-    channels_result = subdispatch_to_all_channels(
-        node_state,
-        state_change,
-        block_number,
-    )
-    transfers_result = subdispatch_to_all_lockedtransfers(
-        node_state,
-        state_change,
-    )
-    events = channels_result.events + transfers_result.events
+    due = deadlines.pop_due(block_deadlines, block_number)
+
+    # The channels are handled before the payment tasks
+    events = list()
+    for key in due:
+        if key[0] == 'channel':
+            result = subdispatch_to_channel(path_copy, state_change, key, block_number)
+            events.extend(result.events)
+
+    for key in due:
+        if key[0] == 'task':
+            result = subdispatch_to_paymenttask(path_copy, state_change, key[1])
+            events.extend(result.events)
+
     return TransitionResult(node_state, events)
 
 
-def handle_node_init(node_state, state_change):
+def handle_node_init(state_change):
     node_state = NodeState(
         state_change.pseudo_random_generator,
         state_change.block_number,
@@ -392,11 +438,12 @@ def handle_node_init(node_state, state_change):
     return TransitionResult(node_state, events)
 
 
-def handle_token_network_action(node_state, state_change):
+def handle_token_network_action(path_copy, state_change):
+    node_state = path_copy.node_state
     token_address = state_change.token_address
-    payment_network_state, token_network_state = get_networks(
-        node_state,
-        state_change.payment_network_identifier,
+    payment_network_identifier = state_change.payment_network_identifier
+    token_network_state = path_copy.token_network(
+        payment_network_identifier,
         token_address,
     )
 
@@ -408,47 +455,74 @@ def handle_token_network_action(node_state, state_change):
             state_change,
             pseudo_random_generator,
             node_state.block_number,
+            path_copy,
         )
 
         if iteration.new_state is None:
-            del payment_network_state.tokenaddresses_to_tokennetworks[token_address]
+            payment_network_state = path_copy.payment_network(payment_network_identifier)
+            addrs_to_tokens = path_copy.own_attribute(
+                payment_network_state,
+                'tokenaddresses_to_tokennetworks',
+            )
+            del addrs_to_tokens[token_address]
 
         events = iteration.events
 
     return TransitionResult(node_state, events)
 
 
-def handle_new_token_network(node_state, state_change):
+def handle_new_token_network(path_copy, state_change):
+    node_state = path_copy.node_state
     events = list()
 
     token_network_state = state_change.token_network
     payment_network_identifier = state_change.payment_network_identifier
-    payment_network = node_state.identifiers_to_paymentnetworks.get(payment_network_identifier)
+    payment_network = path_copy.payment_network(payment_network_identifier)
 
     if payment_network is not None:
-        tokens_to_networks = payment_network.tokenidentifiers_to_tokennetworks
+        tokens_to_networks = path_copy.own_attribute(
+            payment_network,
+            'tokenidentifiers_to_tokennetworks',
+        )
         tokens_to_networks[token_network_state.address] = token_network_state
 
     # TODO: add ContractSend
     return TransitionResult(node_state, events)
 
 
-def handle_node_change_network_state(node_state, state_change):
+def handle_node_change_network_state(path_copy, state_change):
+    node_state = path_copy.node_state
     events = list()
 
     node_address = state_change.node_address
     network_state = state_change.network_state
-    node_state.nodeaddresses_to_networkstates[node_address] = network_state
+    addresses_to_networkstates = path_copy.own_attribute(
+        node_state,
+        'nodeaddresses_to_networkstates',
+    )
+    addresses_to_networkstates[node_address] = network_state
 
     return TransitionResult(node_state, events)
 
 
-def handle_leave_all_networks(node_state):
+def handle_leave_all_networks(path_copy):
+    node_state = path_copy.node_state
     events = list()
 
-    for payment_network_state in node_state.identifiers_to_paymentnetworks.values():
-        for token_network_state in payment_network_state.tokenaddresses_to_tokennetworks.values():
-            for channel_state in token_network_state.partneraddresses_to_channels.values():
+    payment_networks = list(node_state.identifiers_to_paymentnetworks.items())
+    for payment_network_identifier, payment_network_state in payment_networks:
+        token_addresses = list(payment_network_state.tokenaddresses_to_tokennetworks.keys())
+        for token_address in token_addresses:
+            token_network_state = path_copy.token_network(
+                payment_network_identifier,
+                token_address,
+            )
+            partner_addresses = list(token_network_state.partneraddresses_to_channels.keys())
+            for partner_address in partner_addresses:
+                channel_state = path_copy.channel_by_partner(
+                    token_network_state,
+                    partner_address,
+                )
                 events.extend(channel.events_for_close(
                     channel_state,
                     node_state.block_number,
@@ -457,21 +531,25 @@ def handle_leave_all_networks(node_state):
     return TransitionResult(node_state, events)
 
 
-def handle_new_payment_network(node_state, state_change):
+def handle_new_payment_network(path_copy, state_change):
+    node_state = path_copy.node_state
     events = list()
 
     payment_network = state_change.payment_network
     payment_network_identifier = payment_network.address
     if payment_network_identifier not in node_state.identifiers_to_paymentnetworks:
-        node_state.identifiers_to_paymentnetworks[payment_network_identifier] = payment_network
+        ids_to_payments = path_copy.own_attribute(node_state, 'identifiers_to_paymentnetworks')
+        ids_to_payments[payment_network_identifier] = payment_network
+        path_copy.invalidate_block_deadlines()
 
     return TransitionResult(node_state, events)
 
 
-def handle_tokenadded(node_state, state_change):
+def handle_tokenadded(path_copy, state_change):
+    node_state = path_copy.node_state
     events = list()
     maybe_add_tokennetwork(
-        node_state,
+        path_copy,
         state_change.payment_network_identifier,
         state_change.token_network,
     )
@@ -479,12 +557,13 @@ def handle_tokenadded(node_state, state_change):
     return TransitionResult(node_state, events)
 
 
-def handle_channel_withdraw(node_state, state_change):
+def handle_channel_withdraw(path_copy, state_change):
+    node_state = path_copy.node_state
     token_address = state_change.token_address
-    payment_network_state, token_network_state = get_networks(
-        node_state,
-        state_change.payment_network_identifier,
-        state_change.token_address,
+    payment_network_identifier = state_change.payment_network_identifier
+    token_network_state = path_copy.token_network(
+        payment_network_identifier,
+        token_address,
     )
 
     # first dispatch the withdraw to update the channel
@@ -496,17 +575,23 @@ def handle_channel_withdraw(node_state, state_change):
             state_change,
             pseudo_random_generator,
             node_state.block_number,
+            path_copy,
         )
         events.extend(sub_iteration.events)
 
         if sub_iteration.new_state is None:
-            del payment_network_state.tokenaddresses_to_tokennetworks[token_address]
+            payment_network_state = path_copy.payment_network(payment_network_identifier)
+            addrs_to_tokens = path_copy.own_attribute(
+                payment_network_state,
+                'tokenaddresses_to_tokennetworks',
+            )
+            del addrs_to_tokens[token_address]
 
     # second emulate a secret reveal, to register the secret with all the other
     # channels and proceed with the protocol
     state_change = ReceiveSecretReveal(state_change.secret, None)
     sub_iteration_secret_reveal = handle_secret_reveal(
-        node_state,
+        path_copy,
         state_change,
     )
     events.extend(sub_iteration_secret_reveal.events)
@@ -514,22 +599,22 @@ def handle_channel_withdraw(node_state, state_change):
     return TransitionResult(node_state, events)
 
 
-def handle_secret_reveal(node_state, state_change):
+def handle_secret_reveal(path_copy, state_change):
     return subdispatch_to_paymenttask(
-        node_state,
+        path_copy,
         state_change,
         state_change.secrethash
     )
 
 
-def handle_init_initiator(node_state, state_change):
+def handle_init_initiator(path_copy, state_change):
     transfer = state_change.transfer
     secrethash = transfer.secrethash
     payment_network_identifier = state_change.payment_network_identifier
     token_address = transfer.token
 
     return subdispatch_initiatortask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
@@ -537,14 +622,14 @@ def handle_init_initiator(node_state, state_change):
     )
 
 
-def handle_init_mediator(node_state, state_change):
+def handle_init_mediator(path_copy, state_change):
     transfer = state_change.from_transfer
     secrethash = transfer.lock.secrethash
     payment_network_identifier = state_change.payment_network_identifier
     token_address = transfer.token
 
     return subdispatch_mediatortask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
@@ -552,7 +637,7 @@ def handle_init_mediator(node_state, state_change):
     )
 
 
-def handle_init_target(node_state, state_change):
+def handle_init_target(path_copy, state_change):
     transfer = state_change.transfer
     secrethash = transfer.lock.secrethash
     payment_network_identifier = state_change.payment_network_identifier
@@ -560,7 +645,7 @@ def handle_init_target(node_state, state_change):
     channel_identifier = transfer.balance_proof.channel_address
 
     return subdispatch_targettask(
-        node_state,
+        path_copy,
         state_change,
         payment_network_identifier,
         token_address,
@@ -569,171 +654,181 @@ def handle_init_target(node_state, state_change):
     )
 
 
-def handle_receive_transfer_refund(node_state, state_change):
+def handle_receive_transfer_refund(path_copy, state_change):
     return subdispatch_to_paymenttask(
-        node_state,
+        path_copy,
         state_change,
         state_change.transfer.lock.secrethash
     )
 
 
-def handle_receive_transfer_refund_cancel_route(node_state, state_change):
+def handle_receive_transfer_refund_cancel_route(path_copy, state_change):
     return subdispatch_to_paymenttask(
-        node_state,
+        path_copy,
         state_change,
         state_change.transfer.lock.secrethash
     )
 
 
-def handle_receive_secret_request(node_state, state_change):
+def handle_receive_secret_request(path_copy, state_change):
     secrethash = state_change.secrethash
-    return subdispatch_to_paymenttask(node_state, state_change, secrethash)
+    return subdispatch_to_paymenttask(path_copy, state_change, secrethash)
 
 
-def handle_receive_secret_reveal(node_state, state_change):
+def handle_receive_secret_reveal(path_copy, state_change):
     secrethash = state_change.secrethash
-    return subdispatch_to_paymenttask(node_state, state_change, secrethash)
+    return subdispatch_to_paymenttask(path_copy, state_change, secrethash)
 
 
-def handle_receive_unlock(node_state, state_change):
+def handle_receive_unlock(path_copy, state_change):
     secrethash = state_change.secrethash
-    return subdispatch_to_paymenttask(node_state, state_change, secrethash)
+    return subdispatch_to_paymenttask(path_copy, state_change, secrethash)
 
 
 def state_transition(node_state, state_change):
+    """ Apply `state_change` to `node_state`.
+
+    `node_state` is not modified, the returned state shares all the sub-trees
+    that were not touched by the state change with it. The block deadlines
+    index is handed over to the returned state, see raiden.transfer.deadlines.
+    """
     # pylint: disable=too-many-branches,unidiomatic-typecheck
+    path_copy = PathCopy(node_state)
 
     if type(state_change) == Block:
         iteration = handle_block(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionInitNode:
         iteration = handle_node_init(
-            node_state,
             state_change,
         )
     elif type(state_change) == ActionNewTokenNetwork:
         iteration = handle_new_token_network(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionChannelClose:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionChangeNodeNetworkState:
         iteration = handle_node_change_network_state(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionTransferDirect:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionLeaveAllNetworks:
         iteration = handle_leave_all_networks(
-            node_state,
+            path_copy,
         )
     elif type(state_change) == ActionInitInitiator:
         iteration = handle_init_initiator(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionInitMediator:
         iteration = handle_init_mediator(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ActionInitTarget:
         iteration = handle_init_target(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveNewPaymentNetwork:
         iteration = handle_new_payment_network(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveNewTokenNetwork:
         iteration = handle_tokenadded(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveChannelWithdraw:
         iteration = handle_channel_withdraw(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveChannelNew:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveChannelClosed:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveChannelNewBalance:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveChannelSettled:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ContractReceiveRouteNew:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveTransferDirect:
         iteration = handle_token_network_action(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveSecretReveal:
         iteration = handle_secret_reveal(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveTransferRefundCancelRoute:
         iteration = handle_receive_transfer_refund_cancel_route(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveTransferRefund:
         iteration = handle_receive_transfer_refund(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveSecretRequest:
         iteration = handle_receive_secret_request(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveSecretReveal:
         iteration = handle_receive_secret_reveal(
-            node_state,
+            path_copy,
             state_change,
         )
     elif type(state_change) == ReceiveUnlock:
         iteration = handle_receive_unlock(
-            node_state,
+            path_copy,
             state_change,
         )
 
     sanity_check(iteration)
 
-    for event in iteration.events:
-        if isinstance(event, SendMessageEvent):
-            queueid = (event.recipient, event.queue_name)
-            queue = node_state.queueids_to_queues.setdefault(queueid, [])
-            queue.append(event)
+    # handle_node_init creates a new state, there is nothing to copy
+    if iteration.new_state is path_copy.node_state:
+        update_block_deadlines(path_copy)
+        path_copy.commit_block_deadlines()
+
+        for event in iteration.events:
+            if isinstance(event, SendMessageEvent):
+                queueid = (event.recipient, event.queue_name)
+                path_copy.queue(queueid).append(event)
 
     return iteration
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+from copy import copy, deepcopy
+
+from raiden.transfer.state import TokenNetworkGraphState
+
+# Path copying
+# ------------
+#
+# `StateManager.dispatch` used to deepcopy the whole `NodeState` before every
+# transition, so that the previous state was never modified. With thousands of
+# channels this dominates the cost of a transition, even though a handler
+# touches at most a couple of channels and payment tasks.
+#
+# `PathCopy` is created once per transition. It starts with a shallow copy of
+# the `NodeState` and copies, on demand, the objects on the path from the root
+# to the sub-tree a handler is about to mutate. Everything else is shared with
+# the previous state, which must therefore still be treated as immutable.
+#
+# Only the leaves (channels and payment tasks) are deep copied. The containers
+# on the path to them (dicts and lists) are copied shallowly, exactly once per
+# transition.
+
+
+class ChannelMapView:
+    """ Mapping of channel identifiers to channels handed to the payment tasks.
+
+    The payment tasks fetch their channels by identifier and mutate them in
+    place, so every channel is copied into the new state the first time it is
+    fetched. Membership tests don't copy.
+    """
+
+    __slots__ = (
+        'path_copy',
+        'payment_network_identifier',
+        'token_address',
+    )
+
+    def __init__(self, path_copy, payment_network_identifier, token_address):
+        self.path_copy = path_copy
+        self.payment_network_identifier = payment_network_identifier
+        self.token_address = token_address
+
+    def _channels(self):
+        node_state = self.path_copy.node_state
+        payment_network = node_state.identifiers_to_paymentnetworks[
+            self.payment_network_identifier
+        ]
+        token_network = payment_network.tokenaddresses_to_tokennetworks[self.token_address]
+        return token_network.channelidentifiers_to_channels
+
+    def get(self, channel_identifier, default=None):
+        if channel_identifier not in self._channels():
+            return default
+
+        token_network_state = self.path_copy.token_network(
+            self.payment_network_identifier,
+            self.token_address,
+        )
+        return self.path_copy.channel(token_network_state, channel_identifier)
+
+    def __getitem__(self, channel_identifier):
+        if channel_identifier not in self._channels():
+            raise KeyError(channel_identifier)
+
+        return self.get(channel_identifier)
+
+    def __contains__(self, channel_identifier):
+        return channel_identifier in self._channels()
+
+    def __iter__(self):
+        return iter(list(self._channels()))
+
+    def __len__(self):
+        return len(self._channels())
+
+    def __repr__(self):
+        return '<ChannelMapView channels:{}>'.format(len(self))
+
+
+class PathCopy:
+    """ Copy-on-write helper for a single node state transition.
+
+    Args:
+        node_state: The current NodeState, it won't be modified. May be None
+            if the node was not initialized yet.
+    """
+
+    __slots__ = (
+        'node_state',
+        'owned',
+        'previous_state',
+        'token_network_paths',
+        'touched_channels',
+        'touched_tasks',
+    )
+
+    def __init__(self, node_state):
+        # Maps the id of every object that belongs exclusively to the new
+        # state to the object itself, keeping a reference makes sure the id is
+        # not reused during the transition.
+        self.owned = dict()
+        self.node_state = None
+        self.previous_state = node_state
+
+        # The channels and payment tasks that may have been changed by the
+        # transition, their block deadlines must be recomputed
+        self.token_network_paths = dict()
+        self.touched_channels = dict()
+        self.touched_tasks = dict()
+
+        if node_state is not None:
+            new_state = self.own(copy(node_state))
+
+            # The generator is used by virtually every transition
+            new_state.pseudo_random_generator = deepcopy(node_state.pseudo_random_generator)
+
+            self.node_state = new_state
+
+    def own(self, obj):
+        self.owned[id(obj)] = obj
+        return obj
+
+    def is_owned(self, obj):
+        return self.owned.get(id(obj)) is obj
+
+    def own_attribute(self, obj, attribute):
+        """ Return the container stored in `obj.attribute`, shallow copying it
+        first if it is shared with the previous state.
+
+        `obj` itself must be owned.
+        """
+        assert self.is_owned(obj), 'the parent must be copied first'
+
+        value = getattr(obj, attribute)
+        if not self.is_owned(value):
+            value = self.own(copy(value))
+            setattr(obj, attribute, value)
+
+        return value
+
+    def payment_network(self, payment_network_identifier):
+        """ Return the PaymentNetworkState copied into the new state or None. """
+        node_state = self.node_state
+        payment_network_state = node_state.identifiers_to_paymentnetworks.get(
+            payment_network_identifier,
+        )
+
+        if payment_network_state is not None and not self.is_owned(payment_network_state):
+            payment_network_state = self.own(copy(payment_network_state))
+
+            ids_to_payments = self.own_attribute(node_state, 'identifiers_to_paymentnetworks')
+            ids_to_payments[payment_network_identifier] = payment_network_state
+
+        return payment_network_state
+
+    def token_network(self, payment_network_identifier, token_address):
+        """ Return the TokenNetworkState copied into the new state or None. """
+        payment_network_state = self.payment_network(payment_network_identifier)
+
+        if payment_network_state is None:
+            return None
+
+        previous = payment_network_state.tokenaddresses_to_tokennetworks.get(token_address)
+
+        if previous is None or self.is_owned(previous):
+            return previous
+
+        token_network_state = self.own(copy(previous))
+        self.token_network_paths[id(token_network_state)] = (
+            payment_network_identifier,
+            token_address,
+        )
+
+        # The same object is reachable from both mappings
+        addrs_to_tokens = self.own_attribute(
+            payment_network_state,
+            'tokenaddresses_to_tokennetworks',
+        )
+        addrs_to_tokens[token_address] = token_network_state
+
+        ids_to_tokens = payment_network_state.tokenidentifiers_to_tokennetworks
+        if ids_to_tokens.get(previous.address) is previous:
+            ids_to_tokens = self.own_attribute(
+                payment_network_state,
+                'tokenidentifiers_to_tokennetworks',
+            )
+            ids_to_tokens[previous.address] = token_network_state
+
+        return token_network_state
+
+    def channel(self, token_network_state, channel_identifier):
+        """ Return the NettingChannelState copied into the new state or None.
+
+        `token_network_state` must have been copied with `token_network`.
+        """
+        previous = token_network_state.channelidentifiers_to_channels.get(channel_identifier)
+
+        if previous is None or self.is_owned(previous):
+            return previous
+
+        channel_state = self.own(deepcopy(previous))
+        self._touch_channel(token_network_state, channel_identifier)
+
+        # The same object is reachable from both mappings
+        ids_to_channels = self.own_attribute(
+            token_network_state,
+            'channelidentifiers_to_channels',
+        )
+        ids_to_channels[channel_identifier] = channel_state
+
+        partner_address = previous.partner_state.address
+        partners_to_channels = token_network_state.partneraddresses_to_channels
+        if partners_to_channels.get(partner_address) is previous:
+            partners_to_channels = self.own_attribute(
+                token_network_state,
+                'partneraddresses_to_channels',
+            )
+            partners_to_channels[partner_address] = channel_state
+
+        return channel_state
+
+    def add_channel(self, token_network_state, channel_state):
+        """ Add a new channel to `token_network_state`, which must have been
+        copied with `token_network`.
+        """
+        self.own(channel_state)
+        self._touch_channel(token_network_state, channel_state.identifier)
+
+        ids_to_channels = self.own_attribute(
+            token_network_state,
+            'channelidentifiers_to_channels',
+        )
+        partners_to_channels = self.own_attribute(
+            token_network_state,
+            'partneraddresses_to_channels',
+        )
+        ids_to_channels[channel_state.identifier] = channel_state
+        partners_to_channels[channel_state.partner_state.address] = channel_state
+
+    def _touch_channel(self, token_network_state, channel_identifier):
+        payment_network_identifier, token_address = self.token_network_paths[
+            id(token_network_state)
+        ]
+        key = (payment_network_identifier, token_address, channel_identifier)
+        self.touched_channels[key] = None
+
+    def channel_by_partner(self, token_network_state, partner_address):
+        """ Return the channel with `partner_address` copied into the new state
+        or None.
+        """
+        previous = token_network_state.partneraddresses_to_channels.get(partner_address)
+
+        if previous is None:
+            return None
+
+        return self.channel(token_network_state, previous.identifier)
+
+    def channel_map(self, payment_network_identifier, token_address):
+        """ Return a copy-on-access view of the token network channels or None
+        if the token network is unknown.
+        """
+        payment_network_state = self.node_state.identifiers_to_paymentnetworks.get(
+            payment_network_identifier,
+        )
+
+        if payment_network_state is None:
+            return None
+
+        if token_address not in payment_network_state.tokenaddresses_to_tokennetworks:
+            return None
+
+        return ChannelMapView(self, payment_network_identifier, token_address)
+
+    def network_graph(self, token_network_state):
+        """ Return the TokenNetworkGraphState copied into the new state. """
+        graph_state = token_network_state.network_graph
+
+        if not self.is_owned(graph_state):
+            graph_state = self.own(TokenNetworkGraphState(graph_state.network.copy()))
+            token_network_state.network_graph = graph_state
+
+        return graph_state
+
+    def payment_tasks(self):
+        """ Return the mapping from secrethash to payment task of the new
+        state.
+        """
+        payment_mapping = self.own_attribute(self.node_state, 'payment_mapping')
+        return self.own_attribute(payment_mapping, 'secrethashes_to_task')
+
+    def payment_task(self, secrethash):
+        """ Return the payment task copied into the new state or None. """
+        secrethashes_to_task = self.node_state.payment_mapping.secrethashes_to_task
+        previous = secrethashes_to_task.get(secrethash)
+
+        if previous is None or self.is_owned(previous):
+            return previous
+
+        sub_task = self.own(deepcopy(previous))
+        self.set_payment_task(secrethash, sub_task)
+
+        return sub_task
+
+    def set_payment_task(self, secrethash, sub_task):
+        """ Store `sub_task` in the new state. """
+        self.touched_tasks[secrethash] = None
+        self.payment_tasks()[secrethash] = sub_task
+
+    def block_deadlines(self):
+        """ Return the block deadlines index of the new state, or None if it
+        must be rebuilt.
+
+        The index is shared with the previous state and updated in place, see
+        raiden.transfer.deadlines.
+        """
+        node_state = self.node_state
+        deadlines = getattr(node_state, 'block_deadlines', None)
+
+        if deadlines is not None and not self.is_owned(deadlines):
+            if deadlines.owner is not self.previous_state:
+                deadlines = None
+                node_state.block_deadlines = None
+            else:
+                deadlines.owner = None
+                self.own(deadlines)
+
+        return deadlines
+
+    def commit_block_deadlines(self):
+        """ Hand the block deadlines index over to the new state, once the
+        transition succeeded.
+        """
+        node_state = self.node_state
+        deadlines = getattr(node_state, 'block_deadlines', None)
+
+        if deadlines is None:
+            return
+
+        if self.is_owned(deadlines) or deadlines.owner is self.previous_state:
+            deadlines.owner = node_state
+        else:
+            node_state.block_deadlines = None
+
+    def invalidate_block_deadlines(self):
+        """ Drop the block deadlines index, used when channels are added
+        without being touched by the transition.
+        """
+        self.node_state.block_deadlines = None
+
+    def queue(self, queueid):
+        """ Return the list of pending messages for `queueid` of the new
+        state, creating it if necessary.
+        """
+        queueids_to_queues = self.own_attribute(self.node_state, 'queueids_to_queues')
+        queue = queueids_to_queues.get(queueid)
+
+        if queue is None:
+            queue = self.own(list())
+            queueids_to_queues[queueid] = queue
+
+        elif not self.is_owned(queue):
+            queue = self.own(list(queue))
+            queueids_to_queues[queueid] = queue
+
+        return queue
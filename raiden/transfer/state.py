@@ -5,7 +5,6 @@ from binascii import hexlify
 from collections import namedtuple
 
 from raiden.constants import UINT256_MAX, UINT64_MAX
-from raiden.encoding.format import buffer_for
 from raiden.encoding import messages
 from raiden.transfer.architecture import State
 from raiden.transfer.merkle_tree import merkleroot
@@ -80,6 +79,7 @@ class NodeState(State):
         'identifiers_to_paymentnetworks',
         'nodeaddresses_to_networkstates',
         'payment_mapping',
+        'block_deadlines',
     )
 
     def __init__(self, pseudo_random_generator: random.Random, block_number: typing.BlockNumber):
@@ -93,6 +93,11 @@ class NodeState(State):
         self.nodeaddresses_to_networkstates = dict()
         self.payment_mapping = PaymentMappingState()
 
+        # Index of the channels and tasks that have work to do on a block, it
+        # is derived from the rest of the state and not compared, see
+        # raiden.transfer.deadlines. None means it must be rebuilt.
+        self.block_deadlines = None
+
     def __repr__(self):
         return '<NodeState block:{} networks:{} qtd_transfers:{}>'.format(
             self.block_number,
@@ -221,7 +226,7 @@ class TokenNetworkState(State):
 # outside of the state tree.
 class TokenNetworkGraphState(State):
     """ Stores the existing channels in the channel manager contract, used for
-    route finding.
+    route finding. `network` is a ChannelGraph.
     """
 
     __slots__ = (
@@ -283,6 +288,11 @@ class PaymentMappingState(State):
         'target_state',
     ))
 
+    # pickle looks the classes up by their qualified name
+    InitiatorTask.__qualname__ = 'PaymentMappingState.InitiatorTask'
+    MediatorTask.__qualname__ = 'PaymentMappingState.MediatorTask'
+    TargetTask.__qualname__ = 'PaymentMappingState.TargetTask'
+
     def __init__(self):
         self.secrethashes_to_task = dict()
 
@@ -552,11 +562,11 @@ class HashTimeLockState(State):
         if not isinstance(secrethash, typing.T_Keccak256):
             raise ValueError('secrethash must be a keccak256 instance')
 
-        packed = messages.Lock(buffer_for(messages.Lock))
-        packed.amount = amount
-        packed.expiration = expiration
-        packed.secrethash = secrethash
-        encoded = bytes(packed.data)
+        encoded = messages.Lock.pack_values({
+            'amount': amount,
+            'expiration': expiration,
+            'secrethash': secrethash,
+        })
 
         self.amount = amount
         self.expiration = expiration
@@ -714,6 +724,19 @@ class MerkleTreeState(State):
     def __init__(self, layers):
         self.layers = layers
 
+        # Maps every leaf to its position, built on demand by
+        # merkle_tree.get_leaves_to_index. The layers are never modified in
+        # place, so the map stays valid.
+        self.leaves_to_index = None
+
+    def __getstate__(self):
+        # The map is derived from the layers, don't copy or store it
+        return {'layers': self.layers}
+
+    def __setstate__(self, state):
+        self.layers = state['layers']
+        self.leaves_to_index = None
+
     def __repr__(self):
         return '<MerkleTreeState root:{}>'.format(
             pex(merkleroot(self)),
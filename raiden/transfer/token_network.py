@@ -2,6 +2,7 @@
 from raiden.transfer import channel
 from raiden.transfer.architecture import TransitionResult
 from raiden.transfer.events import EventTransferSentFailed
+from raiden.transfer.state import CHANNEL_STATE_SETTLED
 from raiden.transfer.state_change import (
     ActionChannelClose,
     ActionTransferDirect,
@@ -26,11 +27,14 @@ def subdispatch_to_channel_by_id(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     events = list()
 
-    ids_to_channels = token_network_state.channelidentifiers_to_channels
-    channel_state = ids_to_channels.get(state_change.channel_identifier)
+    channel_state = path_copy.channel(
+        token_network_state,
+        state_change.channel_identifier,
+    )
 
     if channel_state:
         result = channel.state_transition(
@@ -49,30 +53,30 @@ def handle_channel_close(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     return subdispatch_to_channel_by_id(
         token_network_state,
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
     )
 
 
-def handle_channelnew(token_network_state, state_change):
+def handle_channelnew(token_network_state, state_change, path_copy):
     events = list()
 
     channel_state = state_change.channel_state
-    channel_id = channel_state.identifier
     our_address = channel_state.our_state.address
     partner_address = channel_state.partner_state.address
 
-    token_network_state.network_graph.network.add_edge(
+    path_copy.network_graph(token_network_state).network.add_edge(
         our_address,
         partner_address,
     )
 
-    token_network_state.channelidentifiers_to_channels[channel_id] = channel_state
-    token_network_state.partneraddresses_to_channels[partner_address] = channel_state
+    path_copy.add_channel(token_network_state, channel_state)
 
     return TransitionResult(token_network_state, events)
 
@@ -82,12 +86,14 @@ def handle_balance(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     return subdispatch_to_channel_by_id(
         token_network_state,
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
     )
 
 
@@ -96,12 +102,14 @@ def handle_closed(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     return subdispatch_to_channel_by_id(
         token_network_state,
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
     )
 
 
@@ -110,19 +118,34 @@ def handle_settled(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
-    return subdispatch_to_channel_by_id(
+    iteration = subdispatch_to_channel_by_id(
         token_network_state,
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
+    )
+
+    channel_state = token_network_state.channelidentifiers_to_channels.get(
+        state_change.channel_identifier,
     )
 
+    # A settled channel can't be used for a route
+    if channel_state and channel.get_status(channel_state) == CHANNEL_STATE_SETTLED:
+        path_copy.network_graph(token_network_state).network.remove_edge(
+            channel_state.our_state.address,
+            channel_state.partner_state.address,
+        )
+
+    return iteration
 
-def handle_newroute(token_network_state, state_change):
+
+def handle_newroute(token_network_state, state_change, path_copy):
     events = list()
 
-    token_network_state.network_graph.network.add_edge(
+    path_copy.network_graph(token_network_state).network.add_edge(
         state_change.participant1,
         state_change.participant2,
     )
@@ -135,9 +158,10 @@ def handle_action_transfer_direct(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     receiver_address = state_change.receiver_address
-    channel_state = token_network_state.partneraddresses_to_channels.get(receiver_address)
+    channel_state = path_copy.channel_by_partner(token_network_state, receiver_address)
 
     if channel_state:
         iteration = channel.state_transition(
@@ -162,11 +186,12 @@ def handle_receive_transfer_direct(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     events = list()
 
     channel_id = state_change.balance_proof.channel_address
-    channel_state = token_network_state.channelidentifiers_to_channels.get(channel_id)
+    channel_state = path_copy.channel(token_network_state, channel_id)
 
     if channel_state:
         result = channel.state_transition(
@@ -185,11 +210,12 @@ def handle_receive_transfer_refund(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
     events = list()
 
     channel_id = state_change.balance_proof.channel_address
-    channel_state = token_network_state.channelidentifiers_to_channels.get(channel_id)
+    channel_state = path_copy.channel(token_network_state, channel_id)
 
     if channel_state:
         result = channel.state_transition(
@@ -208,7 +234,13 @@ def state_transition(
         state_change,
         pseudo_random_generator,
         block_number,
+        path_copy,
 ):
+    """ Apply `state_change` to `token_network_state`.
+
+    `token_network_state` must belong to the new state, i.e. it must have been
+    copied with `path_copy`, the channels are copied before they are modified.
+    """
     # pylint: disable=too-many-branches,unidiomatic-typecheck
 
     if type(state_change) == ActionChannelClose:
@@ -217,11 +249,13 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     elif type(state_change) == ContractReceiveChannelNew:
         iteration = handle_channelnew(
             token_network_state,
             state_change,
+            path_copy,
         )
     elif type(state_change) == ContractReceiveChannelNewBalance:
         iteration = handle_balance(
@@ -229,6 +263,7 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     elif type(state_change) == ContractReceiveChannelClosed:
         iteration = handle_closed(
@@ -236,6 +271,7 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     elif type(state_change) == ContractReceiveChannelSettled:
         iteration = handle_settled(
@@ -243,11 +279,13 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     elif type(state_change) == ContractReceiveRouteNew:
         iteration = handle_newroute(
             token_network_state,
             state_change,
+            path_copy,
         )
     elif type(state_change) == ActionTransferDirect:
         iteration = handle_action_transfer_direct(
@@ -255,6 +293,7 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     elif type(state_change) == ReceiveTransferDirect:
         iteration = handle_receive_transfer_direct(
@@ -262,6 +301,7 @@ def state_transition(
             state_change,
             pseudo_random_generator,
             block_number,
+            path_copy,
         )
     else:
         raise RuntimeError(state_change)
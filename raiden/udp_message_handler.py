@@ -71,6 +71,7 @@ def handle_message_refundtransfer(raiden: 'RaidenService', message: RefundTransf
         from_transfer.target,
         from_transfer.lock.amount,
         message.sender,
+        raiden.route_cache,
     )
 
     role = views.get_transfer_role(
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import click
+
+from raiden.storage.serialize import SERIALIZERS
+from raiden.storage.sqlite import (
+    COMPACTION_ARCHIVE,
+    COMPACTION_DROP,
+    COMPACTION_MODES,
+    SQLiteStorage,
+)
+
+
+@click.command()
+@click.argument('database_path', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--mode',
+    type=click.Choice(COMPACTION_MODES),
+    default=COMPACTION_ARCHIVE,
+    show_default=True,
+    help=(
+        '{} moves the state changes covered by the snapshot to compressed '
+        'segments, {} deletes them.'.format(COMPACTION_ARCHIVE, COMPACTION_DROP)
+    ),
+)
+@click.option(
+    '--archive-dir',
+    type=click.Path(file_okay=False),
+    default=None,
+    help='Directory of the archive segments, defaults to DATABASE_PATH/../archive.',
+)
+@click.option(
+    '--serializer',
+    type=click.Choice(SERIALIZERS.keys()),
+    default='pickle',
+    show_default=True,
+)
+@click.option(
+    '--vacuum/--no-vacuum',
+    default=True,
+    help='Shrink the database file afterwards.',
+)
+def compact(database_path, mode, archive_dir, serializer, vacuum):
+    """ Compact the write-ahead-log of a stopped Raiden node. """
+    storage = SQLiteStorage(
+        database_path,
+        SERIALIZERS[serializer],
+        archive_dir=archive_dir,
+    )
+    compacted = storage.compact(mode)
+
+    if vacuum:
+        storage.vacuum()
+
+    click.echo('{} state changes compacted with mode {}'.format(compacted, mode))
+
+
+if __name__ == '__main__':
+    compact()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import os
+import shutil
+
+import click
+
+from raiden.storage.serialize import SERIALIZERS
+from raiden.storage.sqlite import SQLiteStorage, default_archive_dir
+
+
+@click.command()
+@click.argument('database_path', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--from',
+    'from_serializer',
+    type=click.Choice(SERIALIZERS.keys()),
+    default='pickle',
+    show_default=True,
+)
+@click.option(
+    '--to',
+    'to_serializer',
+    type=click.Choice(SERIALIZERS.keys()),
+    default='binary',
+    show_default=True,
+)
+@click.option(
+    '--backup/--no-backup',
+    default=True,
+    help=(
+        'Copy the database to DATABASE_PATH.bak, with its write-ahead-log and '
+        'archive segments, before rewriting it.'
+    ),
+)
+def migrate(database_path, from_serializer, to_serializer, backup):
+    """ Rewrite the write-ahead-log of a stopped Raiden node with a different
+    serializer.
+    """
+    if backup:
+        backup_path = database_path + '.bak'
+        shutil.copyfile(database_path, backup_path)
+
+        # The last transactions may still be in the WAL file, SQLite looks for
+        # it next to the backup when the backup is opened
+        wal_path = database_path + '-wal'
+        if os.path.exists(wal_path):
+            shutil.copyfile(wal_path, backup_path + '-wal')
+
+        archive_dir = default_archive_dir(database_path)
+        if os.path.isdir(archive_dir):
+            archive_backup = archive_dir + '.bak'
+            if os.path.isdir(archive_backup):
+                shutil.rmtree(archive_backup)
+            shutil.copytree(archive_dir, archive_backup)
+
+    storage = SQLiteStorage(database_path, SERIALIZERS[from_serializer])
+    storage.change_serializer(SERIALIZERS[to_serializer])
+
+    click.echo('{} rewritten with the {} serializer'.format(database_path, to_serializer))
+
+
+if __name__ == '__main__':
+    migrate()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""  # noqa
+Usage:
+    transport_benchmark.py [--packets=<packets>] [--window=<window>] [--size=<size>] [--timeout=<timeout>]
+
+Sends packets over the loopback interface from one transport to another and
+reports the received packets per second, for the UDPTransport and the
+BatchedUDPTransport.
+
+Options:
+    -n --packets=<packets>              Number of packets to send [default: 100000].
+    -w --window=<window>                Packets in flight before the sender waits [default: 50].
+    -s --size=<size>                    Size of the packets in bytes [default: 200].
+    -t --timeout=<timeout>              Seconds to wait for the packets [default: 30].
+"""
+from gevent import monkey
+monkey.patch_all()  # noqa
+import time
+
+import gevent
+from docopt import docopt
+from gevent.event import Event
+
+from raiden.network.transport import BatchedUDPTransport, UDPTransport
+
+
+class CountingProtocol:
+
+    def __init__(self):
+        self.raiden = None
+        self.received = 0
+        self.last_received = None
+        self.event_received = Event()
+
+    def receive(self, data):  # pylint: disable=unused-argument
+        self.received += 1
+        self.last_received = time.monotonic()
+        self.event_received.set()
+
+
+def run(transport_class, packets, window, size, timeout):
+    """ Returns the number of packets received and the time it took. """
+    sender = transport_class('127.0.0.1', 0, protocol=CountingProtocol())
+    receiver = transport_class('127.0.0.1', 0, protocol=CountingProtocol())
+    sender.start()
+    receiver.start()
+
+    data = b'x' * size
+    host_port = receiver.server.address
+    start = time.monotonic()
+
+    for sent in range(packets):
+        # Don't overflow the socket buffers, the dropped datagrams would be
+        # counted as time spent
+        while sent - receiver.protocol.received >= window:
+            receiver.protocol.event_received.clear()
+            receiver.protocol.event_received.wait(1)
+
+        sender.send(None, host_port, data)
+
+    # The datagrams that were dropped won't arrive, stop once the receiver
+    # is idle
+    deadline = start + timeout
+    while receiver.protocol.received < packets and time.monotonic() < deadline:
+        last_received = receiver.protocol.last_received
+        gevent.sleep(0.1)
+
+        if last_received is not None and last_received == receiver.protocol.last_received:
+            break
+
+    sender.stop()
+    receiver.stop()
+
+    elapsed = (receiver.protocol.last_received or time.monotonic()) - start
+    return receiver.protocol.received, elapsed
+
+
+if __name__ == "__main__":
+    options = docopt(__doc__)
+    packets = int(options['--packets'])
+    window = int(options['--window'])
+    size = int(options['--size'])
+    timeout = float(options['--timeout'])
+
+    for transport_class in (UDPTransport, BatchedUDPTransport):
+        received, elapsed = run(transport_class, packets, window, size, timeout)
+        print('{}: {} of {} packets received, {:.0f} packets/s'.format(
+            transport_class.__name__,
+            received,
+            packets,
+            received / elapsed,
+        ))